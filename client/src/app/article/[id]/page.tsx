@@ -4,7 +4,7 @@ import React, { useState, useEffect } from 'react';
 import { useParams, useRouter } from 'next/navigation';
 import Image from 'next/image';
 import Link from 'next/link';
-import { getArticles, getUserId, isAuthenticated, getUserLikes, toggleArticleLike, isAdmin, deleteArticle, updateArticle } from '@/lib/api';
+import { getArticles, getUserId, isAuthenticated, getUserLikes, toggleArticleLike, isAdmin, deleteArticle, updateArticle, thumbnailUrl } from '@/lib/api';
 import { Article } from '@/lib/types';
 
 export default function ArticlePage() {
@@ -432,9 +432,10 @@ export default function ArticlePage() {
           {/* Featured Image */}
           <div className="relative h-96 w-full">
             <Image 
-              src={article.img || "/api/placeholder/800/400"}
+              src={thumbnailUrl(article.thumbnails, 1024) || article.img || "/api/placeholder/800/400"}
               alt={article.title}
               fill
+              unoptimized={Boolean(article.thumbnails)}
               className="object-cover"
             />
           </div>
@@ -2,7 +2,7 @@
 
 import React, { useState, useEffect, Suspense } from 'react';
 import { useSearchParams } from 'next/navigation';
-import { getArticles, generateArticles, getPersonalizedArticles, getUserLikedArticles, getUserId, isAuthenticated, getUserLikes, toggleArticleLike, deleteArticle, isAdmin } from '@/lib/api';
+import { getArticles, generateArticles, getPersonalizedArticles, getUserLikedArticles, getUserId, isAuthenticated, getUserLikes, toggleArticleLike, deleteArticle, isAdmin, thumbnailUrl } from '@/lib/api';
 import { Article } from '@/lib/types';
 import ArticleCard from '@/components/ArticleCard';
 import Image from 'next/image';
@@ -516,7 +516,8 @@ const QueryModal = () => {
       date: formatDate(),
       source: getSource(),
       url: article.url,
-      img: article.img
+      img: article.img,
+      thumbnails: article.thumbnails
     };
   };
 
@@ -965,9 +966,10 @@ const QueryModal = () => {
                   {/* Image Container with Fixed Height */}
                   <div className="relative w-full h-96">
                     <Image 
-                      src={filteredNews[0].img || "/api/placeholder/800/400"}
+                      src={thumbnailUrl(filteredNews[0].thumbnails, 1024) || filteredNews[0].img || "/api/placeholder/800/400"}
                       alt={filteredNews[0].title}
                       fill
+                      unoptimized={Boolean(filteredNews[0].thumbnails)}
                       className="object-cover"
                     />
                     
@@ -2,7 +2,7 @@ import React, { useState, useEffect } from 'react';
 import Image from 'next/image';
 import Link from 'next/link';
 import { Article } from '@/lib/types';
-import { getUserId, isAuthenticated, getUserLikes, toggleArticleLike, isAdmin, deleteArticle } from '@/lib/api';
+import { getUserId, isAuthenticated, getUserLikes, toggleArticleLike, isAdmin, deleteArticle, thumbnailUrl } from '@/lib/api';
 
 interface ArticleCardProps {
   article: Article;
@@ -298,9 +298,10 @@ export default function ArticleCard({ article, featured = false, onDelete }: Art
       <Link href={`/article/${articleId}`} className="block">
         <div className="relative h-48">
           <Image 
-            src={article.img || "/api/placeholder/800/400"}
+            src={thumbnailUrl(article.thumbnails, 640) || article.img || "/api/placeholder/800/400"}
             alt={article.title}
             fill
+            unoptimized={Boolean(article.thumbnails)}
             className="object-cover"
           />
           <div className="absolute top-0 left-0 bg-gray-900 text-white px-2 py-1 text-xs font-medium">
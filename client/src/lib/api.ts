@@ -1,5 +1,5 @@
 // lib/api.ts
-import { ArticleResponse, GenerateArticlesResponse, LoginResponse, User, LikeResponse, Article } from './types';
+import { ArticleResponse, GenerateArticlesResponse, LoginResponse, User, LikeResponse, Article, Thumbnails } from './types';
 
 const API_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:5001';
 
@@ -266,6 +266,17 @@ export async function register(user: User): Promise<{ msg: string }> {
   return response.json();
 }
 
+// Pick the smallest api thumbnail at least `width` pixels wide (or the largest one), WebP preferred.
+// Thumbnails are already resized, so render them with `unoptimized` instead of the Next image optimizer.
+export function thumbnailUrl(thumbnails: Thumbnails | null | undefined, width: number): string | undefined {
+  const sizes = thumbnails?.webp || thumbnails?.jpg;
+  if (!sizes) return undefined;
+  const widths = Object.keys(sizes).map(Number).sort((a, b) => a - b);
+  if (widths.length === 0) return undefined;
+  const best = widths.find(w => w >= width) ?? widths[widths.length - 1];
+  return sizes[String(best)];
+}
+
 // Add a function to check if user is authenticated
 export function isAuthenticated(): boolean {
   if (typeof window !== 'undefined') {
@@ -13,9 +13,13 @@ export interface Article {
   published_date: string;
   url: string;
   img: string;
+  thumbnails?: Thumbnails | null; // Resized copies of img served by the api
   summarization: Summarization;
 }
 
+// Thumbnail urls by format (webp, jpg) and width
+export type Thumbnails = Record<string, Record<string, string>>;
+
 export interface ArticleResponse {
   num_found: number;
   articles: Article[];
@@ -1,23 +1,55 @@
 from flask import Flask, jsonify
 from flask_cors import CORS
-from app.database import mongo
-from app.routes import main  #blueprint
+from app.database import init_mongo
+from app.log import setup_logging
+from app.metrics import metrics
 from app.config import Config
-from app.bcrypt import bcrypt, jwt
+from app.bcrypt import bcrypt, jwt, password_hasher
+from app.services.recommendation_worker import recommendation_worker
+from app.services.vectors import vector_index
+from app.services.trending import trending_counter
+from app.services.gemini import ai_client
+from app.services.thumbnails import thumbnail_cache
+from app.rate_limit import rate_limiter
+from app.profiling import request_profiler
 from flask_jwt_extended import JWTManager
 from flask_jwt_extended.exceptions import JWTExtendedException
 from jwt.exceptions import PyJWTError
 
-def create_app():
+ROLES = ('api', 'ingest', 'all')
+
+def create_app(role=None):
+    '''
+    role picks the routes this process serves (APP_ROLE by default):
+    -api: feeds, users and likes, never imports the scraper or the LLM client
+    -ingest: NewsAPI/scraping/LLM ingestion and article inserts
+    -all: both, for development and single process deployments
+    '''
     app = Flask(__name__)
     
     # Load configuration
     app.config.from_object(Config)
+    role = role or app.config.get('APP_ROLE', 'all')
+    if role not in ROLES:
+        raise ValueError(f"Unknown app role {role!r}, use one of: {', '.join(ROLES)}")
+    app.config['APP_ROLE'] = role
     
     # Initialize
-    mongo.init_app(app)
+    setup_logging(app)
+    init_mongo(app)
+    metrics.init_app(app)
     bcrypt.init_app(app)
     jwt.init_app(app)
+    recommendation_worker.init_app(app)
+    vector_index.init_app(app)
+    thumbnail_cache.init_app(app)
+    if role in ('api', 'all'):
+        password_hasher.init_app(app)
+        trending_counter.init_app(app)
+    if role in ('ingest', 'all'):
+        ai_client.init_app(app)
+    request_profiler.init_app(app)
+    rate_limiter.init_app(app)
     
     # JWT Error handlers
     @jwt.expired_token_loader
@@ -60,6 +92,11 @@ def create_app():
     # Enable CORS
     CORS(app)
 
-    # Register Blueprints
-    app.register_blueprint(main)
-    return app
\ No newline at end of file
+    # Register Blueprints, imported here so a role only loads the modules its routes use
+    if role in ('api', 'all'):
+        from app.routes import main
+        app.register_blueprint(main)
+    if role in ('ingest', 'all'):
+        from app.ingest_routes import ingest
+        app.register_blueprint(ingest)
+    return app
@@ -1,5 +1,90 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+import bcrypt as bcrypt_lib
 from flask_bcrypt import Bcrypt
 from flask_jwt_extended import JWTManager
 
 jwt = JWTManager()
-bcrypt = Bcrypt()
\ No newline at end of file
+bcrypt = Bcrypt()
+
+def _hash_password(password, rounds):
+    return bcrypt_lib.hashpw(password.encode('utf-8'), bcrypt_lib.gensalt(rounds)).decode('utf-8')
+
+def _check_password(password_hash, password):
+    try:
+        return bcrypt_lib.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+    except ValueError: #malformed stored hash
+        return False
+
+def hash_rounds(password_hash):
+    '''
+    Returns the work factor a bcrypt hash was created with ($2b$<rounds>$...), or None
+    '''
+    try:
+        return int(password_hash.split('$')[2])
+    except (IndexError, ValueError, AttributeError):
+        return None
+
+class HashingBusy(Exception):
+    '''
+    Raised when the hashing pool already has BCRYPT_MAX_PENDING requests waiting,
+    or when a hash didn't finish within BCRYPT_TIMEOUT_SECONDS
+    '''
+
+class PasswordHasher:
+    '''
+    Runs bcrypt hashing and checks on a bounded process pool so CPU heavy logins
+    don't block the request threads serving other routes.
+    -At most BCRYPT_MAX_PENDING hashes can be queued or running, more are rejected right away.
+     A hash keeps its slot until the pool finishes it, even if the request gave up waiting.
+    -BCRYPT_POOL_WORKERS = 0 hashes on the request thread (development)
+    -BCRYPT_LOG_ROUNDS is the target work factor for new hashes
+    '''
+    def __init__(self, app=None):
+        self.pool = None
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.rounds = app.config.get('BCRYPT_LOG_ROUNDS', 12)
+        self.workers = app.config.get('BCRYPT_POOL_WORKERS', 0)
+        self.timeout = app.config.get('BCRYPT_TIMEOUT_SECONDS', 10)
+        max_pending = app.config.get('BCRYPT_MAX_PENDING') or max(self.workers, 1) * 4
+        self.slots = threading.BoundedSemaphore(max_pending)
+
+    def get_pool(self):
+        with self.lock:
+            if self.pool is None:
+                #spawn instead of fork, forking a process that already runs threads is unsafe
+                self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+            return self.pool
+
+    def run(self, func, *args):
+        if not self.workers:
+            return func(*args)
+        if not self.slots.acquire(blocking=False):
+            raise HashingBusy()
+        try:
+            future = self.get_pool().submit(func, *args)
+        except BaseException:
+            self.slots.release()
+            raise
+        #released when the hash is done, not when the request stops waiting for it
+        future.add_done_callback(lambda _: self.slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout as e:
+            raise HashingBusy() from e
+
+    def hash(self, password):
+        return self.run(_hash_password, password, self.rounds)
+
+    def check(self, password_hash, password):
+        return self.run(_check_password, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        return hash_rounds(password_hash) != self.rounds
+
+password_hasher = PasswordHasher()
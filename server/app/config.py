@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 from datetime import timedelta
 
@@ -9,12 +10,148 @@ class Config:
     #gets values from local .env file
     MONGO_URI = os.getenv("MONGO_URI")
     JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "dev-key-for-testing-only")
-    DEBUG = True
+    DEBUG = os.getenv("DEBUG", "true").lower() == "true"
+    # Routes this process serves: "api" (feeds, users, likes), "ingest" (NewsAPI, scraping, LLM, article inserts) or "all"
+    APP_ROLE = os.getenv("APP_ROLE", "all")
     
+    # Logging (see app/log.py)
+    # Level of the app loggers, LOG_LEVELS overrides it per module: "app.routes=DEBUG,app.services.news_api=WARNING"
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+    # json or text, text by default while debugging
+    LOG_FORMAT = os.getenv("LOG_FORMAT", "text" if DEBUG else "json")
+    # Fraction of requests whose DEBUG records are logged
+    LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", 1.0))
+    # Records waiting to be written, more are dropped instead of blocking requests
+    LOG_QUEUE_SIZE = 10000
+
+    # Metrics on /metrics (see app/metrics.py)
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+    # Request profiling for admins with the X-Profile header or _profile parameter (see app/profiling.py)
+    PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+    # Profiled requests running at once per worker
+    PROFILE_MAX_CONCURRENT = int(os.getenv("PROFILE_MAX_CONCURRENT", 1))
+    PROFILE_SAMPLE_INTERVAL_MS = int(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", 5))
+
+    # Slow query detection (see app/query_monitor.py)
+    # Commands slower than this are recorded by query shape and logged
+    SLOW_QUERY_MS = int(os.getenv("SLOW_QUERY_MS", 100))
+    # Fraction of newly seen query shapes that are explained to find collection scans, 0 disables it
+    QUERY_EXPLAIN_SAMPLE_RATE = float(os.getenv("QUERY_EXPLAIN_SAMPLE_RATE", 0))
+    QUERY_MONITOR_MAX_SHAPES = 1000
+
+    # MongoDB client (options set in MONGO_URI take precedence)
+    # Connections per worker process, every gunicorn worker has its own pool
+    MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 50))
+    MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", 0))
+    MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", 300000))
+    # How long an operation waits for a free pooled connection before failing
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", 5000))
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000))
+    MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", 5000))
+    # 0 = no socket timeout, ingestion aggregations can run for a while
+    MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", 0)) or None
+    # Read preference for feeds, search and recommendations (primary, primaryPreferred,
+    # secondary, secondaryPreferred, nearest), a standalone server ignores it
+    MONGO_FEED_READ_PREFERENCE = os.getenv("MONGO_FEED_READ_PREFERENCE", "secondaryPreferred")
+    # Secondaries lagging more than this are not read from, -1 = no limit (minimum 90)
+    MONGO_FEED_MAX_STALENESS_SECONDS = int(os.getenv("MONGO_FEED_MAX_STALENESS_SECONDS", -1))
+    # Write concern for ingestion bulk writes and for user, like and profile writes
+    MONGO_INGEST_WRITE_CONCERN = os.getenv("MONGO_INGEST_WRITE_CONCERN", "1")
+    MONGO_USER_WRITE_CONCERN = os.getenv("MONGO_USER_WRITE_CONCERN", "majority")
+    MONGO_WRITE_TIMEOUT_MS = int(os.getenv("MONGO_WRITE_TIMEOUT_MS", 10000))
+
     # JWT Configuration
     JWT_TOKEN_LOCATION = ['headers']
     JWT_HEADER_NAME = 'Authorization'
     JWT_HEADER_TYPE = 'Bearer'
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
     JWT_ERROR_MESSAGE_KEY = 'error'
-    PROPAGATE_EXCEPTIONS = True
\ No newline at end of file
+    PROPAGATE_EXCEPTIONS = True
+
+    # Password hashing
+    # bcrypt work factor for new hashes, existing hashes are rehashed on login when it changes
+    BCRYPT_LOG_ROUNDS = int(os.getenv("BCRYPT_LOG_ROUNDS", 12))
+    # Hashing processes of each web worker, 0 hashes on the request thread.
+    # Defaults to the cores shared between the web workers (WEB_WORKERS, gunicorn's default if unset)
+    BCRYPT_POOL_WORKERS = int(os.getenv("BCRYPT_POOL_WORKERS",
+        max(1, (os.cpu_count() or 1) // int(os.getenv("WEB_WORKERS", (os.cpu_count() or 1) * 2 + 1)))))
+    # Hashes that can be queued or running before logins are rejected with 503
+    BCRYPT_MAX_PENDING = int(os.getenv("BCRYPT_MAX_PENDING", 0)) or None
+    BCRYPT_TIMEOUT_SECONDS = 10
+
+    # Recommendations
+    # Half life in days of a like's weight in the user's tag profile, 0 disables decay
+    TAG_PROFILE_HALF_LIFE_DAYS = float(os.getenv("TAG_PROFILE_HALF_LIFE_DAYS", 0))
+    # Points added to a recommendation per unit of co-like similarity (see build_co_likes.py)
+    CO_LIKE_WEIGHT = float(os.getenv("CO_LIKE_WEIGHT", 10))
+    # Stored recommendations older than this are recomputed on demand instead of served
+    RECOMMENDATIONS_MAX_AGE_MINUTES = int(os.getenv("RECOMMENDATIONS_MAX_AGE_MINUTES", 60))
+    # After new articles are added stored recommendations are marked stale at most this often,
+    # a stale entry is recomputed in the background when its user next reads it
+    RECOMMENDATIONS_STALE_INTERVAL_SECONDS = int(os.getenv("RECOMMENDATIONS_STALE_INTERVAL_SECONDS", 60))
+    # How often the vector index picks up added, edited, deleted and archived articles
+    VECTOR_INDEX_SYNC_SECONDS = int(os.getenv("VECTOR_INDEX_SYNC_SECONDS", 60))
+    # Snapshots of the vector index, memory-mapped by every api worker using the directory
+    VECTOR_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", os.path.join(tempfile.gettempdir(), "briefly-vectors"))
+
+    # Trending
+    # Half life in hours of a like's contribution to an article's trending score
+    TRENDING_HALF_LIFE_HOURS = float(os.getenv("TRENDING_HALF_LIFE_HOURS", 6))
+    # Likes are counted in memory per bucket and flushed to the trending collection periodically
+    TRENDING_BUCKET_SECONDS = 60
+    TRENDING_FLUSH_SECONDS = int(os.getenv("TRENDING_FLUSH_SECONDS", 30))
+    # How often every stored trending score is decayed and tiny scores are removed
+    TRENDING_DECAY_SECONDS = 300
+
+    # Estimated text similarity (0-1) above which a scraped article is linked to an existing one
+    # instead of being summarized, 0 disables near-duplicate detection
+    DUPLICATE_THRESHOLD = float(os.getenv("DUPLICATE_THRESHOLD", 0.8))
+
+    # Gemini summarization (see app/services/gemini.py). Parallel calls start at
+    # LLM_INITIAL_CONCURRENCY, grow while they succeed and halve when the quota is hit
+    GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+    LLM_INITIAL_CONCURRENCY = int(os.getenv("LLM_INITIAL_CONCURRENCY", 2))
+    LLM_MIN_CONCURRENCY = int(os.getenv("LLM_MIN_CONCURRENCY", 1))
+    LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 8))
+    # Retries of quota errors, server errors, timeouts and malformed responses per article
+    LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 4))
+
+    # Article image thumbnails (see app/services/thumbnails.py). The directory must be shared
+    # by the api and ingest workers of a host, files are evicted least recently used first
+    THUMBNAIL_DIR = os.getenv("THUMBNAIL_DIR", os.path.join(tempfile.gettempdir(), "briefly-thumbnails"))
+    THUMBNAIL_CACHE_BYTES = int(os.getenv("THUMBNAIL_CACHE_MB", 512)) * 1024 * 1024
+    THUMBNAIL_WIDTHS = tuple(int(width) for width in os.getenv("THUMBNAIL_WIDTHS", "320,640,1024").split(","))
+    THUMBNAIL_QUALITY = int(os.getenv("THUMBNAIL_QUALITY", 80))
+    # Make thumbnails in the background when articles are ingested instead of on first request
+    THUMBNAIL_PREFETCH = os.getenv("THUMBNAIL_PREFETCH", "true").lower() == "true"
+    # Thumbnail urls never change for an image, so browsers may keep them for a year
+    THUMBNAIL_MAX_AGE = 365 * 24 * 60 * 60
+    # Base url clients reach the api at, used in thumbnail urls (default: the request's host)
+    PUBLIC_API_URL = os.getenv("PUBLIC_API_URL", "")
+
+    # Retention (archive_articles.py): articles published more than ARCHIVE_AFTER_DAYS ago that
+    # weren't liked in the last ARCHIVE_LIKE_GRACE_DAYS are moved to the articles_archive collection
+    ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", 30))
+    ARCHIVE_LIKE_GRACE_DAYS = int(os.getenv("ARCHIVE_LIKE_GRACE_DAYS", 7))
+    ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", 500))
+
+    # Articles validated and written per bulk write when insert_articles streams an NDJSON body
+    INSERT_BATCH_SIZE = int(os.getenv("INSERT_BATCH_SIZE", 1000))
+
+    # Rate limiting (see app/rate_limit.py)
+    RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+    # "memory" limits each worker separately, "mongo" shares limits between workers
+    RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+    # Use the first X-Forwarded-For address as the client ip (only behind a trusted proxy)
+    RATE_LIMIT_TRUST_PROXY = os.getenv("RATE_LIMIT_TRUST_PROXY", "false").lower() == "true"
+    # Concurrency slots held longer than this are released (worker crashed mid request)
+    RATE_LIMIT_LEASE_SECONDS = 600
+    RATE_LIMITS = {
+        'ingest.generate_articles': {'ip': '5/minute', 'identity': '5/minute', 'concurrency': 2},
+        'ingest.insert_article': {'ip': '30/minute', 'identity': '30/minute', 'concurrency': 4},
+        'main.login': {'ip': '20/minute', 'identity': '5/minute'},
+        'main.register': {'ip': '5/minute'},
+        'main.get_articles': {'ip': '120/minute'},
+    }
\ No newline at end of file
@@ -1,3 +1,157 @@
+import threading
+from flask import current_app
 from flask_pymongo import PyMongo
+from pymongo import ASCENDING, DESCENDING, uri_parser
+from pymongo.monitoring import ConnectionPoolListener
+from pymongo.read_preferences import read_pref_mode_from_name, make_read_preference
+from pymongo.write_concern import WriteConcern
+from app.metrics import mongo_command_timer
+from app.query_monitor import query_monitor
 
-mongo = PyMongo()
\ No newline at end of file
+mongo = PyMongo()
+
+
+class PoolStats(ConnectionPoolListener):
+    '''
+    Counts connection pool events for every server the client talks to.
+    checked_out is the number of connections in use right now, waiting is the
+    number of operations waiting for a free connection.
+    '''
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.servers = {}
+
+    def _count(self, event, **changes):
+        address = '%s:%s' % event.address
+        with self.lock:
+            stats = self.servers.setdefault(address, {
+                'open': 0, 'checked_out': 0, 'waiting': 0,
+                'created': 0, 'closed': 0, 'checkouts': 0, 'checkout_failures': 0, 'pool_cleared': 0
+            })
+            for key, change in changes.items():
+                stats[key] += change
+
+    def pool_created(self, event):
+        self._count(event)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._count(event, pool_cleared=1)
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._count(event, open=1, created=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._count(event, open=-1, closed=1)
+
+    def connection_check_out_started(self, event):
+        self._count(event, waiting=1)
+
+    def connection_check_out_failed(self, event):
+        self._count(event, waiting=-1, checkout_failures=1)
+
+    def connection_checked_out(self, event):
+        self._count(event, waiting=-1, checked_out=1, checkouts=1)
+
+    def connection_checked_in(self, event):
+        self._count(event, checked_out=-1)
+
+    def snapshot(self):
+        with self.lock:
+            return {address: dict(stats) for address, stats in self.servers.items()}
+
+pool_stats = PoolStats()
+
+def init_mongo(app):
+    '''
+    Creates the MongoClient with the pool and timeout settings from the config
+    '''
+    options = {
+        'maxPoolSize': app.config.get('MONGO_MAX_POOL_SIZE', 100),
+        'minPoolSize': app.config.get('MONGO_MIN_POOL_SIZE', 0),
+        'maxIdleTimeMS': app.config.get('MONGO_MAX_IDLE_TIME_MS'),
+        'waitQueueTimeoutMS': app.config.get('MONGO_WAIT_QUEUE_TIMEOUT_MS'),
+        'serverSelectionTimeoutMS': app.config.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', 30000),
+        'connectTimeoutMS': app.config.get('MONGO_CONNECT_TIMEOUT_MS', 20000),
+        'socketTimeoutMS': app.config.get('MONGO_SOCKET_TIMEOUT_MS'),
+        'retryWrites': True,
+    }
+    #options given in MONGO_URI take precedence over the config
+    uri_options = uri_parser.parse_uri(app.config['MONGO_URI'])['options']
+    options = {key: value for key, value in options.items() if value is not None and key not in uri_options}
+    mongo.init_app(app, event_listeners=[pool_stats, mongo_command_timer, query_monitor], **options)
+    query_monitor.init_app(app, mongo.cx)
+
+def _write_concern(w, wtimeout):
+    w = int(w) if str(w).isdigit() else w
+    return WriteConcern(w=w, wtimeout=wtimeout or None)
+
+def feed_db():
+    '''
+    Database for heavy listing reads (feeds, search, recommendations).
+    Reads use MONGO_FEED_READ_PREFERENCE so they can be served by secondaries.
+    '''
+    mode = read_pref_mode_from_name(current_app.config.get('MONGO_FEED_READ_PREFERENCE', 'secondaryPreferred'))
+    max_staleness = current_app.config.get('MONGO_FEED_MAX_STALENESS_SECONDS', -1)
+    return mongo.db.with_options(read_preference=make_read_preference(mode, None, max_staleness=max_staleness))
+
+def feed_collection(name):
+    return feed_db()[name]
+
+def ingest_collection(name):
+    '''
+    Collection for ingestion bulk writes, with MONGO_INGEST_WRITE_CONCERN (default w=1)
+    since articles can always be fetched again
+    '''
+    config = current_app.config
+    return mongo.db.get_collection(name, write_concern=_write_concern(
+        config.get('MONGO_INGEST_WRITE_CONCERN', 1), config.get('MONGO_WRITE_TIMEOUT_MS')))
+
+def user_collection(name):
+    '''
+    Collection for user and like mutations, with MONGO_USER_WRITE_CONCERN (default majority)
+    so acknowledged changes survive a primary failover
+    '''
+    config = current_app.config
+    return mongo.db.get_collection(name, write_concern=_write_concern(
+        config.get('MONGO_USER_WRITE_CONCERN', 'majority'), config.get('MONGO_WRITE_TIMEOUT_MS')))
+
+def ensure_indexes():
+    '''
+    Create the indexes the app's queries rely on. Safe to run more than once.
+    Must be called inside an app context.
+    '''
+    #ingestion upserts match articles by url
+    mongo.db.articles.create_index([("url", ASCENDING)])
+    #MinHash bands used to find near-duplicate articles (see services/duplicates.py)
+    mongo.db.articles.create_index([("lsh_bands", ASCENDING)], sparse=True)
+    #ingestion restores archived articles by url before upserting them
+    mongo.db.articles_archive.create_index([("url", ASCENDING)])
+    #exact, lowercased tags used to find recommendation candidates
+    mongo.db.articles.create_index([("normalized_tags", ASCENDING)])
+    #summary vectors written since the vector index was last synced
+    mongo.db.articles.create_index([("vector_updated_at", ASCENDING)], sparse=True)
+
+    #one like document per user and article, used by the atomic like toggle
+    mongo.db.likes.create_index([("user_id", ASCENDING), ("article_id", ASCENDING)], unique=True)
+    #a user's liked articles, most recent first
+    mongo.db.likes.create_index([("user_id", ASCENDING), ("liked", ASCENDING), ("created_at", DESCENDING), ("article_id", ASCENDING)])
+    #likes changed since the last incremental co-like build
+    mongo.db.likes.create_index([("updated_at", ASCENDING)])
+    #co-like lists that point at an article, recomputed when its likes change (build_co_likes.py)
+    mongo.db.article_neighbors.create_index([("neighbors.article_id", ASCENDING)])
+    #top trending articles
+    mongo.db.trending.create_index([("score", DESCENDING)])
+    #articles removed since the vector index was last synced, kept until expires_at
+    mongo.db.vector_removals.create_index([("removed_at", ASCENDING)])
+    mongo.db.vector_removals.create_index([("expires_at", ASCENDING)], expireAfterSeconds=0)
+    #idle rate limit buckets are removed once they would have refilled
+    mongo.db.rate_limits.create_index([("expires_at", ASCENDING)], expireAfterSeconds=0)
@@ -0,0 +1,240 @@
+from flask import Blueprint, current_app, jsonify, request
+from marshmallow import ValidationError
+from app.schemas import article_schema
+from datetime import datetime
+from app.services.news_api import NewsApi
+from app.services.utils import scrape_summarize, upsert_articles
+from app.services.scraper import scrape_article
+from app.services.recommendation_worker import recommendation_worker
+from app.services.vectors import vector_index
+from app.services.thumbnails import thumbnail_cache
+import time
+import json
+import logging
+from app.log import debug_enabled
+from app.metrics import stage_timer
+
+logger = logging.getLogger(__name__)
+
+#ingestion routes, served by the ingest role (see create_app) so api workers never load the scraper or LLM client
+ingest = Blueprint("ingest", __name__)
+news_api = NewsApi()
+def wants_ids_only():
+    '''
+    True if the client asked for ids and counts only (?return=ids) instead of the stored articles
+    '''
+    return request.args.get('return') == 'ids'
+
+def upserted_articles(validated_data, stored, ids_only):
+    '''
+    Response fields for upserted articles, built from the validated input and the stored ids
+    instead of reading every article back
+    '''
+    by_url = {article["url"]: article for article in stored}
+    if ids_only:
+        return {"ids": [str(by_url[article["url"]]["_id"]) for article in validated_data if article["url"] in by_url]}
+    articles = [
+        dict(article, _id=str(by_url[article["url"]]["_id"]), like_count=by_url[article["url"]]["like_count"])
+        for article in validated_data if article["url"] in by_url
+    ]
+    return {"articles_processed": article_schema.dump(articles, many=True)}
+
+def read_ndjson_batches(stream, batch_size):
+    '''
+    Yields (line numbers, records) batches from an NDJSON request body as it arrives,
+    so large inserts never hold the whole body in memory
+    '''
+    line_numbers, records = [], []
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            records.append(json.loads(line))
+        except ValueError as e:
+            raise ValueError(f"line {line_number}: {e}")
+        line_numbers.append(line_number)
+        if len(records) == batch_size:
+            yield line_numbers, records
+            line_numbers, records = [], []
+    if records:
+        yield line_numbers, records
+
+@ingest.route('/api/insert_articles', methods=['POST'])
+def insert_article():
+    '''
+    Manually insert one or multiple articles into the articles collection in briefly.
+    Must follow schema (see schema.py)
+    Accepts a JSON article or list, a form, or NDJSON (application/x-ndjson, one article per line)
+    which is validated and written in batches of INSERT_BATCH_SIZE while it is read.
+    ?return=ids responds with the article ids and counts instead of the articles.
+    '''
+    ids_only = wants_ids_only()
+    try:
+        content_type = request.mimetype
+        if content_type == 'application/x-ndjson':
+            return insert_ndjson(ids_only)
+        if content_type == 'application/json':
+            data = request.get_json()
+        elif content_type == 'application/x-www-form-urlencoded':
+            data = request.form.to_dict()
+        else:
+            return jsonify({"error": "Unsupported Content-Type"})
+
+        #deserialize and validate input article data
+        with stage_timer('validate'):
+            if isinstance(data, list):
+                validated_data = article_schema.load(data, many=True)
+            elif isinstance(data, dict):
+                validated_data = article_schema.load(data)
+                validated_data = [validated_data] #converts to list for the bulk write
+            else: 
+                return jsonify({"error": "Invalid data"})
+
+        results, stored = upsert_articles(validated_data)
+        vector_index.index_articles(stored, validated_data)
+        thumbnail_cache.prefetch(article.get("img") for article in validated_data)
+        if results and results.upserted_count:
+            recommendation_worker.articles_added() #marks stored recommendations stale, they are recomputed when read
+
+        created_at = datetime.now().isoformat()
+
+        return jsonify({
+            "success" : True,
+            "created_at" : created_at,
+            "num_inserted" : results.upserted_count if results else 0,
+            "num_updated" : results.modified_count if results else 0,
+            "num_processed" : len(validated_data),
+            **upserted_articles(validated_data, stored, ids_only)
+        }), 201
+    except Exception as e:
+        return jsonify({
+            "success" : False,
+            "error": str(e)
+        })
+
+def insert_ndjson(ids_only):
+    '''
+    Validates and upserts an NDJSON body batch by batch. Batches before an invalid line
+    are already written, the error says which line failed and how many were processed.
+    '''
+    batch_size = current_app.config.get('INSERT_BATCH_SIZE', 1000)
+    totals = {"num_inserted": 0, "num_updated": 0, "num_processed": 0}
+    response_fields = {"ids": []} if ids_only else {"articles_processed": []}
+    inserted = False
+    try:
+        for line_numbers, records in read_ndjson_batches(request.stream, batch_size):
+            with stage_timer('validate'):
+                try:
+                    validated_data = article_schema.load(records, many=True)
+                except ValidationError as e:
+                    #errors are keyed by position in the batch, report the line instead
+                    raise ValueError({f"line {line_numbers[index]}": errors for index, errors in e.messages.items()})
+            results, stored = upsert_articles(validated_data)
+            vector_index.index_articles(stored, validated_data)
+            thumbnail_cache.prefetch(article.get("img") for article in validated_data)
+            inserted = inserted or results.upserted_count > 0
+            totals["num_inserted"] += results.upserted_count
+            totals["num_updated"] += results.modified_count
+            totals["num_processed"] += len(validated_data)
+            for key, values in upserted_articles(validated_data, stored, ids_only).items():
+                response_fields[key].extend(values)
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e), **totals})
+    finally:
+        if inserted:
+            recommendation_worker.articles_added()
+    return jsonify({
+        "success": True,
+        "created_at": datetime.now().isoformat(),
+        **totals,
+        **response_fields
+    }), 201
+    
+@ingest.route('/api/test_scraper_v2', methods=['POST'])
+def scrape_article_test():
+    data = request.get_json()
+    url = data.get('url')
+    result = scrape_article(url)
+    if debug_enabled(logger):
+        logger.debug("Scraped %s: %s", url, json.loads(result.data))
+    return jsonify({
+        'success' : True
+    })
+
+@ingest.route('/api/generate_articles', methods=['POST'])
+def generate_articles():
+    '''
+    Generate articles based on the provided keywords.
+    Parameters:
+    q : Keywords or phrases to search for in the article title and body.
+    searchIn : The fields to restrict your q search to. options = (title, description, content)
+    domains : A comma-seperated string of domains (eg bbc.co.uk, techcrunch.com, engadget.com) to restrict the search to.
+    excludeDomains: A comma-seperated string of domains (eg bbc.co.uk, techcrunch.com, engadget.com) to remove from the results.
+    pageSize : The number of results to return per page.
+    '''
+    start_time = time.time()
+    try:
+        if request.method == 'POST':
+            content_type = request.headers.get('Content-Type')
+            if content_type == 'application/json':
+                data = request.get_json()
+            elif content_type == 'application/x-www-form-urlencoded':
+                data = request.form.to_dict()
+            else:
+                return jsonify({"error": "Unsupported Content-Type"})
+            if not isinstance(data, dict):
+                return jsonify({"error": "Invalid data"})
+        else:
+            data = {}
+        
+        data["pageSize"] = 5 #setting max articles to get to 5 (for now)
+        data['sortBy'] = 'relevancy'
+        data['excludeDomains'] = 'businessinsider.com'
+        logger.info("Querying NewsAPI", extra={"params": data})
+        with stage_timer('newsapi_fetch'):
+            result = news_api.get_articles(params=data) #result is a jsonify object from get_articles
+        #print("Results from News API: \n", json.loads(result.data))
+
+        summarized_dict = scrape_summarize(result) #dict that includes processed articles + summarizations
+        #print('Dictionary that has summarization: \n', summarized_dict)
+
+        processed_articles = summarized_dict['processed_articles'] #extract processed articles
+        with stage_timer('validate'):
+            validated_data = article_schema.load(processed_articles, many=True) #schema validation against the processed articles
+
+        results, stored = upsert_articles(validated_data) #unordered bulk upsert by url
+        vector_index.index_articles(stored, validated_data)
+        thumbnail_cache.prefetch(article.get("img") for article in validated_data)
+        if results and results.upserted_count:
+            recommendation_worker.articles_added() #marks stored recommendations stale, they are recomputed when read
+
+        created_at = datetime.now().isoformat()
+        
+        end_time = time.time()
+        execution_time = end_time - start_time
+
+        logger.info("Generate_articles finished", extra={
+            "num_failed": summarized_dict["num_failed"],
+            "num_duplicates": summarized_dict["num_duplicates"],
+            "num_inserted": results.upserted_count if results else 0,
+            "num_updated": results.modified_count if results else 0,
+            "seconds": round(execution_time, 4)
+        })
+        return jsonify({
+            "success" : True,
+            "created_at" : created_at,
+            "num_inserted" : results.upserted_count if results else 0,
+            "num_updated" : results.modified_count if results else 0,
+            "num_processed" : len(validated_data),
+            "num_failed" : summarized_dict["num_failed"],
+            "num_duplicates" : summarized_dict["num_duplicates"],
+            **upserted_articles(validated_data, stored, wants_ids_only())
+        }), 201
+    except Exception as e:
+        end_time = time.time()
+        execution_time = end_time - start_time  # Capture time even if it fails
+        logger.exception("Generate_articles failed after %.4f seconds", execution_time)
+        return jsonify({
+            "success" : False,
+            "error": str(e),
+        })
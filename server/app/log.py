@@ -0,0 +1,170 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import time
+import uuid
+from flask import g, has_request_context, request
+
+#attributes every LogRecord has, anything else was passed with extra= and is logged as a field
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_listener = None
+_sample_rate = 1.0
+
+class JsonFormatter(logging.Formatter):
+    '''
+    Formats a record as one JSON object per line:
+    {"time": ..., "level": ..., "logger": ..., "message": ..., "request_id": ..., <extra fields>}
+    '''
+    def format(self, record):
+        entry = {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + '.%03dZ' % record.msecs,
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    '''
+    Human readable format for development, extra fields are appended as key=value
+    '''
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        fields = ' '.join(f'{key}={value}' for key, value in vars(record).items()
+                          if key not in RECORD_ATTRIBUTES and not key.startswith('_'))
+        return f'{line} {fields}' if fields else line
+
+
+class RequestContextFilter(logging.Filter):
+    '''
+    Adds the request id and endpoint to records logged while handling a request, and
+    drops DEBUG records of requests that were not sampled (see LOG_DEBUG_SAMPLE_RATE)
+    '''
+    def __init__(self, sample_rate=1.0):
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record):
+        if not has_request_context():
+            return True
+        if record.levelno <= logging.DEBUG and not debug_sampled(self.sample_rate):
+            return False
+        record.request_id = request_id()
+        record.endpoint = request.endpoint
+        return True
+
+
+def request_id():
+    '''
+    Id of the current request, taken from X-Request-ID when the proxy sets one
+    '''
+    if 'request_id' not in g:
+        g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex[:16]
+    return g.request_id
+
+def debug_sampled(sample_rate=None):
+    '''
+    Whether per-request debug output is logged for the current request.
+    The decision is made once per request so a sampled request logs all of its debug lines.
+    '''
+    if not has_request_context():
+        return True
+    if 'log_sampled' not in g:
+        if sample_rate is None:
+            sample_rate = _sample_rate
+        g.log_sampled = sample_rate >= 1 or random.random() < sample_rate
+    return g.log_sampled
+
+def debug_enabled(logger):
+    '''
+    True if logger would output a DEBUG record for the current request, use it to
+    skip building expensive debug messages
+    '''
+    return logger.isEnabledFor(logging.DEBUG) and debug_sampled()
+
+def parse_levels(levels):
+    '''
+    Parses "app.routes=DEBUG,app.services.news_api=WARNING" into {logger name: level}
+    '''
+    parsed = {}
+    for entry in (levels or '').split(','):
+        if '=' in entry:
+            name, level = entry.split('=', 1)
+            parsed[name.strip()] = level.strip().upper()
+    return parsed
+
+def setup_logging(app):
+    '''
+    Routes every log record through a queue to a background thread that writes to stdout,
+    so request threads never block on console I/O.
+    -LOG_LEVEL: level of the app loggers, LOG_LEVELS: per-module overrides
+    -LOG_FORMAT: json or text
+    -LOG_DEBUG_SAMPLE_RATE: fraction of requests whose DEBUG records are kept
+    '''
+    global _listener, _sample_rate
+    _sample_rate = app.config.get('LOG_DEBUG_SAMPLE_RATE', 1.0)
+
+    formatter = JsonFormatter() if app.config.get('LOG_FORMAT', 'json') == 'json' else TextFormatter()
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(formatter)
+
+    #bounded so a burst of logging can't use unbounded memory, records are dropped when full
+    log_queue = queue.Queue(maxsize=app.config.get('LOG_QUEUE_SIZE', 10000))
+    queue_handler = DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(RequestContextFilter(_sample_rate))
+
+    logger = logging.getLogger('app')
+    logger.handlers = [queue_handler]
+    logger.propagate = False
+    logger.setLevel(app.config.get('LOG_LEVEL', 'INFO').upper())
+    for name, level in parse_levels(app.config.get('LOG_LEVELS')).items():
+        logging.getLogger(name).setLevel(level)
+
+    if _listener is not None:
+        _listener.stop()
+    _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+def stop_logging():
+    '''
+    Writes out the queued records and stops the background thread
+    '''
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    '''
+    QueueHandler that counts and drops records instead of blocking when the queue is full
+    '''
+    dropped = 0
+
+    def prepare(self, record):
+        #format the message now so the args don't have to be kept alive, skip the
+        #stdlib copy and exc_text formatting since the formatter runs on the listener thread
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
@@ -0,0 +1,133 @@
+import os
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+from flask import Response, g, request
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest, multiprocess
+from pymongo import monitoring
+
+#request latencies from a few ms (cached reads) to minutes (ingestion)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 10)
+
+REQUESTS = Counter('http_requests_total', 'Requests handled', ['endpoint', 'method', 'status'])
+REQUEST_ERRORS = Counter('http_request_errors_total', 'Requests that raised or returned a 5xx status', ['endpoint'])
+REQUEST_LATENCY = Histogram('http_request_duration_seconds', 'Request latency', ['endpoint', 'method'], buckets=LATENCY_BUCKETS)
+
+#ingestion stages: newsapi_fetch, scrape, llm, validate, bulk_write
+INGEST_STAGE = Histogram('ingest_stage_duration_seconds', 'Time spent in each ingestion stage', ['stage'], buckets=LATENCY_BUCKETS)
+#reason is scrape (download or parsing failed) or summarize (the LLM returned no tags)
+SCRAPE_FAILURES = Counter('scrape_failures_total', 'Articles dropped during ingestion', ['domain', 'reason'])
+#each one is an LLM call saved
+DUPLICATE_ARTICLES = Counter('duplicate_articles_total', 'Scraped articles linked to a near-duplicate instead of being summarized')
+
+#Gemini calls: outcome is ok, retry (a retryable failure) or error; tokens kind is prompt or output
+LLM_LATENCY = Histogram('llm_request_duration_seconds', 'Latency of single LLM calls', ['model', 'outcome'], buckets=LATENCY_BUCKETS)
+LLM_TOKENS = Counter('llm_tokens_total', 'Tokens used by LLM calls', ['model', 'kind'])
+LLM_RETRIES = Counter('llm_retries_total', 'LLM calls retried', ['model', 'reason'])
+LLM_CONCURRENCY = Gauge('llm_concurrency_limit', 'Current adaptive limit on parallel LLM calls', multiprocess_mode='liveall')
+
+#thumbnail requests: result is hit, miss (made on request) or failed (the image couldn't be fetched)
+THUMBNAIL_CACHE = Counter('thumbnail_cache_total', 'Thumbnail lookups by result', ['result'])
+THUMBNAIL_EVICTIONS = Counter('thumbnail_evictions_total', 'Thumbnail files deleted to keep the cache under its size limit')
+
+MONGO_OPERATIONS = Histogram('mongo_operation_duration_seconds', 'MongoDB command latency', ['command', 'collection'], buckets=MONGO_BUCKETS)
+MONGO_FAILURES = Counter('mongo_operation_failures_total', 'MongoDB commands that failed', ['command', 'collection'])
+
+RATE_LIMITED = Counter('rate_limited_requests_total', 'Requests rejected by the rate limiter', ['endpoint', 'limit'])
+
+@contextmanager
+def stage_timer(stage):
+    '''
+    Times an ingestion stage:
+    with stage_timer('scrape'):
+        ...
+    '''
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        INGEST_STAGE.labels(stage).observe(time.perf_counter() - start)
+
+def count_scrape_failure(url, reason):
+    domain = urlparse(url or '').netloc.lower()
+    if domain.startswith('www.'):
+        domain = domain[4:]
+    SCRAPE_FAILURES.labels(domain or 'unknown', reason).inc()
+
+
+class MongoCommandTimer(monitoring.CommandListener):
+    '''
+    Records the latency of every command sent to MongoDB by command name and collection
+    '''
+    def __init__(self):
+        self.collections = {}
+
+    def started(self, event):
+        #most commands hold the collection name, getMore holds the cursor id and a collection field
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            collection = event.command.get('collection', '')
+        self.collections[(event.connection_id, event.request_id)] = collection
+
+    def succeeded(self, event):
+        collection = self.collections.pop((event.connection_id, event.request_id), '')
+        MONGO_OPERATIONS.labels(event.command_name, collection).observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        collection = self.collections.pop((event.connection_id, event.request_id), '')
+        MONGO_OPERATIONS.labels(event.command_name, collection).observe(event.duration_micros / 1e6)
+        MONGO_FAILURES.labels(event.command_name, collection).inc()
+
+mongo_command_timer = MongoCommandTimer()
+
+
+class Metrics:
+    '''
+    Request metrics for every endpoint and the /metrics endpoint in the Prometheus text format.
+    With several gunicorn workers set PROMETHEUS_MULTIPROC_DIR so /metrics adds up every worker
+    (see gunicorn.conf.py).
+    '''
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.config.get('METRICS_ENABLED', True):
+            return
+        app.before_request(self.start_request)
+        app.after_request(self.end_request)
+        app.teardown_request(self.teardown_request)
+        app.add_url_rule('/metrics', 'metrics', self.export)
+
+    def start_request(self):
+        g.metrics_start = time.perf_counter()
+
+    def record(self, status):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return
+        endpoint = request.endpoint or 'unmatched'
+        REQUESTS.labels(endpoint, request.method, str(status)).inc()
+        REQUEST_LATENCY.labels(endpoint, request.method).observe(time.perf_counter() - start)
+        if status >= 500:
+            REQUEST_ERRORS.labels(endpoint).inc()
+
+    def end_request(self, response):
+        self.record(response.status_code)
+        return response
+
+    def teardown_request(self, exc=None):
+        #after_request isn't called when a view raises, count those as 500s
+        if exc is not None:
+            self.record(500)
+
+    def export(self):
+        if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = REGISTRY
+        return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+metrics = Metrics()
@@ -0,0 +1,15 @@
+from app.migrations.base import Migration, MigrationRunner
+from app.migrations.m0001_user_emails import UserEmails
+from app.migrations.m0002_normalized_tags import NormalizedTags
+from app.migrations.m0003_summary_vectors import SummaryVectors
+from app.migrations.m0004_likes_collection import LikesCollection
+from app.migrations.m0005_drop_likes_arrays import DropLikesArrays
+
+#every migration in version order, add new ones at the end with the next version
+MIGRATIONS = [
+    UserEmails(),
+    NormalizedTags(),
+    SummaryVectors(),
+    LikesCollection(),
+    DropLikesArrays(),
+]
@@ -0,0 +1,139 @@
+import time
+from datetime import datetime, timezone
+
+class Migration:
+    '''
+    One versioned data migration. The runner scans `collection` for documents matching
+    `query` in _id order and bulk writes the operations returned by operations(document)
+    to `target` (default `collection`). before/after run once around the scan,
+    e.g. to create indexes or recount totals.
+    Migrations must be safe to re-run: a resumed batch may be applied twice.
+    '''
+    version = None
+    name = None
+    collection = None
+    target = None
+    query = {}
+    projection = None
+
+    def before(self, db):
+        pass
+
+    def operations(self, document):
+        return []
+
+    def after(self, db):
+        pass
+
+
+class MigrationRunner:
+    '''
+    Applies migrations in version order and records them in the migrations collection:
+    {_id: version, name, state: running|done, last_id, scanned, written, started_at, updated_at, finished_at}
+    -documents are read in batches of batch_size by _id, never holding more than one batch
+    -each batch is one unordered bulk_write, then last_id is checkpointed so an
+     interrupted migration resumes after the last written batch
+    -after each batch the runner sleeps pause_ratio times as long as the batch took, and
+     at least long enough to stay under max_docs_per_second, to leave room for production traffic
+    '''
+    def __init__(self, db, migrations, batch_size=500, pause_ratio=0.0, max_docs_per_second=0, log=print):
+        self.db = db
+        self.migrations = sorted(migrations, key=lambda migration: migration.version)
+        self.batch_size = batch_size
+        self.pause_ratio = pause_ratio
+        self.max_docs_per_second = max_docs_per_second
+        self.log = log
+
+    def records(self):
+        return {record['_id']: record for record in self.db.migrations.find()}
+
+    def pending(self, to=None):
+        records = self.records()
+        return [
+            migration for migration in self.migrations
+            if records.get(migration.version, {}).get('state') != 'done' and (to is None or migration.version <= to)
+        ]
+
+    def remaining_query(self, migration, last_id):
+        if last_id is None:
+            return migration.query
+        return {'$and': [migration.query, {'_id': {'$gt': last_id}}]}
+
+    def next_batch(self, migration, last_id):
+        cursor = self.db[migration.collection].find(self.remaining_query(migration, last_id), migration.projection)
+        return list(cursor.sort('_id', 1).limit(self.batch_size))
+
+    def estimate(self, migration):
+        '''
+        Documents left to scan and the writes they would produce, extrapolated from the next batch
+        '''
+        last_id = self.records().get(migration.version, {}).get('last_id')
+        count = self.db[migration.collection].count_documents(self.remaining_query(migration, last_id))
+        sample = self.next_batch(migration, last_id)
+        operations = sum(len(migration.operations(document)) for document in sample)
+        writes = round(count * operations / len(sample)) if sample else 0
+        return count, writes
+
+    def throttle(self, documents, elapsed):
+        pause = elapsed * self.pause_ratio
+        if self.max_docs_per_second:
+            pause = max(pause, documents / self.max_docs_per_second - elapsed)
+        if pause > 0:
+            time.sleep(pause)
+
+    def run(self, to=None, dry_run=False):
+        for migration in self.pending(to):
+            if dry_run:
+                count, writes = self.estimate(migration)
+                self.log(f"{migration.version:04d} {migration.name}: would scan {count} {migration.collection} documents, about {writes} writes")
+            else:
+                self.apply(migration)
+
+    def apply(self, migration):
+        record = self.db.migrations.find_one({'_id': migration.version}) or {}
+        last_id = record.get('last_id')
+        now = datetime.now(timezone.utc)
+        self.db.migrations.update_one(
+            {'_id': migration.version},
+            {'$set': {'name': migration.name, 'state': 'running', 'updated_at': now},
+             '$setOnInsert': {'started_at': now, 'scanned': 0, 'written': 0}},
+            upsert=True
+        )
+        if last_id is None:
+            migration.before(self.db)
+            self.log(f"{migration.version:04d} {migration.name}: started")
+        else:
+            self.log(f"{migration.version:04d} {migration.name}: resuming after {last_id} ({record.get('scanned', 0)} scanned)")
+
+        target = self.db[migration.target or migration.collection]
+        scanned, written = record.get('scanned', 0), record.get('written', 0)
+        start_scanned, start_time = scanned, time.time()
+        while True:
+            batch_start = time.perf_counter()
+            batch = self.next_batch(migration, last_id)
+            if not batch:
+                break
+            operations = [operation for document in batch for operation in migration.operations(document)]
+            batch_written = 0
+            if operations:
+                result = target.bulk_write(operations, ordered=False)
+                batch_written = result.modified_count + result.upserted_count + result.inserted_count + result.deleted_count
+            last_id = batch[-1]['_id']
+            scanned += len(batch)
+            written += batch_written
+            self.db.migrations.update_one(
+                {'_id': migration.version},
+                {'$set': {'last_id': last_id, 'updated_at': datetime.now(timezone.utc)},
+                 '$inc': {'scanned': len(batch), 'written': batch_written}}
+            )
+            elapsed = time.perf_counter() - batch_start
+            self.log(f"{migration.version:04d} {migration.name}: {scanned} scanned, {written} written "
+                     f"({(scanned - start_scanned) / max(time.time() - start_time, 1e-9):.0f} documents/s)")
+            self.throttle(len(batch), elapsed)
+
+        migration.after(self.db)
+        self.db.migrations.update_one(
+            {'_id': migration.version},
+            {'$set': {'state': 'done', 'finished_at': datetime.now(timezone.utc)}}
+        )
+        self.log(f"{migration.version:04d} {migration.name}: done, {scanned} scanned, {written} written")
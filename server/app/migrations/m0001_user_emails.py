@@ -0,0 +1,21 @@
+import re
+from pymongo import UpdateOne
+from app.migrations.base import Migration
+
+def generate_email_from_username(username):
+    """Generate a placeholder email from username"""
+    sanitized = re.sub(r'[^a-zA-Z0-9]', '', username)
+    return f"{sanitized}@briefly.example.com"
+
+class UserEmails(Migration):
+    """Add a placeholder email to users registered before emails were required"""
+    version = 1
+    name = "user_emails"
+    collection = "users"
+    query = {"email": {"$exists": False}}
+    projection = {"username": 1}
+
+    def operations(self, user):
+        if not user.get("username"):
+            return []
+        return [UpdateOne({"_id": user["_id"]}, {"$set": {"email": generate_email_from_username(user["username"])}})]
@@ -0,0 +1,19 @@
+from pymongo import UpdateOne
+from app.database import ensure_indexes
+from app.migrations.base import Migration
+from app.services.utils import normalize_tags
+
+class NormalizedTags(Migration):
+    """Add normalized_tags to articles and create the indexes used by recommendations (requires MongoDB 5.1+)"""
+    version = 2
+    name = "normalized_tags"
+    collection = "articles"
+    query = {"normalized_tags": {"$exists": False}}
+    projection = {"summarization.tags": 1}
+
+    def before(self, db):
+        ensure_indexes()
+
+    def operations(self, article):
+        tags = article.get("summarization", {}).get("tags", [])
+        return [UpdateOne({"_id": article["_id"]}, {"$set": {"normalized_tags": normalize_tags(tags)}})]
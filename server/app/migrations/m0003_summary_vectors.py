@@ -0,0 +1,23 @@
+from datetime import datetime, timezone
+from pymongo import UpdateOne
+from app.migrations.base import Migration
+from app.services.vectors import embed_summarization, pack_vector
+
+class SummaryVectors(Migration):
+    """Add summary_vector to articles that have a summarization, for similar article search"""
+    version = 3
+    name = "summary_vectors"
+    collection = "articles"
+    query = {"summary_vector": {"$exists": False}, "summarization": {"$exists": True}}
+    #only the fields used to compute the vector
+    projection = {"summarization.summary": 1, "summarization.key_points": 1}
+
+    def operations(self, article):
+        vector = embed_summarization(article.get("summarization"))
+        if vector is None:
+            return []
+        return [UpdateOne({"_id": article["_id"]}, {"$set": {
+            "summary_vector": pack_vector(vector),
+            #picked up by the vector indexes that already exist
+            "vector_updated_at": datetime.now(timezone.utc)
+        }})]
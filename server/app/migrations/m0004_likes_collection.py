@@ -0,0 +1,62 @@
+import logging
+from datetime import datetime, timezone
+from bson import ObjectId
+from pymongo import UpdateOne
+from app.database import ensure_indexes
+from app.migrations.base import Migration
+
+logger = logging.getLogger(__name__)
+
+class LikesCollection(Migration):
+    """
+    Copy the likes arrays in user documents into the likes collection, then recount
+    every article's like_count from it. The arrays are removed by migration 5, so
+    running up to version 4 keeps them for a rollback.
+    """
+    version = 4
+    name = "likes_collection"
+    collection = "users"
+    target = "likes"
+    query = {"likes": {"$exists": True}}
+    projection = {"likes": 1}
+
+    def before(self, db):
+        ensure_indexes()
+
+    def operations(self, user):
+        now = datetime.now(timezone.utc)
+        operations = []
+        for article_id in user.get("likes", []):
+            try:
+                article_obj_id = ObjectId(article_id)
+            except Exception:
+                logger.warning("Skipping invalid article id %s liked by user %s", article_id, user["_id"])
+                continue
+            operations.append(UpdateOne(
+                {"user_id": user["_id"], "article_id": article_obj_id},
+                {"$setOnInsert": {"liked": True, "created_at": now, "updated_at": now}},
+                upsert=True
+            ))
+        return operations
+
+    def after(self, db):
+        #recount like_count for every liked article in one aggregation, the new counts
+        #overwrite the old ones so articles never show 0 likes in between
+        db.likes.aggregate([
+            {"$match": {"liked": True}},
+            {"$group": {"_id": "$article_id", "like_count": {"$sum": 1}}},
+            {"$merge": {"into": "articles", "on": "_id", "whenMatched": "merge", "whenNotMatched": "discard"}}
+        ])
+        #then articles counted as liked that have no likes go back to 0, unless their count
+        #changed since it was read (liked meanwhile)
+        liked = {like["_id"] for like in db.likes.aggregate([
+            {"$match": {"liked": True}},
+            {"$group": {"_id": "$article_id"}}
+        ])}
+        operations = [
+            UpdateOne({"_id": article["_id"], "like_count": article["like_count"]}, {"$set": {"like_count": 0}})
+            for article in db.articles.find({"like_count": {"$gt": 0}}, {"like_count": 1})
+            if article["_id"] not in liked
+        ]
+        for start in range(0, len(operations), 1000):
+            db.articles.bulk_write(operations[start:start + 1000], ordered=False)
@@ -0,0 +1,13 @@
+from pymongo import UpdateOne
+from app.migrations.base import Migration
+
+class DropLikesArrays(Migration):
+    """Remove the likes arrays from user documents once the likes collection is in use"""
+    version = 5
+    name = "drop_likes_arrays"
+    collection = "users"
+    query = {"likes": {"$exists": True}}
+    projection = {"_id": 1}
+
+    def operations(self, user):
+        return [UpdateOne({"_id": user["_id"]}, {"$unset": {"likes": "", "likes_updated_at": ""}})]
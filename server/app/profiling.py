@@ -0,0 +1,141 @@
+import cProfile
+import logging
+import marshal
+import os
+import sys
+import threading
+import time
+from flask import g, jsonify, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+
+logger = logging.getLogger(__name__)
+
+MODES = ('cprofile', 'sample')
+
+
+class StackSampler:
+    '''
+    Samples the stack of one thread every interval seconds from a background thread.
+    Stacks are kept in the folded format used by flamegraph.pl and speedscope:
+    "outer (file.py:10);inner (file.py:20) <samples>"
+    enable/disable match cProfile.Profile so both profilers are used the same way.
+    '''
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = {}
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='profile-sampler', daemon=True)
+
+    def enable(self):
+        self.thread.start()
+
+    def disable(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                folded = ';'.join(reversed(stack))
+                self.stacks[folded] = self.stacks.get(folded, 0) + 1
+
+    def folded(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in sorted(self.stacks.items()))
+
+
+class RequestProfiler:
+    '''
+    Profiles single requests on demand. An admin adds the X-Profile header or the _profile
+    query parameter to any request:
+    -cprofile: deterministic profile, returned as a .prof file (pstats, snakeviz)
+    -sample: stack samples every PROFILE_SAMPLE_INTERVAL_MS, returned as a .folded file (flame graph)
+    The profile replaces the response body, the original status is in X-Profiled-Status.
+    At most PROFILE_MAX_CONCURRENT requests per worker are profiled at once, more get 429.
+    Disabled unless PROFILING_ENABLED is set.
+    '''
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.config.get('PROFILING_ENABLED', False):
+            return
+        self.slots = threading.BoundedSemaphore(app.config.get('PROFILE_MAX_CONCURRENT', 1))
+        self.sample_interval = app.config.get('PROFILE_SAMPLE_INTERVAL_MS', 5) / 1000
+        app.before_request(self.start)
+        app.after_request(self.finish)
+        app.teardown_request(self.release)
+
+    def requested_mode(self):
+        return (request.headers.get('X-Profile') or request.args.get('_profile') or '').lower() or None
+
+    def is_admin(self):
+        #same role check as the admin routes
+        try:
+            verify_jwt_in_request(optional=True)
+            identity = get_jwt_identity()
+        except Exception:
+            return False
+        return isinstance(identity, dict) and identity.get('role') == 'admin'
+
+    def start(self):
+        mode = self.requested_mode()
+        if mode is None:
+            return None
+        if mode not in MODES:
+            return jsonify({"error": f"Unknown profile mode, use one of: {', '.join(MODES)}"}), 400
+        if not self.is_admin():
+            return jsonify({"error": "Admin privileges required for profiling"}), 403
+        if not self.slots.acquire(blocking=False):
+            response = jsonify({"error": "Too many profiled requests, please try again later."})
+            response.status_code = 429
+            response.headers['Retry-After'] = '1'
+            return response
+        g.profile_slot = True
+        if mode == 'cprofile':
+            profiler = cProfile.Profile()
+        else:
+            profiler = StackSampler(threading.get_ident(), self.sample_interval)
+        profiler.enable()
+        g.profile = (mode, profiler, time.perf_counter())
+        return None
+
+    def finish(self, response):
+        profile = g.pop('profile', None)
+        if profile is None:
+            return response
+        mode, profiler, start = profile
+        profiler.disable()
+        elapsed = time.perf_counter() - start
+        if mode == 'cprofile':
+            profiler.create_stats()
+            data, extension, mimetype = marshal.dumps(profiler.stats), 'prof', 'application/octet-stream'
+        else:
+            data, extension, mimetype = profiler.folded(), 'folded', 'text/plain'
+        logger.info("Profiled %s in %.3f seconds", request.endpoint, elapsed, extra={'profile_mode': mode})
+
+        filename = f"profile-{request.endpoint or 'request'}-{int(time.time())}.{extension}"
+        status = response.status_code
+        response.set_data(data)
+        response.mimetype = mimetype
+        response.status_code = 200
+        response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+        response.headers['X-Profiled-Status'] = str(status)
+        response.headers['X-Profiled-Seconds'] = f'{elapsed:.3f}'
+        return response
+
+    def release(self, exc=None):
+        profile = g.pop('profile', None)
+        if profile is not None: #the view raised before after_request ran
+            profile[1].disable()
+        if g.pop('profile_slot', None):
+            self.slots.release()
+
+request_profiler = RequestProfiler()
@@ -0,0 +1,172 @@
+import json
+import logging
+import queue
+import random
+import threading
+import time
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+#commands that run a query plan, and where their filter is
+QUERY_FIELDS = {
+    'find': lambda command: {'filter': command.get('filter', {}), 'sort': command.get('sort')},
+    'aggregate': lambda command: {'pipeline': command.get('pipeline', [])},
+    'count': lambda command: {'query': command.get('query', {})},
+    'distinct': lambda command: {'key': command.get('key'), 'query': command.get('query', {})},
+    'findAndModify': lambda command: {'query': command.get('query', {}), 'sort': command.get('sort')},
+    'update': lambda command: {'q': (command.get('updates') or [{}])[0].get('q', {})},
+    'delete': lambda command: {'q': (command.get('deletes') or [{}])[0].get('q', {})},
+}
+
+#fields the driver adds to a command that explain doesn't accept
+DRIVER_FIELDS = {'lsid', '$db', '$clusterTime', '$readPreference', 'txnNumber', 'writeConcern', 'readConcern', 'cursor', 'ordered'}
+
+def query_shape(value):
+    '''
+    The query with every value replaced by 1, so queries that only differ in their
+    values have the same shape: {'url': {'$in': ['a', 'b']}} -> {'url': {'$in': [1]}}
+    '''
+    if isinstance(value, dict):
+        return {key: query_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        #pipelines keep every stage, value lists are reduced to one item
+        if value and all(isinstance(item, dict) for item in value):
+            return [query_shape(item) for item in value]
+        return [query_shape(value[0])] if value else []
+    return None if value is None else 1
+
+def uses_collscan(plan):
+    '''
+    True if any stage of an explain output is a collection scan
+    '''
+    if isinstance(plan, dict):
+        return plan.get('stage') == 'COLLSCAN' or any(uses_collscan(value) for value in plan.values())
+    if isinstance(plan, list):
+        return any(uses_collscan(value) for value in plan)
+    return False
+
+
+class QueryMonitor(monitoring.CommandListener):
+    '''
+    Records query shapes that take longer than SLOW_QUERY_MS, with their count and total time.
+    With QUERY_EXPLAIN_SAMPLE_RATE > 0, a sample of newly seen shapes (slow or not) is explained
+    on a background thread and shapes whose plan scans the whole collection are flagged.
+    Stats are kept per worker process.
+    '''
+    def __init__(self, slow_ms=100, explain_sample_rate=0.0, max_shapes=1000):
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.shapes = {}
+        self.explained = set()
+        self.explain_queue = queue.Queue(maxsize=100)
+        self.thread = None
+        self.client = None
+        self.configure(slow_ms, explain_sample_rate, max_shapes)
+
+    def configure(self, slow_ms, explain_sample_rate, max_shapes):
+        self.slow_ms = slow_ms
+        self.explain_sample_rate = explain_sample_rate
+        self.max_shapes = max_shapes
+
+    def init_app(self, app, client):
+        self.client = client
+        self.configure(
+            app.config.get('SLOW_QUERY_MS', 100),
+            app.config.get('QUERY_EXPLAIN_SAMPLE_RATE', 0.0),
+            app.config.get('QUERY_MONITOR_MAX_SHAPES', 1000)
+        )
+
+    def started(self, event):
+        fields = QUERY_FIELDS.get(event.command_name)
+        if fields is None:
+            return
+        collection = event.command.get(event.command_name)
+        shape = json.dumps(query_shape(fields(event.command)), default=str)
+        key = (event.command_name, collection, shape)
+        self.pending[(event.connection_id, event.request_id)] = key
+        if self.explain_sample_rate > 0 and key not in self.explained and random.random() < self.explain_sample_rate:
+            self.queue_explain(key, event.database_name, event.command)
+
+    def succeeded(self, event):
+        self.finish(event)
+
+    def failed(self, event):
+        self.finish(event)
+
+    def finish(self, event):
+        key = self.pending.pop((event.connection_id, event.request_id), None)
+        if key is None:
+            return
+        duration_ms = event.duration_micros / 1000
+        if duration_ms < self.slow_ms:
+            return
+        with self.lock:
+            stats = self.shapes.get(key)
+            if stats is None:
+                if len(self.shapes) >= self.max_shapes:
+                    return
+                stats = self.shapes[key] = {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'collscan': None}
+            stats['count'] += 1
+            stats['total_ms'] += duration_ms
+            stats['max_ms'] = max(stats['max_ms'], duration_ms)
+            stats['last_seen'] = time.time()
+        logger.warning("Slow %s on %s took %.1f ms", key[0], key[1], duration_ms, extra={'shape': key[2]})
+
+    def queue_explain(self, key, database, command):
+        with self.lock:
+            if key in self.explained:
+                return
+            self.explained.add(key)
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run_explains, name='query-explain', daemon=True)
+                self.thread.start()
+        explain_command = {name: value for name, value in command.items() if name not in DRIVER_FIELDS}
+        #explain takes a single update or delete statement, and aggregate needs a cursor option
+        for statements in ('updates', 'deletes'):
+            if statements in explain_command:
+                explain_command[statements] = explain_command[statements][:1]
+        if key[0] == 'aggregate':
+            explain_command['cursor'] = {}
+        try:
+            self.explain_queue.put_nowait((key, database, explain_command))
+        except queue.Full:
+            with self.lock:
+                self.explained.discard(key) #try again the next time the shape is seen
+
+    def run_explains(self):
+        while True:
+            key, database, command = self.explain_queue.get()
+            try:
+                plan = self.client[database].command({'explain': command, 'verbosity': 'queryPlanner'})
+                collscan = uses_collscan(plan)
+            except Exception:
+                logger.debug("Explaining %s on %s failed", key[0], key[1], exc_info=True)
+                continue
+            with self.lock:
+                stats = self.shapes.get(key)
+                if stats is None and collscan and len(self.shapes) < self.max_shapes:
+                    stats = self.shapes[key] = {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0}
+                if stats is not None:
+                    stats['collscan'] = collscan
+            if collscan:
+                logger.warning("%s on %s scans the whole collection", key[0], key[1], extra={'shape': key[2]})
+
+    def top(self, limit=20):
+        '''
+        Slow query shapes ordered by total time, with collscan True for shapes whose plan scans the collection
+        '''
+        with self.lock:
+            shapes = [
+                dict(stats, command=command, collection=collection, shape=json.loads(shape), total_ms=round(stats['total_ms'], 1), max_ms=round(stats['max_ms'], 1))
+                for (command, collection, shape), stats in self.shapes.items()
+            ]
+        shapes.sort(key=lambda stats: (stats['total_ms'], stats.get('collscan') or False), reverse=True)
+        return shapes[:limit]
+
+    def reset(self):
+        with self.lock:
+            self.shapes = {}
+            self.explained = set()
+
+query_monitor = QueryMonitor()
@@ -0,0 +1,207 @@
+import math
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from flask import g, jsonify, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from app.database import mongo
+from app.metrics import RATE_LIMITED
+
+UNITS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+def parse_limit(limit):
+    '''
+    Parses a limit like "10/minute" into (capacity, tokens refilled per second)
+    '''
+    count, unit = limit.split('/')
+    count = float(count)
+    return count, count / UNITS[unit.strip().rstrip('s')]
+
+
+class MemoryBackend:
+    '''
+    Token buckets and concurrency slots kept in this process only
+    '''
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.slots = {}
+
+    def take(self, key, capacity, rate):
+        '''
+        Takes a token from the bucket, returns (allowed, seconds until a token is available)
+        '''
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated = self.buckets.get(key, (capacity, now, capacity, rate))[:2]
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self.buckets[key] = (tokens, now, capacity, rate)
+            if len(self.buckets) > 100000:
+                #drop buckets that have refilled, they behave the same as a missing bucket
+                self.buckets = {k: v for k, v in self.buckets.items() if v[0] + (now - v[1]) * v[3] < v[2]}
+        return allowed, 0 if allowed else (1 - tokens) / rate
+
+    def acquire(self, key, limit, lease_seconds):
+        with self.lock:
+            active = self.slots.get(key, 0)
+            if active >= limit:
+                return None
+            self.slots[key] = active + 1
+        return key
+
+    def release(self, key, lease):
+        with self.lock:
+            self.slots[key] = max(self.slots.get(key, 1) - 1, 0)
+
+
+class MongoBackend:
+    '''
+    Token buckets and concurrency slots shared by every worker through MongoDB.
+    Each check is one atomic find_one_and_update, idle buckets expire with a TTL index.
+    '''
+    def take(self, key, capacity, rate):
+        elapsed = {'$divide': [{'$subtract': ['$$NOW', {'$ifNull': ['$updated_at', '$$NOW']}]}, 1000]}
+        bucket = mongo.db.rate_limits.find_one_and_update(
+            {'_id': key},
+            [
+                {'$set': {
+                    'tokens': {'$min': [capacity, {'$add': [{'$ifNull': ['$tokens', capacity]}, {'$multiply': [elapsed, rate]}]}]},
+                    'updated_at': '$$NOW',
+                    'expires_at': {'$add': ['$$NOW', int(capacity / rate * 1000)]}
+                }},
+                {'$set': {'allowed': {'$gte': ['$tokens', 1]}}},
+                {'$set': {'tokens': {'$cond': ['$allowed', {'$subtract': ['$tokens', 1]}, '$tokens']}}}
+            ],
+            projection={'tokens': 1, 'allowed': 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        if bucket['allowed']:
+            return True, 0
+        return False, (1 - bucket['tokens']) / rate
+
+    def acquire(self, key, limit, lease_seconds):
+        '''
+        Adds a lease to the slot document if fewer than limit unexpired leases exist.
+        Leases expire so a crashed worker can't hold a slot forever.
+        '''
+        lease = uuid.uuid4().hex
+        now = datetime.now(timezone.utc)
+        live = {'$filter': {'input': {'$ifNull': ['$leases', []]}, 'cond': {'$gt': ['$$this.expires_at', '$$NOW']}}}
+        try:
+            slots = mongo.db.concurrency_slots.find_one_and_update(
+                {'_id': key},
+                [
+                    {'$set': {'leases': live}},
+                    {'$set': {'leases': {'$cond': [
+                        {'$lt': [{'$size': '$leases'}, limit]},
+                        {'$concatArrays': ['$leases', [{'id': lease, 'expires_at': now + timedelta(seconds=lease_seconds)}]]},
+                        '$leases'
+                    ]}}}
+                ],
+                projection={'leases.id': 1},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError: #two workers created the slot document at the same time
+            return None
+        return lease if any(held['id'] == lease for held in slots['leases']) else None
+
+    def release(self, key, lease):
+        mongo.db.concurrency_slots.update_one({'_id': key}, {'$pull': {'leases': {'id': lease}}})
+
+
+class RateLimiter:
+    '''
+    Admission control for expensive routes, configured per endpoint in RATE_LIMITS:
+    'main.login': {'ip': '10/minute', 'identity': '5/minute', 'concurrency': 2}
+    -ip: token bucket per client address
+    -identity: token bucket per logged in user (JWT) or submitted username
+    -concurrency: max requests running at once across all workers (mongo backend)
+     or per worker (memory backend)
+    Rejected requests get 429 with Retry-After (503 when the concurrency cap is reached).
+    '''
+    def __init__(self, app=None):
+        self.limits = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('RATE_LIMIT_ENABLED', True)
+        self.trust_proxy = app.config.get('RATE_LIMIT_TRUST_PROXY', False)
+        self.lease_seconds = app.config.get('RATE_LIMIT_LEASE_SECONDS', 600)
+        self.backend = MongoBackend() if app.config.get('RATE_LIMIT_BACKEND') == 'mongo' else MemoryBackend()
+        self.limits = {}
+        for endpoint, limit in app.config.get('RATE_LIMITS', {}).items():
+            self.limits[endpoint] = {
+                'ip': parse_limit(limit['ip']) if limit.get('ip') else None,
+                'identity': parse_limit(limit['identity']) if limit.get('identity') else None,
+                'concurrency': limit.get('concurrency')
+            }
+        app.before_request(self.check)
+        app.teardown_request(self.release)
+
+    def client_ip(self):
+        if self.trust_proxy and request.headers.get('X-Forwarded-For'):
+            return request.headers['X-Forwarded-For'].split(',')[0].strip()
+        return request.remote_addr or 'unknown'
+
+    def client_identity(self):
+        '''
+        User id from a valid JWT, otherwise the username a login is attempted for
+        '''
+        try:
+            verify_jwt_in_request(optional=True)
+            identity = get_jwt_identity()
+        except Exception:
+            identity = None
+        if isinstance(identity, dict):
+            return identity.get('id')
+        if identity:
+            return str(identity)
+        data = request.get_json(silent=True)
+        if isinstance(data, dict) and isinstance(data.get('username'), str):
+            return 'username:' + data['username'].lower()
+        return None
+
+    def reject(self, endpoint, kind, retry_after, status=429):
+        RATE_LIMITED.labels(endpoint, kind).inc()
+        response = jsonify({"error": "Too many requests, please try again later."})
+        response.status_code = status
+        response.headers['Retry-After'] = str(max(math.ceil(retry_after), 1))
+        return response
+
+    def check(self):
+        limit = self.limits.get(request.endpoint)
+        if not self.enabled or not limit:
+            return None
+        endpoint = request.endpoint
+        if limit['ip']:
+            allowed, retry_after = self.backend.take(f'{endpoint}:ip:{self.client_ip()}', *limit['ip'])
+            if not allowed:
+                return self.reject(endpoint, 'ip', retry_after)
+        if limit['identity']:
+            identity = self.client_identity()
+            if identity:
+                allowed, retry_after = self.backend.take(f'{endpoint}:identity:{identity}', *limit['identity'])
+                if not allowed:
+                    return self.reject(endpoint, 'identity', retry_after)
+        if limit['concurrency']:
+            lease = self.backend.acquire(endpoint, limit['concurrency'], self.lease_seconds)
+            if lease is None:
+                return self.reject(endpoint, 'concurrency', 1, status=503)
+            g.rate_limit_lease = (endpoint, lease)
+        return None
+
+    def release(self, exc=None):
+        lease = g.pop('rate_limit_lease', None)
+        if lease:
+            self.backend.release(*lease)
+
+rate_limiter = RateLimiter()
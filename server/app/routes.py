@@ -1,22 +1,26 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, current_app, jsonify, redirect, request, send_file
 from marshmallow import ValidationError
-from app.database import mongo
-from app.schemas import article_schema, user_schema
+from app.database import mongo, feed_collection, pool_stats, user_collection
+from app.schemas import article_schema, user_schema, HIDDEN_ARTICLE_PROJECTION
 from datetime import datetime
-import random
-from app.services.news_api import NewsApi
 from app.services.utils import *
-from app.services.scraper import scrape_article
-from pymongo import UpdateOne
-from app.bcrypt import bcrypt, jwt
+from app.services.recommendations import compute_recommendations, load_recommendations, mark_recommendations_stale, recommendations_expired, removed_like_weight, save_recommendations, tag_profile_inc, tag_profile_weight
+from app.services.recommendation_worker import recommendation_worker
+from app.services.vectors import record_removals, set_summary_vector, unpack_vector, vector_index
+from app.services.trending import trending_counter
+from app.services.thumbnails import FORMATS, image_digest, thumbnail_cache, thumbnail_urls
+from app.services.archive import ARCHIVE_COLLECTION, find_article, find_articles, restore_article
+from app.services.likes import get_liked_article_ids, get_liked_articles_page, toggle_like, update_like_count
+from app.bcrypt import password_hasher, HashingBusy
 from flask_jwt_extended import create_access_token, get_jwt_identity, jwt_required
-import time
 from bson import ObjectId
-import json
+import logging
+import re
+from app.query_monitor import query_monitor
 
+logger = logging.getLogger(__name__)
 
 main = Blueprint("main", __name__)
-news_api = NewsApi()
 @main.route('/')
 def home():
     return "Hello, Flask!"
@@ -39,76 +43,72 @@ def test_connection():
     except Exception as e:
         return {"error": str(e)}
 
-@main.route('/api/insert_articles', methods=['POST'])
-def insert_article():
+def is_admin():
     '''
-    Manually insert one or multiple articles into the articles collection in briefly.
-    Must follow schema (see schema.py)
+    True if the request's JWT identity has the admin role
     '''
-    try:
-        content_type = request.headers.get('Content-Type')
-        if content_type == 'application/json':
-            data = request.get_json()
-        elif content_type == 'application/x-www-form-urlencoded':
-            data = request.form.to_dict()
-        else:
-            return jsonify({"error": "Unsupported Content-Type"})
-
-        #deserialize and validate input article data
-        if isinstance(data, list):
-            validated_data = article_schema.load(data, many=True)
-        elif isinstance(data, dict):
-            validated_data = article_schema.load(data)
-            validated_data = [validated_data] #converts to list for insert_many
-        else: 
-            return jsonify({"error": "Invalid data"})
-        
-        bulk_operations = [] #list of operations to perform
-
-        #create an operation to update article for each article
-        for article in validated_data:
-            bulk_operations.append(
-                UpdateOne(
-                    {"url": article["url"]},  # filter criteria
-                    {"$set": article},        # update operation
-                    upsert=True
-                )
-            )
-
-        results = mongo.db.articles.bulk_write(bulk_operations) #perform operations at once
-        article_urls = [article["url"] for article in validated_data] #list of article urls that were inserted
+    current_user = get_jwt_identity()
+    return isinstance(current_user, dict) and current_user.get('role') == 'admin'
 
-        #inserted_articles is a list of the inserted articles, finds the recently inserted articles using url
-        inserted_articles = list(mongo.db.articles.find({"url": {"$in": article_urls}})) 
+def serialize_articles(articles):
+    '''
+    Makes raw article documents JSON serializable and adds their thumbnail urls,
+    as ArticleSchema does for listed articles
+    '''
+    for article in articles:
+        article['thumbnails'] = thumbnail_urls(article['_id'], article.get('img'))
+        article['_id'] = str(article['_id'])
+    return articles
 
-        #convert mongodb ObjectId to str for dump
-        for article in inserted_articles:
-            article['_id'] = str(article['_id'])
+@main.route('/api/admin/db_pool', methods=['GET'])
+@jwt_required()
+def db_pool_stats():
+    '''
+    Connection pool statistics of this worker's MongoDB client, per server.
+    Required: User must be logged in with admin role
+    '''
+    if not is_admin():
+        return jsonify({"success": False, "error": "Admin privileges required for this operation"}), 403
+    client = mongo.cx
+    return jsonify({
+        "success": True,
+        "max_pool_size": client.options.pool_options.max_pool_size,
+        "min_pool_size": client.options.pool_options.min_pool_size,
+        "read_preference": feed_collection('articles').read_preference.mongos_mode,
+        "servers": pool_stats.snapshot()
+    })
 
-        created_at = datetime.now().isoformat()
+@main.route('/api/admin/slow_queries', methods=['GET', 'DELETE'])
+@jwt_required()
+def slow_queries():
+    '''
+    Slowest query shapes seen by this worker, ordered by total time (DELETE resets them).
+    Optional query parameter: limit (default 20)
+    Required: User must be logged in with admin role
+    '''
+    if not is_admin():
+        return jsonify({"success": False, "error": "Admin privileges required for this operation"}), 403
+    if request.method == 'DELETE':
+        query_monitor.reset()
+        return jsonify({"success": True})
+    limit = request.args.get('limit', default=20, type=int)
+    return jsonify({
+        "success": True,
+        "slow_query_ms": query_monitor.slow_ms,
+        "explain_sample_rate": query_monitor.explain_sample_rate,
+        "queries": query_monitor.top(max(1, min(limit, 200)))
+    })
 
-        return jsonify({
-            "success" : True,
-            "created_at" : created_at,
-            "num_inserted" : results.upserted_count,
-            "num_updated" : results.modified_count,
-            "num_processed" : len(bulk_operations),
-            "articles_processed" : article_schema.dump(inserted_articles, many=True)
-        }), 201
-    except Exception as e:
-        return jsonify({
-            "success" : False,
-            "error": str(e)
-        })
-    
 @main.route('/api/delete_all_articles', methods=['DELETE'])
 def delete_all():
     '''
-    Delete all articles in the articles collection in briefly.
+    Delete all articles in the articles collection in briefly, archived ones included.
     '''
     try:
         results = mongo.db.articles.delete_many({})
-        count = results.deleted_count
+        count = results.deleted_count + mongo.db[ARCHIVE_COLLECTION].delete_many({}).deleted_count
+        vector_index.clear()
+        record_removals(None)
         return jsonify({
             "success" : True,
             "deletedCount" : count,
@@ -125,6 +125,9 @@ def personalized_articles(user_id):
     '''
     Returns personalized article recommendations based on a user's liked articles.
     Analyzes the tags of articles the user has liked and returns other articles with similar tags.
+    Recommendations are served from the recommendations collection, which is refreshed in the
+    background (see services/recommendation_worker.py). They are only computed on demand
+    if the user has no stored entry or it is older than RECOMMENDATIONS_MAX_AGE_MINUTES.
     '''
     try:
         # Convert user_id to ObjectId
@@ -133,206 +136,30 @@ def personalized_articles(user_id):
         except Exception:
             return jsonify({"success": False, "error": "Invalid user_id format"}), 400
         
-        # Get the user and their likes
-        user = mongo.db.users.find_one({'_id': user_obj_id})
-        print(f"User lookup result: {user is not None}")
+        if request.args.get('mode') == 'similar':
+            return similar_personalized_articles(user_obj_id)
         
-        if not user:
-            print(f"User {user_id} not found in database")
-            return get_articles()
-            
-        # Check if user has likes
-        if 'likes' not in user:
-            print(f"User {user_id} has no 'likes' field in database")
-            return get_articles()
-            
-        # Check if likes array is empty
-        if not user['likes']:
-            print(f"User {user_id} has empty likes array")
-            return get_articles()
-            
-        # Log the raw likes array
-        print(f"Raw likes from database: {user['likes']}")
-        
-        try:
-            # Get all liked articles
-            liked_article_ids = [ObjectId(article_id) for article_id in user['likes']]
-            print(f"User {user_id} has {len(liked_article_ids)} liked articles")
-            print(f"First few liked_article_ids: {[str(id) for id in liked_article_ids[:3]]}")
-            
-            # Find the liked articles in the database
-            liked_articles = list(mongo.db.articles.find({'_id': {'$in': liked_article_ids}}))
-            print(f"Found {len(liked_articles)} liked articles in database")
-            
-            # Check if any liked articles were found
-            if not liked_articles:
-                print(f"WARNING: None of the user's liked articles were found in the database!")
-                # If no liked articles found in database, return regular articles
+        stored = load_recommendations(user_obj_id)
+        if stored and not recommendations_expired(stored):
+            if stored.get('stale'):
+                recommendation_worker.refresh_user(user_obj_id)
+            recommended_articles = stored['articles']
+            top_tags = stored['preferred_tags']
+        else:
+            # Compute from the user's likes and tag profile, fall back to regular articles if they have no likes
+            result = compute_recommendations(user_obj_id)
+            save_recommendations(user_obj_id, result)
+            if not result:
                 return get_articles()
-        except Exception as e:
-            print(f"Error processing liked articles: {str(e)}")
-            return get_articles()
-        
-        # Debug each liked article to see what tags are available
-        print(f"Debugging liked articles:")
-        for idx, article in enumerate(liked_articles):
-            article_id = str(article.get('_id', 'unknown'))
-            has_summarization = 'summarization' in article
-            has_tags = has_summarization and 'tags' in article['summarization']
-            tags = article['summarization'].get('tags', []) if has_summarization else []
-            print(f"Article {idx+1} (ID: {article_id})")
-            print(f"  Has summarization: {has_summarization}")
-            print(f"  Has tags: {has_tags}")
-            print(f"  Tags: {tags}")
-        
-        # Extract all tags from liked articles
-        preferred_tags = []
-        for article in liked_articles:
-            if 'summarization' in article and 'tags' in article['summarization']:
-                # Normalize tags - convert to lowercase and strip whitespace
-                article_tags = [tag.lower().strip() for tag in article['summarization']['tags'] if tag]
-                preferred_tags.extend(article_tags)
-        
-        # Count tag occurrences to find most preferred categories
-        tag_counts = {}
-        for tag in preferred_tags:
-            if tag:  # Only count non-empty tags
-                tag_counts[tag] = tag_counts.get(tag, 0) + 1
-        
-        print(f"Tag counts from liked articles: {tag_counts}")
-        
-        # If no tags were found, use the categories from article titles as a fallback
-        if not tag_counts:
-            print("No tags found in liked articles, using categories from article titles as fallback")
-            popular_categories = ["World News", "Technology", "Sports", "Business", "Entertainment", "Health", "Science", "Politics"]
-            
-            # Check article titles for category hints
-            for article in liked_articles:
-                title = article.get('title', '').lower()
-                for category in popular_categories:
-                    if category.lower() in title:
-                        tag_counts[category] = tag_counts.get(category, 0) + 1
-        
-        # Get top 3 preferred tags (or all if fewer than 3)
-        top_tags = sorted(tag_counts.items(), key=lambda x: x[1], reverse=True)
-        top_tags = [tag for tag, count in top_tags[:3]]
-        
-        # If still no tags found, use a default category based on liked articles
-        if not top_tags and liked_articles:
-            # Default to "General News" if we can't determine categories
-            top_tags = ["General News"]
-            
-        print(f"Top preferred tags: {top_tags}")
-        
-        # First get a larger pool of potential articles that match any of the preferred tags
-        or_conditions = []
-        for tag in top_tags:
-            # Exact tag matches with case insensitivity
-            or_conditions.append({'summarization.tags': {'$regex': f'^{tag}$', '$options': 'i'}})
-            # Partial tag matches for related content
-            or_conditions.append({'summarization.tags': {'$regex': tag, '$options': 'i'}})
-        
-        # Get a pool of candidate articles
-        candidate_articles = list(mongo.db.articles.find({
-            '_id': {'$nin': liked_article_ids},
-            '$or': or_conditions
-        }).limit(50))  # Get a larger pool to rank
-        
-        print(f"Found {len(candidate_articles)} candidate articles with tag matches")
-        
-        # If we don't have enough candidates, expand the search
-        if len(candidate_articles) < 10:
-            print("Not enough candidate articles, expanding search criteria")
-            # Add any articles with popular tags as fallback
-            popular_tags = ['Sports', 'Business', 'World News', 'Technology', 'Entertainment']
-            expanded_conditions = []
-            for tag in popular_tags:
-                expanded_conditions.append({'summarization.tags': {'$regex': f'^{tag}$', '$options': 'i'}})
-            
-            additional_articles = list(mongo.db.articles.find({
-                '_id': {'$nin': liked_article_ids + [article['_id'] for article in candidate_articles]},
-                '$or': expanded_conditions
-            }).limit(50 - len(candidate_articles)))
-            
-            candidate_articles.extend(additional_articles)
-            print(f"Added {len(additional_articles)} additional articles from popular categories")
-        
-        # Score each article based on how well it matches the preferred tags
-        scored_articles = []
-        for article in candidate_articles:
-            score = 0
-            if 'summarization' in article and 'tags' in article['summarization']:
-                article_tags = [tag.lower().strip() for tag in article['summarization']['tags']]
-                
-                # Count direct matches with preferred tags (higher score for exact match)
-                for preferred_tag in top_tags:
-                    if preferred_tag.lower() in article_tags:
-                        score += 10  # High score for exact match
-                    elif any(preferred_tag.lower() in tag for tag in article_tags):
-                        score += 5   # Medium score for partial match
-                    
-                # Extra score for articles that match multiple preferred tags
-                matches = sum(1 for tag in top_tags if tag.lower() in article_tags or 
-                             any(tag.lower() in t for t in article_tags))
-                if matches > 1:
-                    score += matches * 5  # Bonus for matching multiple preferred tags
-                
-                # Add slight boost for recency
-                if 'published_date' in article:
-                    try:
-                        pub_date = datetime.strptime(article['published_date'], '%Y-%m-%dT%H:%M:%S')
-                        days_old = (datetime.now() - pub_date).days
-                        if days_old < 3:
-                            score += 3  # Boost very recent articles
-                        elif days_old < 7:
-                            score += 1  # Small boost for articles less than a week old
-                    except:
-                        pass  # Skip date scoring if format issues
-                
-                # Add randomness factor to prevent repeated identical recommendations
-                score += random.uniform(0, 2)  # Small random component
-                
-                scored_articles.append((article, score))
-            else:
-                # Articles without tags still get considered but with a low score
-                scored_articles.append((article, 0.5))
-        
-        # Sort by score (highest first) and take top 10
-        sorted_articles = sorted(scored_articles, key=lambda x: x[1], reverse=True)
-        recommended_articles = [article for article, score in sorted_articles[:10]]
-        
-        # Log the scores of selected articles for debugging
-        print(f"Selected articles with scores:")
-        for i, (article, score) in enumerate(sorted_articles[:10]):
-            article_id = str(article.get('_id', 'unknown'))
-            article_tags = article.get('summarization', {}).get('tags', [])
-            print(f"  {i+1}. ID: {article_id}, Score: {score}, Tags: {article_tags}")
-        
-        print(f"Final recommendation count: {len(recommended_articles)} articles")
-        
-        # If still not enough recommendations, add some general articles
-        if len(recommended_articles) < 10:
-            additional_articles = list(mongo.db.articles.find({
-                '_id': {'$nin': liked_article_ids + [article['_id'] for article in recommended_articles]}
-            }).limit(10 - len(recommended_articles)))
-            
-            print(f"Added {len(additional_articles)} general articles to fill up recommendations")
-            recommended_articles.extend(additional_articles)
+            recommended_articles = result['articles']
+            top_tags = result['top_tags']
         
-        # For debugging: print the tags of recommended articles
-        for i, article in enumerate(recommended_articles):
-            tags = article.get('summarization', {}).get('tags', [])
-            print(f"Recommended article {i+1} tags: {tags}")
-        
-        # Convert ObjectId to string for JSON serialization
-        for article in recommended_articles:
-            article['_id'] = str(article['_id'])
+        # Convert ObjectId to string for JSON serialization, add thumbnail urls
+        serialize_articles(recommended_articles)
             
         # Make sure we capitalize the tags for better display
         display_tags = [tag.capitalize() for tag in top_tags]
         
-        print(f"Returning {len(recommended_articles)} personalized articles with tags: {display_tags}")
-        
         return jsonify({
             'success': True,
             'num_found': len(recommended_articles),
@@ -341,10 +168,140 @@ def personalized_articles(user_id):
         })
         
     except Exception as e:
-        print(f"Error generating personalized articles: {str(e)}")
+        logger.exception("Error generating personalized articles")
         # Fallback to regular articles API
         return get_articles()
 
+def similar_personalized_articles(user_obj_id):
+    '''
+    Personalized recommendations based on summary similarity instead of tags.
+    Averages the summary vectors of the user's liked articles and returns the
+    closest articles from the in-memory vector index.
+    '''
+    liked_article_ids = get_liked_article_ids(user_obj_id)
+    if not liked_article_ids:
+        return get_articles()
+    
+    vector = vector_index.profile_vector(liked_article_ids)
+    if vector is None:
+        return get_articles()
+    
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+    matches = vector_index.search(vector, k=limit, exclude=liked_article_ids)
+    recommended_articles = get_articles_by_ids([article_id for article_id, score in matches])
+    serialize_articles(recommended_articles)
+    
+    return jsonify({
+        'success': True,
+        'num_found': len(recommended_articles),
+        'preferred_tags': [],
+        'articles': recommended_articles
+    })
+
+@main.route('/api/similar_articles/<article_id>', methods=['GET'])
+def similar_articles(article_id):
+    '''
+    Returns the articles whose summaries are most similar to the given article ("more like this").
+    Optional query parameter: limit (default 10, max 50)
+    '''
+    try:
+        try:
+            article_obj_id = ObjectId(article_id)
+        except Exception:
+            return jsonify({"success": False, "error": "Invalid article_id format"}), 400
+        
+        vector = vector_index.get(article_obj_id)
+        if vector is None:
+            # Article may have been added by another worker since the index was last synced
+            article = find_article(article_obj_id, {"summary_vector": 1})
+            if not article:
+                return jsonify({"success": False, "error": "Article not found"}), 404
+            vector = unpack_vector(article.get("summary_vector"))
+            if vector is None:
+                return jsonify({"success": True, "num_found": 0, "articles": []}), 200
+        
+        limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+        matches = vector_index.search(vector, k=limit, exclude=[article_obj_id])
+        scores = {match_id: score for match_id, score in matches}
+        articles = get_articles_by_ids(list(scores))
+        for article in articles:
+            article['similarity'] = round(scores[article['_id']], 4)
+        serialize_articles(articles)
+        
+        return jsonify({
+            "success": True,
+            "num_found": len(articles),
+            "articles": articles
+        }), 200
+    except Exception as e:
+        logger.exception("Error finding similar articles")
+        return jsonify({
+            "success": False,
+            "error": str(e),
+            "articles": []
+        }), 500
+
+@main.route('/api/trending', methods=['GET'])
+def trending_articles():
+    '''
+    Returns the most liked articles right now, ranked by a time-decayed like score.
+    Optional query parameter: limit (default 10, max 100)
+    '''
+    try:
+        limit = min(max(request.args.get('limit', 10, type=int), 1), 100)
+        articles = trending_counter.top(limit)
+        
+        # Convert ObjectId to string for JSON serialization, add thumbnail urls
+        serialize_articles(articles)
+        
+        return jsonify({
+            "success": True,
+            "num_found": len(articles),
+            "articles": articles
+        }), 200
+    except Exception as e:
+        logger.exception("Error getting trending articles")
+        return jsonify({
+            "success": False,
+            "error": str(e),
+            "articles": []
+        }), 500
+
+@main.route('/api/thumbnails/<article_id>/<digest>/<int:width>.<fmt>', methods=['GET'])
+def article_thumbnail(article_id, digest, width, fmt):
+    '''
+    Serves a resized copy of an article's image from the thumbnail cache, making it on first request.
+    The urls are listed in the thumbnails field of articles, they change with the image so
+    responses can be cached for good. Redirects to the original image if it can't be resized.
+    '''
+    try:
+        if fmt not in FORMATS or width not in thumbnail_cache.widths or not re.fullmatch(r"[0-9a-f]{20}", digest):
+            return jsonify({"success": False, "error": "Thumbnail not found"}), 404
+
+        path = thumbnail_cache.lookup(digest, width, fmt)
+        if path is None:
+            try:
+                article_obj_id = ObjectId(article_id)
+            except Exception:
+                return jsonify({"success": False, "error": "Invalid article_id format"}), 400
+            article = find_article(article_obj_id, {"img": 1})
+            img = article.get("img") if article else None
+            if not isinstance(img, str) or image_digest(img) != digest:
+                return jsonify({"success": False, "error": "Thumbnail not found"}), 404
+            path = thumbnail_cache.get(img, width, fmt)
+            if path is None:
+                response = redirect(img)
+                response.cache_control.max_age = 300
+                return response
+
+        response = send_file(path, mimetype=FORMATS[fmt][1], max_age=current_app.config.get('THUMBNAIL_MAX_AGE', 31536000))
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+    except Exception as e:
+        logger.exception("Error serving thumbnail")
+        return jsonify({"success": False, "error": str(e)}), 500
+
 @main.route('/api/get_articles', methods=['GET'])
 def get_articles():
     title = request.args.get('title')
@@ -352,9 +309,10 @@ def get_articles():
     author = request.args.get('author')  # Author filter
     start_date = request.args.get('start_date')  # Start date filter (e.g. '2025-01-01')
     end_date = request.args.get('end_date')  # End date filter (e.g. '2025-12-31')
+    include_archived = request.args.get('include_archived', '').lower() in ('1', 'true')  # Also search archived articles
 
     # Build the filter query
-    query = {}
+    query = {"duplicate_of": {"$exists": False}} #near-duplicates are only kept to link them to their canonical article
 
     if title:
         query["title"] = {"$regex": title, "$options": "i"} # case-insensitive match
@@ -376,13 +334,21 @@ def get_articles():
         query["published_date"]["$lte"] = datetime.strptime(end_date, "%Y-%m-%d")
 
     # Query the database for articles based on the filter
-    articles = list(mongo.db.articles.find(query))
+    articles = find_articles(query, HIDDEN_ARTICLE_PROJECTION, include_archived)
 
     return jsonify({
         "num_found" : len(articles),
         "articles": article_schema.dump(articles, many=True)
     })
 
+def hashing_busy_response():
+    '''
+    Response for login/register when the password hashing pool is saturated or too slow
+    '''
+    response = jsonify({"error": "Server is busy, please try again shortly."})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
 @main.route('/register', methods=['POST'])
 def register():
     '''
@@ -414,7 +380,10 @@ def register():
         return jsonify({"msg": "Password must be at least 8 characters long and include uppercase, lowercase, number, and special character"}), 400
     
     # Hash password and create user object
-    hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
+    try:
+        hashed_password = password_hasher.hash(password)
+    except HashingBusy:
+        return hashing_busy_response()
     user = {
         "username": username,
         "email": email,
@@ -424,7 +393,7 @@ def register():
 
     try:
         validated_user = user_schema.load(user) # Validate user against schema
-        mongo.db.users.insert_one(validated_user) # Insert the user
+        user_collection('users').insert_one(validated_user) # Insert the user
         return jsonify({"msg": "User registered successfully"}), 201
     except ValidationError as err:
         return jsonify({"msg": "Validation error", "errors": err.messages}), 400
@@ -454,9 +423,16 @@ def login():
         user = get_user(username)
         
         # Check if user exists or if password matches
-        if not user or not bcrypt.check_password_hash(user["password"], password):
+        if not user or not password_hasher.check(user["password"], password):
             return jsonify({"error": "Invalid username or password"}), 401
         
+        # Upgrade the stored hash if it was created with a different work factor
+        if password_hasher.needs_rehash(user["password"]):
+            try:
+                user_collection('users').update_one({"_id": user["_id"]}, {"$set": {"password": password_hasher.hash(password)}})
+            except HashingBusy:
+                pass #upgrade on a later login instead of failing this one
+        
         # Create user info for JWT claim - avoid complex objects
         user_id = str(user['_id'])
         user_claims = {
@@ -468,14 +444,9 @@ def login():
         # Create JWT token with user claims
         access_token = create_access_token(identity=user_claims)
         
-        # Get user likes and convert ObjectIds to strings if needed
-        user_likes = user.get('likes', [])
-        print(f"User {username} has {len(user_likes)} likes in database")
-        
-        # Ensure likes are properly formatted as strings
-        if user_likes:
-            user_likes = [str(like_id) for like_id in user_likes]
-            print(f"First few likes: {user_likes[:3]}")
+        # Get user likes as strings
+        user_likes = [str(like_id) for like_id in get_liked_article_ids(user['_id'])]
+        logger.debug("User %s logged in with %d likes", username, len(user_likes))
         
         # Return the user's MongoDB ID, role, and token
         return jsonify({
@@ -485,8 +456,10 @@ def login():
             'likes': user_likes
         }), 200
     
+    except HashingBusy:
+        return hashing_busy_response()
     except Exception as e:
-        print(f"Login error: {str(e)}")
+        logger.exception("Login error")
         return jsonify({"error": "An error occurred during login. Please try again."}), 500
 
 @main.route('/api/user/likes/<user_id>', methods=['GET'])
@@ -499,17 +472,17 @@ def get_user_likes(user_id):
             return jsonify({"success": False, "error": "Invalid user_id format"}), 400
             
         # Find the user
-        user = mongo.db.users.find_one({"_id": user_obj_id})
+        user = mongo.db.users.find_one({"_id": user_obj_id}, {"_id": 1})
         if not user:
             return jsonify({"success": False, "error": "User not found"}), 404
             
         # Return the user's likes
         return jsonify({
             "success": True,
-            "likes": user.get('likes', [])
+            "likes": [str(article_id) for article_id in get_liked_article_ids(user_obj_id)]
         }), 200
     except Exception as e:
-        print(f"Error getting user likes: {str(e)}")
+        logger.exception("Error getting user likes")
         return jsonify({
             "success": False,
             "error": str(e),
@@ -518,7 +491,8 @@ def get_user_likes(user_id):
 @main.route('/api/user/liked_articles/<user_id>', methods=['GET'])
 def get_user_liked_articles(user_id):
     '''
-    Fetch the full article details for all articles a user has liked
+    Fetch the full article details for the articles a user has liked, most recent first
+    Optional query parameters: page (default 1), per_page (default 50, max 100)
     '''
     try:
         # Convert string ID to ObjectId
@@ -526,45 +500,31 @@ def get_user_liked_articles(user_id):
             user_obj_id = ObjectId(user_id)
         except Exception:
             return jsonify({"success": False, "error": "Invalid user_id format"}), 400
+        
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = min(max(request.args.get('per_page', 50, type=int), 1), 100)
             
-        # Find the user and get their likes
-        user = mongo.db.users.find_one({"_id": user_obj_id})
+        # Find the user
+        user = mongo.db.users.find_one({"_id": user_obj_id}, {"_id": 1})
         if not user:
             return jsonify({"success": False, "error": "User not found"}), 404
         
-        user_likes = user.get('likes', [])
-        if not user_likes:
-            return jsonify({
-                "success": True,
-                "num_found": 0,
-                "articles": []
-            }), 200
+        # Fetch one page of liked articles
+        liked_articles, total = get_liked_articles_page(user_obj_id, page, per_page)
         
-        # Convert string IDs to ObjectIds
-        try:
-            liked_article_ids = [ObjectId(article_id) for article_id in user_likes]
-        except Exception as e:
-            print(f"Error converting article IDs: {str(e)}")
-            return jsonify({"success": False, "error": "Invalid article ID format"}), 400
-        
-        # Fetch the articles from the database
-        liked_articles = list(mongo.db.articles.find({
-            "_id": {"$in": liked_article_ids}
-        }))
-        
-        print(f"Found {len(liked_articles)} liked articles for user {user_id}")
-        
-        # Convert ObjectIds to strings for JSON serialization
-        for article in liked_articles:
-            article['_id'] = str(article['_id'])
+        # Convert ObjectIds to strings for JSON serialization, add thumbnail urls
+        serialize_articles(liked_articles)
         
         return jsonify({
             "success": True,
             "num_found": len(liked_articles),
+            "total": total,
+            "page": page,
+            "per_page": per_page,
             "articles": liked_articles
         }), 200
     except Exception as e:
-        print(f"Error getting liked articles: {str(e)}")
+        logger.exception("Error getting liked articles")
         return jsonify({
             "success": False,
             "error": str(e),
@@ -573,6 +533,10 @@ def get_user_liked_articles(user_id):
 
 @main.route('/api/like_article', methods=['POST'])
 def like_article():
+    '''
+    Toggle a user's like on an article.
+    Updates the likes collection, the article's like_count and the user's tag profile.
+    '''
     try:
         data = request.get_json()
         user_id = data.get('user_id')
@@ -587,134 +551,46 @@ def like_article():
         except Exception:
             return jsonify({"success": False, "error": "Invalid user_id or article_id format"}), 400
         
-        #tries adding article to user likes array
-        user_update_result = mongo.db.users.update_one(
-            {"_id": user_obj_id},
-            {"$addToSet": {"likes": str(article_obj_id)}}
-        )
+        #weight a like adds to the user's tag profile, computed first so nothing is written if it fails
+        weight = tag_profile_weight(user_obj_id)
 
-        #checks if there was an article added
-        if (user_update_result.modified_count != 0):
-            print('Added article_id', article_obj_id, 'to user', user_obj_id, 'likes')
-        #if article not added, then it already exists in likes array, then remove it
-        else:
-            user_update_result = mongo.db.users.update_one(
-            {"_id": user_obj_id},
-            {"$pull": {"likes": str(article_obj_id)}})
-            print('Removed article_id', article_obj_id, 'from user', user_obj_id, 'likes')
+        #likes the article if it isn't liked yet, otherwise removes the like (one atomic operation)
+        like, modified_count = toggle_like(user_obj_id, article_obj_id, weight)
+        liked = like['liked']
+        if not liked:
+            weight = -removed_like_weight(user_obj_id, like)
+
+        #update the article's like count, also returns its tags for the user's tag profile
+        article = update_like_count(article_obj_id, liked, projection={"normalized_tags": 1, "like_count": 1})
+        if article is None and restore_article(article_obj_id):
+            #liked articles aren't kept in the archive
+            article = update_like_count(article_obj_id, liked, projection={"normalized_tags": 1, "like_count": 1})
+        article_tags = article.get("normalized_tags", []) if article else []
+        profile_update = tag_profile_inc(article_tags, weight)
+        if profile_update:
+            user_collection('users').update_one({"_id": user_obj_id}, profile_update)
+
+        #count the like or unlike towards the article's trending score
+        trending_counter.record(article_obj_id, 1 if liked else -1)
+
+        #user's taste changed, refresh their stored recommendations
+        mark_recommendations_stale(user_obj_id)
+        recommendation_worker.refresh_user(user_obj_id)
 
         return jsonify({
             "success": True,
-            "user_modified_count": user_update_result.modified_count,
+            "liked": liked,
+            "like_count": article.get("like_count", 0) if article else 0,
+            "user_modified_count": modified_count,
         }), 200
     
     except Exception as e:
-        print("Like article failed:", str(e))
+        logger.exception("Like article failed")
         return jsonify({
             "success": False,
             "error": str(e),
         }), 500
     
-@main.route('/api/test_scraper_v2', methods=['POST'])
-def scrape_article_test():
-    data = request.get_json()
-    url = data.get('url')
-    result = scrape_article(url)
-    result_json = json.loads(result.data)
-    print(result_json)
-    return jsonify({
-        'success' : True
-    })
-
-@main.route('/api/generate_articles', methods=['POST'])
-def generate_articles():
-    '''
-    Generate articles based on the provided keywords.
-    Parameters:
-    q : Keywords or phrases to search for in the article title and body.
-    searchIn : The fields to restrict your q search to. options = (title, description, content)
-    domains : A comma-seperated string of domains (eg bbc.co.uk, techcrunch.com, engadget.com) to restrict the search to.
-    excludeDomains: A comma-seperated string of domains (eg bbc.co.uk, techcrunch.com, engadget.com) to remove from the results.
-    pageSize : The number of results to return per page.
-    '''
-    start_time = time.time()
-    try:
-        if request.method == 'POST':
-            content_type = request.headers.get('Content-Type')
-            if content_type == 'application/json':
-                data = request.get_json()
-            elif content_type == 'application/x-www-form-urlencoded':
-                data = request.form.to_dict()
-            else:
-                return jsonify({"error": "Unsupported Content-Type"})
-            if not isinstance(data, dict):
-                return jsonify({"error": "Invalid data"})
-        else:
-            data = {}
-        
-        data["pageSize"] = 5 #setting max articles to get to 5 (for now)
-        data['sortBy'] = 'relevancy'
-        data['excludeDomains'] = 'businessinsider.com'
-        print('Parameters for article query from NewsAPI:', data)
-        result = news_api.get_articles(params=data) #result is a jsonify object from get_articles
-        #print("Results from News API: \n", json.loads(result.data))
-
-        summarized_dict = scrape_summarize(result) #dict that includes processed articles + summarizations
-        #print('Dictionary that has summarization: \n', summarized_dict)
-
-        processed_articles = summarized_dict['processed_articles'] #extract processed articles
-        validated_data = article_schema.load(processed_articles, many=True) #schema validation against the processed articles
-
-        bulk_operations = [] #list of operations to perform
-        
-        #create an operation to update article for each article
-        for article in validated_data:
-            bulk_operations.append(
-                UpdateOne(
-                    {"url": article["url"]},  # filter
-                    {"$set": article},        # update
-                    upsert=True #if article doesnt exist, insert
-                )
-            )
-        
-        results = mongo.db.articles.bulk_write(bulk_operations) #perform the operations at once
-        article_urls = [article["url"] for article in validated_data] #list of article urls that were inserted
-
-        #inserted_articles is a list of the inserted articles, finds the recently inserted articles using url
-        inserted_articles = list(mongo.db.articles.find({"url": {"$in": article_urls}}))
-
-        #convert mongodb ObjectId to str for dump
-        for article in inserted_articles:
-            article['_id'] = str(article['_id'])
-        
-        created_at = datetime.now().isoformat()
-        
-        end_time = time.time()
-        execution_time = end_time - start_time
-
-        print("Generate_articles execution report:")
-        print("Articles failed:", summarized_dict["num_failed"])
-        print("Articles inserted:", results.upserted_count)
-        print("Articles updated:", results.modified_count)
-        print(f"Execution time: {execution_time:.4f} seconds")
-        return jsonify({
-            "success" : True,
-            "created_at" : created_at,
-            "num_inserted" : results.upserted_count,
-            "num_updated" : results.modified_count,
-            "num_processed" : len(bulk_operations),
-            "num_failed" : summarized_dict["num_failed"],
-            "articles_processed" : article_schema.dump(inserted_articles, many=True)
-        }), 201
-    except Exception as e:
-        end_time = time.time()
-        execution_time = end_time - start_time  # Capture time even if it fails
-        print("Generate_articles failed after", f"{execution_time:.4f} seconds")
-        return jsonify({
-            "success" : False,
-            "error": str(e),
-        })
-
 @main.route('/api/delete_article/<article_id>', methods=['DELETE'])
 @jwt_required()
 def delete_article(article_id):
@@ -725,11 +601,11 @@ def delete_article(article_id):
     # Get the current user identity from JWT
     try:
         current_user = get_jwt_identity()
-        print(f"JWT Identity received: {current_user}")
+        logger.debug("JWT identity received: %s", current_user)
         
         # Check if we have valid user data
         if not current_user:
-            print("No user identity found in token")
+            logger.info("No user identity found in token")
             return jsonify({"success": False, "error": "Authentication required"}), 401
         
         # Extract role - handle both dict and string formats
@@ -739,18 +615,18 @@ def delete_article(article_id):
             username = current_user.get('username', 'unknown')
         elif isinstance(current_user, str):
             # Try to handle string format (fallback)
-            print(f"Identity is a string: {current_user}")
+            logger.debug("Identity is a string: %s", current_user)
             user_role = 'admin' if 'admin' in current_user.lower() else 'user'
             username = current_user
         else:
-            print(f"Unexpected identity type: {type(current_user)}")
+            logger.warning("Unexpected identity type: %s", type(current_user))
             username = 'unknown'
         
-        print(f"User role extracted: {user_role}")
+        logger.debug("User role extracted: %s", user_role)
         
         # Check admin privileges 
         if user_role != 'admin':
-            print(f"Insufficient privileges: {user_role}")
+            logger.info("Insufficient privileges: %s", user_role)
             return jsonify({
                 "success": False, 
                 "error": "Admin privileges required for this operation"
@@ -760,31 +636,36 @@ def delete_article(article_id):
         try:
             article_obj_id = ObjectId(article_id)
         except Exception as e:
-            print(f"Invalid article ID format: {article_id}, error: {str(e)}")
+            logger.info("Invalid article ID format: %s, error: %s", article_id, e)
             return jsonify({
                 "success": False,
                 "error": "Invalid article ID format"
             }), 400
         
-        # Delete the article from MongoDB
+        # Delete the article from MongoDB, or from the archive if it was archived
         result = mongo.db.articles.delete_one({"_id": article_obj_id})
+        if result.deleted_count == 0:
+            result = mongo.db[ARCHIVE_COLLECTION].delete_one({"_id": article_obj_id})
         
         # Check if article was found and deleted
         if result.deleted_count == 0:
-            print(f"Article not found: {article_id}")
+            logger.info("Article not found: %s", article_id)
             return jsonify({
                 "success": False,
                 "error": "Article not found"
             }), 404
         
-        print(f"Article {article_id} successfully deleted by {username}")
+        vector_index.remove(article_obj_id)
+        record_removals([article_obj_id])
+        
+        logger.info("Article %s deleted by %s", article_id, username)
         return jsonify({
             "success": True,
             "message": f"Article with ID {article_id} deleted successfully"
         }), 200
         
     except Exception as e:
-        print(f"Error in delete_article: {str(e)}")
+        logger.exception("Error in delete_article")
         return jsonify({
             "success": False,
             "error": f"An error occurred: {str(e)}"
@@ -864,11 +745,12 @@ def update_article(article_id):
                 "error": "Invalid article ID format"
             }), 400
         
-        # Update the article in MongoDB
-        result = mongo.db.articles.update_one(
-            {"_id": article_obj_id},
-            {"$set": update_fields}
-        )
+        # Update the article in MongoDB, or in the archive if it was archived
+        collection = mongo.db.articles
+        result = collection.update_one({"_id": article_obj_id}, {"$set": update_fields})
+        if result.matched_count == 0:
+            collection = mongo.db[ARCHIVE_COLLECTION]
+            result = collection.update_one({"_id": article_obj_id}, {"$set": update_fields})
         
         # Check if article was found and updated
         if result.matched_count == 0:
@@ -878,11 +760,18 @@ def update_article(article_id):
             }), 404
         
         # Get the updated article to return
-        updated_article = mongo.db.articles.find_one({"_id": article_obj_id})
+        updated_article = collection.find_one({"_id": article_obj_id}, HIDDEN_ARTICLE_PROJECTION)
         if updated_article:
-            updated_article['_id'] = str(updated_article['_id'])
-        
-        print(f"Article {article_id} successfully updated by {username}")
+            # Summary changed, so recompute the article's summary vector
+            set_summary_vector(updated_article)
+            if 'summary_vector' in updated_article:
+                vector = updated_article.pop('summary_vector')
+                collection.update_one({"_id": article_obj_id}, {"$set": {"summary_vector": vector, "vector_updated_at": updated_article.pop('vector_updated_at')}})
+                if collection.name == 'articles': #archived articles aren't in the similarity index
+                    vector_index.update(article_obj_id, unpack_vector(vector))
+            serialize_articles([updated_article])
+        
+        logger.info("Article %s updated by %s", article_id, username)
         return jsonify({
             "success": True,
             "message": f"Article with ID {article_id} updated successfully",
@@ -890,7 +779,7 @@ def update_article(article_id):
         }), 200
         
     except Exception as e:
-        print(f"Error in update_article: {str(e)}")
+        logger.exception("Error in update_article")
         return jsonify({
             "success": False,
             "error": f"An error occurred: {str(e)}"
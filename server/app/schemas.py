@@ -1,4 +1,5 @@
 from marshmallow import Schema, fields, INCLUDE, EXCLUDE, validate
+from app.services.thumbnails import thumbnail_urls
 
 class SummarizationSchema(Schema):
     summary = fields.Str(required=True)
@@ -16,6 +17,12 @@ class ArticleSchema(Schema):
     url = fields.Url(required=True)
     img = fields.Url(allow_none=True, missing="None")
     summarization = fields.Nested(SummarizationSchema)
+    like_count = fields.Int(dump_only=True, dump_default=0)
+    #{format: {width: url}} of resized copies of img served by the api, None without an image
+    thumbnails = fields.Method("get_thumbnails", dump_only=True)
+
+    def get_thumbnails(self, article):
+        return thumbnail_urls(article.get('_id'), article.get('img'))
 
 class UserSchema(Schema):
     class Meta:
@@ -24,7 +31,10 @@ class UserSchema(Schema):
     email = fields.Email(required=True)
     password = fields.Str(required=True, validate=validate.Length(min=8))
     role = fields.Str(missing="user")
-    likes = fields.List(fields.Str, missing=list)
+
+#internal article fields that are stored for querying and never returned to clients
+HIDDEN_ARTICLE_FIELDS = ['normalized_tags', 'summary_vector', 'vector_updated_at', 'minhash', 'lsh_bands']
+HIDDEN_ARTICLE_PROJECTION = {field: 0 for field in HIDDEN_ARTICLE_FIELDS}
 
 article_schema = ArticleSchema()
 user_schema = UserSchema()
\ No newline at end of file
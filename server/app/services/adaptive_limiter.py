@@ -0,0 +1,67 @@
+import threading
+import time
+from contextlib import contextmanager
+
+class AdaptiveLimiter:
+    '''
+    Concurrency limit that adapts to an upstream quota (AIMD, like TCP congestion control):
+    -every successful call raises the limit by 1/limit, so about +1 per round of calls
+    -a throttled call (429 / overloaded) halves it, at most once per backoff_interval
+     so a burst of rejections from one round only counts once
+    Calls over the limit wait in acquire() until a running call finishes.
+    '''
+    def __init__(self, initial=2, minimum=1, maximum=8, backoff_interval=1.0, on_change=None):
+        self.condition = threading.Condition()
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = float(min(max(initial, minimum), maximum))
+        self.in_flight = 0
+        self.backoff_interval = backoff_interval
+        self.last_backoff = 0.0
+        self.on_change = on_change
+
+    def configure(self, initial, minimum, maximum):
+        with self.condition:
+            self.minimum = minimum
+            self.maximum = maximum
+            self.limit = float(min(max(initial, minimum), maximum))
+            self.changed()
+
+    def changed(self):
+        if self.on_change is not None:
+            self.on_change(self.limit)
+        self.condition.notify_all()
+
+    def acquire(self):
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+
+    def release(self):
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify()
+
+    @contextmanager
+    def slot(self):
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def succeeded(self):
+        with self.condition:
+            if self.limit < self.maximum:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+                self.changed()
+
+    def throttled(self):
+        with self.condition:
+            now = time.monotonic()
+            if now - self.last_backoff < self.backoff_interval:
+                return
+            self.last_backoff = now
+            self.limit = max(self.minimum, self.limit / 2)
+            self.changed()
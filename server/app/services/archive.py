@@ -0,0 +1,160 @@
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId
+from pymongo import ReplaceOne
+from app.database import mongo, feed_collection, user_collection
+from app.services.vectors import record_removals, unpack_vector, vector_index
+
+logger = logging.getLogger(__name__)
+
+#old articles nobody likes anymore are moved here so the articles collection
+#(the hot working set every listing and recommendation query scans) stays small
+ARCHIVE_COLLECTION = 'articles_archive'
+
+def article_collections(include_archived=False):
+    return ['articles', ARCHIVE_COLLECTION] if include_archived else ['articles']
+
+def find_articles(query, projection=None, include_archived=False):
+    '''
+    Articles matching query from the hot collection, followed by archived ones if include_archived
+    '''
+    articles = []
+    for name in article_collections(include_archived):
+        articles.extend(feed_collection(name).find(query, projection))
+    return articles
+
+def find_article(article_id, projection=None):
+    '''
+    An article by id, read from the archive if it isn't in the hot collection
+    '''
+    article = mongo.db.articles.find_one({'_id': article_id}, projection)
+    if article is None:
+        article = mongo.db[ARCHIVE_COLLECTION].find_one({'_id': article_id}, projection)
+    return article
+
+def restore_articles(query, db=None):
+    '''
+    Moves the archived articles matching query back to the hot collection,
+    returns how many were restored. db is the app's database unless given (scripts).
+    '''
+    archive = (mongo.db if db is None else db)[ARCHIVE_COLLECTION]
+    articles = user_collection('articles') if db is None else db.articles
+    restored = 0
+    for article in archive.find(query):
+        if 'summary_vector' in article:
+            #picked up by the vector index of every worker
+            article['vector_updated_at'] = datetime.now(timezone.utc)
+        articles.replace_one({'_id': article['_id']}, article, upsert=True)
+        archive.delete_one({'_id': article['_id']})
+        vector_index.update(article['_id'], unpack_vector(article.get('summary_vector')))
+        logger.info("Restored archived article %s", article['_id'])
+        restored += 1
+    return restored
+
+def restore_article(article_id):
+    '''
+    Moves an archived article back to the hot collection (e.g. when it is liked again).
+    Returns False if it isn't archived.
+    '''
+    return restore_articles({'_id': article_id}) > 0
+
+def restore_urls(urls, db=None):
+    '''
+    Restores archived articles before articles with the same urls are upserted,
+    so re-ingesting an archived article updates it instead of creating a hot duplicate
+    '''
+    return restore_articles({'url': {'$in': list(urls)}}, db) if urls else 0
+
+def archive_query(cutoff):
+    '''
+    Articles published before cutoff, or ingested before it if they have no published date
+    '''
+    return {'$or': [
+        {'published_date': {'$lt': cutoff}},
+        {'published_date': None, '_id': {'$lt': ObjectId.from_datetime(cutoff)}},
+    ]}
+
+class ArticleArchiver:
+    '''
+    Moves articles older than max_age_days that nobody liked in the last like_grace_days
+    from articles to articles_archive.
+    -articles are read in _id order, batch_size at a time
+    -each batch is copied to the archive with one unordered bulk write, then deleted from
+     the hot collection unless its like_count changed meanwhile (such copies are dropped
+     from the archive again), so a run can be interrupted and repeated safely
+    -after each batch the archiver sleeps pause_ratio times as long as the batch took
+    '''
+    def __init__(self, db, max_age_days=30, like_grace_days=7, batch_size=500, pause_ratio=0.0, log=print):
+        self.db = db
+        self.max_age = timedelta(days=max_age_days)
+        self.like_grace = timedelta(days=like_grace_days)
+        self.batch_size = batch_size
+        self.pause_ratio = pause_ratio
+        self.log = log
+
+    def recently_liked(self, now):
+        '''
+        Ids of the articles liked since the grace period started
+        '''
+        cursor = self.db.likes.find(
+            {'liked': True, 'updated_at': {'$gte': now - self.like_grace}},
+            {'_id': 0, 'article_id': 1}
+        ).batch_size(10000)
+        return {like['article_id'] for like in cursor}
+
+    def batches(self, query):
+        last_id = None
+        while True:
+            batch_query = query if last_id is None else {'$and': [query, {'_id': {'$gt': last_id}}]}
+            batch = list(self.db.articles.find(batch_query).sort('_id', 1).limit(self.batch_size))
+            if not batch:
+                return
+            last_id = batch[-1]['_id']
+            yield batch
+
+    def run(self, dry_run=False, now=None):
+        '''
+        Archives every eligible article, returns (articles scanned, articles archived)
+        '''
+        now = now or datetime.now(timezone.utc)
+        query = archive_query(now - self.max_age)
+        keep = self.recently_liked(now)
+        if dry_run:
+            count = sum(1 for article in self.db.articles.find(query, {'_id': 1}) if article['_id'] not in keep)
+            self.log(f"Would archive {count} articles published before {now - self.max_age:%Y-%m-%d}")
+            return count, 0
+
+        scanned = archived = 0
+        start_time = time.time()
+        for batch in self.batches(query):
+            batch_start = time.perf_counter()
+            scanned += len(batch)
+            articles = [article for article in batch if article['_id'] not in keep]
+            if articles:
+                archived += self.move(articles)
+                self.log(f"{archived} archived, {scanned} scanned ({scanned / max(time.time() - start_time, 1e-9):.0f} articles/s)")
+            if self.pause_ratio:
+                time.sleep((time.perf_counter() - batch_start) * self.pause_ratio)
+        self.log(f"Done, archived {archived} of {scanned} articles published before {now - self.max_age:%Y-%m-%d}")
+        return scanned, archived
+
+    def move(self, articles):
+        '''
+        Copies the articles to the archive and deletes them from the hot collection,
+        returns how many were moved
+        '''
+        archive = self.db[ARCHIVE_COLLECTION]
+        ids = [article['_id'] for article in articles]
+        archive.bulk_write([ReplaceOne({'_id': article['_id']}, article, upsert=True) for article in articles], ordered=False)
+        #an article liked since it was read keeps its new like_count in the hot collection
+        deleted = self.db.articles.delete_many({'$or': [
+            {'_id': article['_id'], 'like_count': article.get('like_count')} for article in articles
+        ]}).deleted_count
+        still_hot = []
+        if deleted < len(articles):
+            still_hot = [article['_id'] for article in self.db.articles.find({'_id': {'$in': ids}}, {'_id': 1})]
+            archive.delete_many({'_id': {'$in': still_hot}})
+        #the vector indexes drop archived articles on their next sync
+        record_removals([article_id for article_id in ids if article_id not in still_hot], self.db)
+        return deleted
@@ -0,0 +1,115 @@
+import re
+import zlib
+import numpy as np
+from bson import Binary
+from flask import current_app
+from app.database import mongo
+
+#MinHash signature of NUM_PERM values split into BANDS bands of ROWS values.
+#Two articles become candidates when any band matches, which happens with probability
+#1 - (1 - s^ROWS)^BANDS for Jaccard similarity s: ~100% at s=0.8, ~12% at s=0.3
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+#short texts (paywalls, cookie notices, failed scrapes) look alike, so they aren't fingerprinted
+MIN_SHINGLES = 30
+MAX_CANDIDATES = 20
+
+PRIME = 4294967291 #largest prime below 2^32, keeps hash values within uint32
+_rng = np.random.default_rng(20250601) #fixed so stored signatures stay comparable
+_A = _rng.integers(1, 2 ** 31, NUM_PERM, dtype=np.uint64).reshape(-1, 1)
+_B = _rng.integers(0, PRIME, NUM_PERM, dtype=np.uint64).reshape(-1, 1)
+
+def shingle_hashes(text):
+    '''
+    crc32 of every SHINGLE_SIZE word window of the lowercased text
+    '''
+    words = re.findall(r"[a-z0-9]+", (text or "").lower())
+    shingles = {' '.join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+    return np.fromiter((zlib.crc32(shingle.encode('utf-8')) for shingle in shingles), dtype=np.uint64, count=len(shingles))
+
+def minhash(text):
+    '''
+    MinHash signature (NUM_PERM uint32 values) of the text's word shingles,
+    or None if the text is too short to compare
+    '''
+    hashes = shingle_hashes(text)
+    if len(hashes) < MIN_SHINGLES:
+        return None
+    #a < 2^31 and hashes < 2^32, so a * hash + b fits in uint64
+    return ((_A * hashes + _B) % PRIME).min(axis=1).astype(np.uint32)
+
+def band_keys(signature):
+    '''
+    One int per band (band number in the high bits, crc32 of its rows in the low bits),
+    stored in the indexed lsh_bands field
+    '''
+    bands = signature.reshape(BANDS, ROWS)
+    return [(band << 32) | zlib.crc32(bands[band].tobytes()) for band in range(BANDS)]
+
+def similarity(signature, other):
+    '''
+    Estimated Jaccard similarity of the texts behind two signatures
+    '''
+    return float(np.mean(signature == other))
+
+def pack_signature(signature):
+    return Binary(signature.tobytes())
+
+def unpack_signature(data):
+    return None if data is None else np.frombuffer(bytes(data), dtype=np.uint32)
+
+class DuplicateFinder:
+    '''
+    Finds near-duplicates of scraped articles (the same wire story on several sites)
+    among stored canonical articles and the articles seen earlier in the same batch.
+    '''
+    def __init__(self, threshold=None):
+        self.threshold = threshold if threshold is not None else current_app.config.get('DUPLICATE_THRESHOLD', 0.8)
+        self.seen = [] #(signature, bands, article) of this batch
+
+    def fingerprint(self, article, content):
+        '''
+        Sets the minhash and lsh_bands fields of an article from its scraped text,
+        returns the signature or None if the text is too short
+        '''
+        signature = minhash(content)
+        if signature is None:
+            return None
+        article['minhash'] = pack_signature(signature)
+        article['lsh_bands'] = band_keys(signature)
+        return signature
+
+    def find(self, article, signature):
+        '''
+        The most similar canonical article at or above the threshold, or None.
+        Canonical articles are the ones without duplicate_of.
+        '''
+        if self.threshold <= 0 or self.threshold > 1:
+            return None
+        bands = set(article['lsh_bands'])
+        best, best_similarity = None, self.threshold
+        for seen_signature, seen_bands, seen_article in self.seen:
+            if bands & seen_bands:
+                score = similarity(signature, seen_signature)
+                if score >= best_similarity:
+                    best, best_similarity = seen_article, score
+        candidates = mongo.db.articles.find(
+            {'lsh_bands': {'$in': list(bands)}, 'duplicate_of': {'$exists': False}, 'url': {'$ne': article['url']}},
+            {'minhash': 1, 'url': 1, 'summarization': 1}
+        ).limit(MAX_CANDIDATES)
+        for candidate in candidates:
+            candidate_signature = unpack_signature(candidate.get('minhash'))
+            if candidate_signature is None:
+                continue
+            score = similarity(signature, candidate_signature)
+            if score >= best_similarity:
+                best, best_similarity = candidate, score
+        return best
+
+    def add(self, article, signature):
+        '''
+        Remembers a canonical article of this batch so later copies in the batch match it
+        '''
+        self.seen.append((signature, set(article['lsh_bands']), article))
@@ -1,34 +1,216 @@
 import os, json
-from google import genai
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from dotenv import load_dotenv
 from flask import jsonify
+from marshmallow import ValidationError
+from app.metrics import LLM_CONCURRENCY, LLM_LATENCY, LLM_RETRIES, LLM_TOKENS, stage_timer
+from app.schemas import SummarizationSchema
+from app.services.adaptive_limiter import AdaptiveLimiter
 
 load_dotenv()
 
-client = genai.Client(api_key=os.environ.get("GEMINI_API_KEY"))
+logger = logging.getLogger(__name__)
+
+#tags the model may choose from when tagging an article
+TAG_OPTIONS = ["World News", "Politics", "Business", "Finance", "Health", "Science", "Entertainment", "Sports",
+               "Technology", "AI", "Cybersecurity", "Gaming", "Travel", "Food", "Lifestyle"]
+MAX_TAGS = 4
+
+#structured output schema for the model, the same shape as SummarizationSchema
+SUMMARY_RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "summary": {"type": "STRING"},
+        "key_points": {"type": "ARRAY", "items": {"type": "STRING"}},
+        "tags": {"type": "ARRAY", "items": {"type": "STRING", "enum": TAG_OPTIONS}, "max_items": MAX_TAGS},
+    },
+    "required": ["summary", "key_points", "tags"],
+    "property_ordering": ["summary", "key_points", "tags"],
+}
+
+#request timeouts, quota (429) and server errors are worth retrying, 429 and 503 also mean slow down
+RETRYABLE_CODES = {408, 429, 500, 502, 503, 504}
+THROTTLE_CODES = {429, 503}
+MAX_RETRY_DELAY = 60
+
+summarization_schema = SummarizationSchema()
+
+class RetryableError(Exception):
+    def __init__(self, reason, delay=None):
+        super().__init__(reason)
+        self.reason = reason
+        self.delay = delay
+
+def retry_delay(error):
+    '''
+    Seconds the API asked to wait before retrying (RetryInfo in the error details), or None
+    '''
+    details = getattr(error, 'details', None)
+    if not isinstance(details, dict):
+        return None
+    for detail in (details.get('error') or {}).get('details') or []:
+        delay = detail.get('retryDelay') if isinstance(detail, dict) else None
+        if delay:
+            try:
+                return min(float(str(delay).rstrip('s')), MAX_RETRY_DELAY)
+            except ValueError:
+                return None
+    return None
+
+@lru_cache(maxsize=None)
+def transport_errors():
+    '''
+    Connection and timeout errors of the HTTP libraries the SDK may use
+    (httpx in current google-genai versions, requests in older ones)
+    '''
+    errors = []
+    try:
+        import httpx
+        errors.append(httpx.TransportError)
+    except ImportError:
+        pass
+    try:
+        import requests
+        errors.extend([requests.ConnectionError, requests.Timeout])
+    except ImportError:
+        pass
+    return tuple(errors)
+
+def empty_summarization():
+    #no tags marks the article as not summarized (see scrape_summarize)
+    return {"summary": "", "key_points": [], "tags": []}
 
 class AI():
-    def __init__(self, client):
-        self.client = client
-        self.prompt = "You are a JSON only reponse generator. Always respond with valid JSON that matches the user's requested schema." +\
-        " Never include explanations or non-JSON text in your responses." +\
-        "Summarize this article into one paragraph and include a key points section with bullet points." +\
+    '''
+    Summarizes articles with Gemini using its JSON output mode and SUMMARY_RESPONSE_SCHEMA.
+    -quota errors, server errors, timeouts and malformed responses are retried with
+     exponential backoff (or the delay the API asks for), up to LLM_MAX_RETRIES times
+    -parallel calls are capped by an AdaptiveLimiter that ramps up to the quota and
+     halves on throttling
+    -latency, token counts and retries are recorded in the llm_* metrics
+    '''
+    def __init__(self):
+        self._client = None
+        self.lock = threading.Lock()
+        self.model = "gemini-2.0-flash"
+        self.max_retries = 4
+        self.limiter = AdaptiveLimiter(on_change=LLM_CONCURRENCY.set)
+        self.prompt = "Summarize this article into one paragraph and include a key points section with bullet points. " +\
         "In the key points section, only include the main points of the article. " +\
-        "Return as a JSON object. Here is the JSON schema: " +\
-        "Summary = {{'summary': str, 'key_points' : list[str], 'tags' : list[str]}}, " +\
-        "Tag the articles based on its content. The max amount of tags an article can have is 4. Populate the tags key only using these options: " +\
-        "[World News, Politics, Business, Finance, Health, Science, Entertainment, Sports, Technology, AI, Cybersecurity, Gaming, Travel, Food, Lifestyle]"
+        f"Tag the article based on its content with at most {MAX_TAGS} of the allowed tags. " +\
         "Here is the article: "
 
-    def summarize_article(self, content):
-        query = self.prompt + content
-        response = client.models.generate_content(
-            model="gemini-2.0-flash", contents=query
+    def init_app(self, app):
+        self.model = app.config.get('GEMINI_MODEL', self.model)
+        self.max_retries = app.config.get('LLM_MAX_RETRIES', self.max_retries)
+        self.limiter.configure(
+            app.config.get('LLM_INITIAL_CONCURRENCY', 2),
+            app.config.get('LLM_MIN_CONCURRENCY', 1),
+            app.config.get('LLM_MAX_CONCURRENCY', 8)
         )
-        clean_json = response.text.replace("```json", "").replace("```", "").strip() #remove from gemini response
+
+    @property
+    def client(self):
+        '''
+        The Gemini client, created on first use so processes that never summarize
+        (api workers, scripts) don't import the SDK
+        '''
+        if self._client is None:
+            with self.lock:
+                if self._client is None:
+                    from google import genai
+                    self._client = genai.Client(api_key=os.environ.get("GEMINI_API_KEY"))
+        return self._client
+
+    def record_usage(self, response):
+        usage = getattr(response, 'usage_metadata', None)
+        if usage is None:
+            return
+        LLM_TOKENS.labels(self.model, 'prompt').inc(usage.prompt_token_count or 0)
+        LLM_TOKENS.labels(self.model, 'output').inc(usage.candidates_token_count or 0)
+
+    def generate(self, content):
+        '''
+        One Gemini call, returns the validated summarization.
+        Raises RetryableError for failures worth retrying.
+        '''
+        start = time.perf_counter()
+        outcome = 'error'
+        try:
+            from google.genai import errors
+            with self.limiter.slot():
+                start = time.perf_counter() #time spent waiting for a slot isn't request latency
+                try:
+                    response = self.client.models.generate_content(
+                        model=self.model,
+                        contents=self.prompt + content,
+                        config={"response_mime_type": "application/json", "response_schema": SUMMARY_RESPONSE_SCHEMA}
+                    )
+                except errors.APIError as e:
+                    if e.code in THROTTLE_CODES:
+                        self.limiter.throttled()
+                    if e.code in RETRYABLE_CODES:
+                        raise RetryableError(str(e.code), retry_delay(e)) from e
+                    raise
+                except transport_errors() as e:
+                    raise RetryableError('transport') from e
+            self.limiter.succeeded()
+            self.record_usage(response)
+            try:
+                summarization = summarization_schema.load(json.loads(response.text or ''))
+            except (ValueError, ValidationError) as e:
+                raise RetryableError('malformed') from e
+            summarization['tags'] = [tag for tag in summarization['tags'] if tag in TAG_OPTIONS][:MAX_TAGS]
+            outcome = 'ok'
+            return summarization
+        except RetryableError:
+            outcome = 'retry'
+            raise
+        finally:
+            LLM_LATENCY.labels(self.model, outcome).observe(time.perf_counter() - start)
+
+    def summarize(self, content):
+        '''
+        Summarization dict for the article text, retrying retryable failures.
+        Returns a summarization without tags if the article couldn't be summarized.
+        '''
+        with stage_timer('llm'):
+            for attempt in range(self.max_retries + 1):
+                try:
+                    return self.generate(content)
+                except RetryableError as e:
+                    if attempt == self.max_retries:
+                        logger.warning("Gemini call failed after %d attempts (%s)", attempt + 1, e.reason)
+                        break
+                    LLM_RETRIES.labels(self.model, e.reason).inc()
+                    delay = e.delay if e.delay is not None else min(MAX_RETRY_DELAY, 2 ** attempt) * random.uniform(0.5, 1.5)
+                    logger.info("Gemini call failed (%s), retrying in %.1f seconds", e.reason, delay)
+                    time.sleep(delay)
+                except Exception:
+                    logger.exception("Gemini call failed")
+                    break
+        return empty_summarization()
+
+    def summarize_many(self, contents):
+        '''
+        Summarizes several articles in parallel, as many at a time as the limiter allows.
+        Results are in the order of contents.
+        '''
+        if len(contents) <= 1:
+            return [self.summarize(content) for content in contents]
+        with ThreadPoolExecutor(max_workers=min(len(contents), self.limiter.maximum), thread_name_prefix='llm') as executor:
+            return list(executor.map(self.summarize, contents))
+
+    def summarize_article(self, content):
+        summarization = self.summarize(content)
         return jsonify({
-            "success": True,
-            "summarization" : json.loads(clean_json),
+            "success": bool(summarization["tags"]),
+            "summarization" : summarization,
         })
 
-ai_client = AI(client)
\ No newline at end of file
+ai_client = AI()
@@ -0,0 +1,88 @@
+from pymongo import ReturnDocument
+from app.database import mongo, user_collection
+from app.schemas import HIDDEN_ARTICLE_FIELDS
+from app.services.archive import ARCHIVE_COLLECTION
+
+def toggle_like(user_id, article_id, weight=1):
+    '''
+    Likes the article if the user hasn't liked it, otherwise removes the like.
+    The toggle is a single atomic upsert on the (user_id, article_id) document in the
+    likes collection. Unliked documents are kept with liked = False so the same
+    operation works in both directions.
+    A new like records the weight it adds to the user's tag profile (profile_weight)
+    so removing it later subtracts exactly that.
+    Returns (like document, number of like documents written): liked is True if the article is now liked.
+    '''
+    likes = user_collection('likes')
+    #the findAndModify command directly, find_one_and_update drops the write result (lastErrorObject)
+    result = likes.database.command(
+        'findAndModify', likes.name,
+        query={'user_id': user_id, 'article_id': article_id},
+        update=[
+            {'$set': {'liked': {'$ne': ['$liked', True]}, 'updated_at': '$$NOW'}},
+            {'$set': {
+                'created_at': {'$cond': ['$liked', '$$NOW', '$created_at']},
+                'profile_weight': {'$cond': ['$liked', weight, '$profile_weight']}
+            }}
+        ],
+        fields={'liked': 1, 'created_at': 1, 'profile_weight': 1},
+        upsert=True,
+        new=True,
+        writeConcern=likes.write_concern.document,
+        codec_options=likes.codec_options
+    )
+    return result['value'], result['lastErrorObject']['n']
+
+def get_liked_article_ids(user_id):
+    '''
+    Returns the ObjectIds of every article the user likes, most recent first
+    '''
+    cursor = mongo.db.likes.find(
+        {'user_id': user_id, 'liked': True},
+        {'_id': 0, 'article_id': 1}
+    ).sort('created_at', -1)
+    return [like['article_id'] for like in cursor]
+
+def get_liked_articles_page(user_id, page=1, per_page=50):
+    '''
+    Returns one page of the user's liked articles (most recent first) and the total number of likes.
+    Archived articles are included.
+    '''
+    query = {'user_id': user_id, 'liked': True}
+    total = mongo.db.likes.count_documents(query)
+    pipeline = [
+        {'$match': query},
+        {'$sort': {'created_at': -1}},
+        {'$skip': (page - 1) * per_page},
+        {'$limit': per_page},
+        {'$lookup': {
+            'from': 'articles',
+            'localField': 'article_id',
+            'foreignField': '_id',
+            'pipeline': [{'$unset': HIDDEN_ARTICLE_FIELDS}],
+            'as': 'article'
+        }},
+        {'$lookup': {
+            'from': ARCHIVE_COLLECTION,
+            'localField': 'article_id',
+            'foreignField': '_id',
+            'pipeline': [{'$unset': HIDDEN_ARTICLE_FIELDS}],
+            'as': 'archived'
+        }},
+        {'$set': {'article': {'$arrayElemAt': [{'$concatArrays': ['$article', '$archived']}, 0]}}},
+        {'$match': {'article': {'$exists': True}}},
+        {'$replaceRoot': {'newRoot': '$article'}}
+    ]
+    return list(mongo.db.likes.aggregate(pipeline)), total
+
+def update_like_count(article_id, liked, projection=None):
+    '''
+    Adds or removes one like from the article's denormalized like_count.
+    Returns the updated article (with the projected fields) or None if it doesn't exist.
+    '''
+    return user_collection('articles').find_one_and_update(
+        {'_id': article_id},
+        {'$inc': {'like_count': 1 if liked else -1}},
+        projection=projection,
+        return_document=ReturnDocument.AFTER
+    )
@@ -1,10 +1,12 @@
 import os, json
-import requests #different from flask request
+import logging
 from flask import jsonify
 from dotenv import load_dotenv
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 class NewsApi:
     BASE_URL = "https://newsapi.org/v2/"
     def __init__(self):
@@ -15,6 +17,7 @@ class NewsApi:
         Fetch articles from the News API.
         Parameters: params 
         '''
+        import requests #different from flask request, imported here since only ingestion uses it
         try:
             header = {"Authorization": self.api_key}
             response = requests.get(f"{self.BASE_URL}/everything?", params=params, headers=header)
@@ -27,8 +30,8 @@ class NewsApi:
             result_json = json.loads(response.text) #converts the json string to json
             articles = result_json["articles"] #list of articles from news_api
             processed_data = process_articles(articles)
-            print("News Articles Found:", len(processed_data))
-            print(processed_data)
+            logger.info("News articles found: %d", len(processed_data))
+            logger.debug("Processed articles: %s", processed_data)
             return jsonify({
                 "success": True,
                 "num_articles" : len(processed_data),
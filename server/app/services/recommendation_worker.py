@@ -0,0 +1,93 @@
+import logging
+import queue
+import threading
+import time
+from bson import ObjectId
+from app.services.recommendations import compute_recommendations, mark_recommendations_stale, save_recommendations
+
+logger = logging.getLogger(__name__)
+
+class RecommendationWorker:
+    '''
+    Background thread that keeps the recommendations collection up to date.
+    -refresh_user is called when a user's likes change, or when a user reads a stale entry
+    -articles_added marks every stored entry stale, at most once per RECOMMENDATIONS_STALE_INTERVAL_SECONDS,
+     so only users who come back get their recommendations recomputed
+    Duplicate requests for a user that is already queued are dropped.
+    '''
+    def __init__(self, app=None):
+        self.app = None
+        self.queue = queue.Queue()
+        self.pending = set()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stale_interval = 60
+        self.stale_timer = None
+        self.last_marked = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.stale_interval = app.config.get('RECOMMENDATIONS_STALE_INTERVAL_SECONDS', self.stale_interval)
+
+    def start(self):
+        '''
+        Starts the worker thread on first use, so scripts that create the app never start it
+        '''
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name='recommendation-worker', daemon=True)
+                self.thread.start()
+
+    def enqueue(self, item):
+        with self.lock:
+            if item in self.pending:
+                return
+            self.pending.add(item)
+        self.queue.put(item)
+        self.start()
+
+    def refresh_user(self, user_id):
+        self.enqueue(str(user_id))
+
+    def articles_added(self):
+        '''
+        New articles can change every user's recommendations. Marks them stale right away,
+        or once the interval since the last mark is over if articles keep arriving.
+        '''
+        with self.lock:
+            if self.stale_timer is not None:
+                return #a mark is already scheduled and will cover these articles too
+            delay = 0 if self.last_marked is None else max(0, self.last_marked + self.stale_interval - time.monotonic())
+            self.stale_timer = threading.Timer(delay, self.mark_stale)
+            self.stale_timer.daemon = True
+            self.stale_timer.start()
+
+    def mark_stale(self):
+        with self.lock:
+            self.stale_timer = None
+            self.last_marked = time.monotonic()
+        try:
+            with self.app.app_context():
+                mark_recommendations_stale()
+        except Exception:
+            logger.exception("Marking recommendations stale failed")
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            with self.lock:
+                self.pending.discard(item)
+            try:
+                with self.app.app_context():
+                    self.refresh(ObjectId(item))
+            except Exception:
+                logger.exception("Refreshing recommendations for %s failed", item)
+            finally:
+                self.queue.task_done()
+
+    def refresh(self, user_id):
+        save_recommendations(user_id, compute_recommendations(user_id))
+
+recommendation_worker = RecommendationWorker()
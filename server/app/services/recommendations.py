@@ -0,0 +1,449 @@
+import threading
+import time
+from app.database import mongo, feed_db, user_collection
+from app.schemas import HIDDEN_ARTICLE_FIELDS
+from flask import current_app
+from datetime import datetime, timedelta, timezone
+from app.services.likes import get_liked_article_ids
+
+#tags used to fill recommendations when the user's preferred tags don't match enough articles
+POPULAR_TAGS = ['sports', 'business', 'world news', 'technology', 'entertainment']
+
+#categories looked for in liked article titles when none of the liked articles have tags
+CATEGORY_HINTS = ['world news', 'technology', 'sports', 'business', 'entertainment', 'health', 'science', 'politics']
+
+DEFAULT_TAG = 'general news'
+
+#ranking tiers, higher tiers are always shown before lower ones
+TIER_MATCHED = 2
+TIER_POPULAR = 1
+TIER_GENERAL = 0
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+#reference point of decayed tag profile weights for users without a tag_profile_epoch
+PROFILE_EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+#a user's profile is rebased before a like would weigh more than 2^MAX_WEIGHT_EXPONENT,
+#so weights stay far from float overflow and can be added and subtracted exactly
+MAX_WEIGHT_EXPONENT = 30
+
+#seconds the distinct normalized tags are cached for, tags of newer articles only match exactly until then
+TAG_VOCABULARY_TTL = 300
+_tag_vocabulary = {'tags': (), 'loaded_at': None}
+_tag_vocabulary_lock = threading.Lock()
+
+
+def score_stages(top_tags, tier):
+    '''
+    Aggregation stages that score candidate articles against the preferred tags.
+    -10 points for each preferred tag the article has exactly
+    -5 points for each preferred tag that is only part of one of the article's tags
+    -Bonus of 5 points per matched tag when more than one preferred tag matches
+    -3 points if the article is less than 3 days old, 1 point if less than a week old
+    Parameters:
+    top_tags : aggregation expression that evaluates to the list of normalized preferred tags
+    tier : ranking tier stored on each scored article
+    '''
+    article_tags = {'$ifNull': ['$normalized_tags', []]}
+    published = {'$convert': {'input': '$published_date', 'to': 'date', 'onError': None, 'onNull': None}}
+    return [
+        {'$addFields': {
+            '_tag_hits': {'$map': {
+                'input': top_tags,
+                'as': 'preferred',
+                'in': {'$cond': [
+                    {'$in': ['$$preferred', article_tags]},
+                    10,
+                    {'$cond': [
+                        {'$anyElementTrue': [{'$map': {
+                            'input': article_tags,
+                            'as': 'tag',
+                            'in': {'$gte': [{'$indexOfCP': ['$$tag', '$$preferred']}, 0]}
+                        }}]},
+                        5,
+                        0
+                    ]}
+                ]}
+            }},
+            '_age_ms': {'$cond': [
+                {'$eq': [published, None]},
+                None,
+                {'$subtract': ['$$NOW', published]}
+            ]}
+        }},
+        {'$addFields': {
+            'score': {'$add': [
+                {'$sum': '$_tag_hits'},
+                {'$let': {
+                    'vars': {'matches': {'$size': {'$filter': {'input': '$_tag_hits', 'cond': {'$gt': ['$$this', 0]}}}}},
+                    'in': {'$cond': [{'$gt': ['$$matches', 1]}, {'$multiply': ['$$matches', 5]}, 0]}
+                }},
+                {'$switch': {
+                    'branches': [
+                        {'case': {'$eq': ['$_age_ms', None]}, 'then': 0},
+                        {'case': {'$lt': ['$_age_ms', 3 * DAY_MS]}, 'then': 3},
+                        {'case': {'$lt': ['$_age_ms', 7 * DAY_MS]}, 'then': 1},
+                    ],
+                    'default': 0
+                }}
+            ]},
+            'tier': tier
+        }},
+        {'$unset': ['_tag_hits', '_age_ms']}
+    ]
+
+
+def preferred_tags_stages():
+    '''
+    Aggregation stages that reduce the user's liked articles to a single document
+    holding their top 3 normalized tags and the number of liked articles found.
+    Falls back to category names found in liked article titles, then to DEFAULT_TAG.
+    '''
+    return [
+        {'$project': {
+            'tags': {'$ifNull': ['$normalized_tags', []]},
+            'title': {'$toLower': {'$ifNull': ['$title', '']}}
+        }},
+        {'$facet': {
+            'tag_counts': [
+                {'$unwind': '$tags'},
+                {'$group': {'_id': '$tags', 'count': {'$sum': 1}}},
+                {'$sort': {'count': -1, '_id': 1}},
+                {'$limit': 3}
+            ],
+            'title_counts': [
+                {'$project': {'hints': {'$filter': {
+                    'input': CATEGORY_HINTS,
+                    'cond': {'$gte': [{'$indexOfCP': ['$title', '$$this']}, 0]}
+                }}}},
+                {'$unwind': '$hints'},
+                {'$group': {'_id': '$hints', 'count': {'$sum': 1}}},
+                {'$sort': {'count': -1, '_id': 1}},
+                {'$limit': 3}
+            ],
+            'liked': [{'$count': 'count'}]
+        }},
+        {'$project': {
+            'num_liked': {'$ifNull': [{'$first': '$liked.count'}, 0]},
+            'top_tags': {'$cond': [
+                {'$gt': [{'$size': '$tag_counts'}, 0]},
+                '$tag_counts._id',
+                {'$cond': [
+                    {'$gt': [{'$size': '$title_counts'}, 0]},
+                    '$title_counts._id',
+                    [DEFAULT_TAG]
+                ]}
+            ]}
+        }}
+    ]
+
+
+def tag_vocabulary():
+    '''
+    Every distinct normalized tag, read from the normalized_tags index at most once per TAG_VOCABULARY_TTL
+    '''
+    with _tag_vocabulary_lock:
+        loaded_at = _tag_vocabulary['loaded_at']
+        if loaded_at is None or time.monotonic() - loaded_at >= TAG_VOCABULARY_TTL:
+            _tag_vocabulary['tags'] = tuple(tag for tag in feed_db().articles.distinct('normalized_tags') if isinstance(tag, str))
+            _tag_vocabulary['loaded_at'] = time.monotonic()
+        return _tag_vocabulary['tags']
+
+def candidate_tags(top_tags):
+    '''
+    The preferred tags and every known tag that contains one of them (partial matches),
+    so candidates for both can be found through the normalized_tags index
+    '''
+    return sorted(set(top_tags) | {tag for tag in tag_vocabulary() if any(preferred in tag for preferred in top_tags)})
+
+def ranking_stages(exclude_ids, limit, pool_size):
+    '''
+    Aggregation stages that take a document with top_tags and candidate_tags (see candidate_tags)
+    fields and attach the ranked recommendations as an articles field.
+    -Articles with any of the candidate tags (exact or partial matches of the preferred tags)
+     are found through the normalized_tags index
+    -Articles often liked together with the user's likes are found through article_neighbors
+     (built by build_co_likes.py), their similarity is weighted by CO_LIKE_WEIGHT and
+     added to the tag score
+    -Articles with popular tags and then any other articles fill the remaining slots
+    Parameters:
+    exclude_ids : list of article ObjectIds that should not be recommended (already liked)
+    limit : max number of articles to recommend
+    pool_size : max number of tag matched articles to score
+    '''
+    not_excluded = {'_id': {'$nin': exclude_ids}, 'duplicate_of': {'$exists': False}}
+    co_like_weight = current_app.config.get('CO_LIKE_WEIGHT', 10)
+    return [
+        {'$lookup': {
+            'from': 'articles',
+            'localField': 'candidate_tags',
+            'foreignField': 'normalized_tags',
+            'let': {'top_tags': '$top_tags'},
+            'pipeline': [{'$match': not_excluded}, {'$limit': pool_size}] + score_stages('$$top_tags', TIER_MATCHED),
+            'as': 'matched'
+        }},
+        {'$lookup': {
+            'from': 'article_neighbors',
+            'let': {'top_tags': '$top_tags'},
+            'pipeline': [
+                {'$match': {'_id': {'$in': exclude_ids}}},
+                {'$unwind': '$neighbors'},
+                {'$match': {'neighbors.article_id': {'$nin': exclude_ids}}},
+                {'$group': {'_id': '$neighbors.article_id', 'co_like_score': {'$sum': '$neighbors.score'}}},
+                {'$sort': {'co_like_score': -1}},
+                {'$limit': pool_size},
+                {'$lookup': {'from': 'articles', 'localField': '_id', 'foreignField': '_id', 'as': 'article'}},
+                {'$unwind': '$article'},
+                {'$replaceRoot': {'newRoot': {'$mergeObjects': ['$article', {'co_like_score': '$co_like_score'}]}}}
+            ] + score_stages('$$top_tags', TIER_MATCHED),
+            'as': 'co_liked'
+        }},
+        {'$lookup': {
+            'from': 'articles',
+            'let': {'top_tags': '$top_tags'},
+            'pipeline': [
+                {'$match': {'normalized_tags': {'$in': POPULAR_TAGS}, **not_excluded}},
+                {'$limit': pool_size}
+            ] + score_stages('$$top_tags', TIER_POPULAR),
+            'as': 'popular'
+        }},
+        {'$lookup': {
+            'from': 'articles',
+            'pipeline': [
+                {'$match': not_excluded},
+                {'$limit': limit * 2},
+                {'$addFields': {'score': 0, 'tier': TIER_GENERAL}}
+            ],
+            'as': 'general'
+        }},
+        {'$project': {
+            'top_tags': 1,
+            'num_liked': 1,
+            'articles': {'$concatArrays': ['$matched', '$co_liked', '$popular', '$general']}
+        }},
+        #keep the best ranked copy of articles that were found by more than one lookup
+        {'$unwind': {'path': '$articles', 'preserveNullAndEmptyArrays': True}},
+        {'$sort': {'articles.tier': -1, 'articles.score': -1}},
+        {'$group': {
+            '_id': '$articles._id',
+            'article': {'$first': '$articles'},
+            'co_like_score': {'$max': '$articles.co_like_score'},
+            'top_tags': {'$first': '$top_tags'},
+            'num_liked': {'$first': '$num_liked'}
+        }},
+        {'$addFields': {'rank_score': {'$add': [
+            {'$ifNull': ['$article.score', 0]},
+            {'$multiply': [{'$ifNull': ['$co_like_score', 0]}, co_like_weight]}
+        ]}}},
+        {'$sort': {'article.tier': -1, 'rank_score': -1, '_id': 1}},
+        {'$limit': limit},
+        {'$group': {
+            '_id': None,
+            'top_tags': {'$first': '$top_tags'},
+            'num_liked': {'$first': '$num_liked'},
+            'articles': {'$push': '$article'}
+        }},
+        {'$project': {
+            '_id': 0,
+            'top_tags': 1,
+            'num_liked': 1,
+            'articles': {'$filter': {'input': '$articles', 'cond': {'$ne': ['$$this', None]}}}
+        }},
+        {'$unset': ['articles.score', 'articles.tier', 'articles.co_like_score'] + [f'articles.{field}' for field in HIDDEN_ARTICLE_FIELDS]}
+    ]
+
+
+def as_utc(value):
+    #pymongo returns naive datetimes in UTC
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+def weight_exponent(epoch, when, half_life):
+    return (as_utc(when) - as_utc(epoch)).total_seconds() / 86400 / half_life
+
+def tag_profile_weight(user_id, now=None):
+    '''
+    Weight a like by the user adds to their tag profile now.
+    Without decay (TAG_PROFILE_HALF_LIFE_DAYS = 0) every like counts as 1.
+    With decay the weight doubles every half life since the user's tag_profile_epoch,
+    so older likes count for less relative to newer ones without rewriting the profile
+    on every like. The profile is rebased first if the weight would get too large.
+    '''
+    half_life = current_app.config.get('TAG_PROFILE_HALF_LIFE_DAYS') or 0
+    if half_life <= 0:
+        return 1
+    now = now or datetime.now(timezone.utc)
+    user = mongo.db.users.find_one({'_id': user_id}, {'tag_profile_epoch': 1}) or {}
+    exponent = weight_exponent(user.get('tag_profile_epoch') or PROFILE_EPOCH, now, half_life)
+    if exponent > MAX_WEIGHT_EXPONENT:
+        rebase_tag_profile(user_id, user.get('tag_profile_epoch'), now, exponent)
+        return 1
+    return 2 ** exponent
+
+def rebase_tag_profile(user_id, epoch, now, exponent):
+    '''
+    Moves a user's tag_profile_epoch to now, scaling their profile and the weights stored
+    on their likes by 2^-exponent so their relative weights don't change
+    '''
+    factor = 2.0 ** -exponent
+    scaled_profile = {'$arrayToObject': {'$map': {
+        'input': {'$objectToArray': {'$ifNull': ['$tag_profile', {}]}},
+        'in': {'k': '$$this.k', 'v': {'$multiply': ['$$this.v', factor]}}
+    }}}
+    #matching the epoch that was read makes concurrent rebases apply only once
+    result = user_collection('users').update_one(
+        {'_id': user_id, 'tag_profile_epoch': epoch},
+        [{'$set': {'tag_profile': scaled_profile, 'tag_profile_epoch': now}}]
+    )
+    if result.modified_count:
+        user_collection('likes').update_many(
+            {'user_id': user_id, 'profile_weight': {'$exists': True}},
+            [{'$set': {'profile_weight': {'$multiply': ['$profile_weight', factor]}}}]
+        )
+
+def removed_like_weight(user_id, like, now=None):
+    '''
+    Weight to take off the user's tag profile when a like is removed: the weight the like added.
+    Likes stored before weights were recorded get the weight of a like made at their created_at.
+    '''
+    if like.get('profile_weight') is not None:
+        return like['profile_weight']
+    half_life = current_app.config.get('TAG_PROFILE_HALF_LIFE_DAYS') or 0
+    if half_life <= 0 or like.get('created_at') is None:
+        return tag_profile_weight(user_id, now)
+    user = mongo.db.users.find_one({'_id': user_id}, {'tag_profile_epoch': 1}) or {}
+    exponent = weight_exponent(user.get('tag_profile_epoch') or PROFILE_EPOCH, like['created_at'], half_life)
+    return 2 ** min(exponent, MAX_WEIGHT_EXPONENT)
+
+def profile_tags(tags):
+    '''
+    Returns the normalized tags that can be used as tag_profile keys
+    '''
+    return [tag for tag in tags or [] if '.' not in tag and not tag.startswith('$')]
+
+def tag_profile_inc(tags, weight):
+    '''
+    Builds the $inc document that adds weight to each tag in the user's tag_profile.
+    Returns an empty dict if there are no tags.
+    '''
+    tags = profile_tags(tags)
+    if not tags:
+        return {}
+    return {'$inc': {f'tag_profile.{tag}': weight for tag in tags}}
+
+def top_profile_tags(profile, count=3):
+    '''
+    Returns the highest weighted tags in a tag profile, ignoring tags with no positive weight
+    '''
+    weighted = [(tag, weight) for tag, weight in (profile or {}).items() if weight > 0]
+    weighted.sort(key=lambda item: (-item[1], item[0]))
+    return [tag for tag, weight in weighted[:count]]
+
+def recommend_for_profile(profile, liked_ids, limit=10, pool_size=50):
+    '''
+    Runs the recommendation aggregation using the user's stored tag profile instead of
+    reading their liked articles. Returns None if the profile has no usable tags.
+    '''
+    top_tags = top_profile_tags(profile)
+    if not top_tags:
+        return None
+    return recommend_for_tags(top_tags, len(liked_ids), liked_ids, limit, pool_size)
+
+def recommend_for_tags(top_tags, num_liked, liked_ids, limit=10, pool_size=50):
+    '''
+    Runs the ranking aggregation for a list of preferred tags
+    '''
+    document = {'top_tags': top_tags, 'candidate_tags': candidate_tags(top_tags), 'num_liked': num_liked}
+    pipeline = [{'$documents': [document]}] + ranking_stages(liked_ids, limit, pool_size)
+    return next(feed_db().aggregate(pipeline), None)
+
+def recommend_articles(liked_ids, limit=10, pool_size=50):
+    '''
+    Runs the recommendation aggregation for a list of liked article ObjectIds.
+    The preferred tags are read from the liked articles first, so their partial matches
+    can be looked up through the index.
+    Returns a dict with top_tags, num_liked and articles, or None if none of the
+    liked articles exist.
+    '''
+    pipeline = [{'$match': {'_id': {'$in': liked_ids}}}] + preferred_tags_stages()
+    preferred = next(feed_db().articles.aggregate(pipeline), None)
+    if not preferred or not preferred['num_liked']:
+        return None
+    return recommend_for_tags(preferred['top_tags'], preferred['num_liked'], liked_ids, limit, pool_size)
+
+def compute_recommendations(user_id):
+    '''
+    Computes recommendations for a user from their likes and stored tag profile.
+    Only reads the liked articles if the profile is empty.
+    Returns None if the user has no likes.
+    '''
+    liked_ids = get_liked_article_ids(user_id)
+    if not liked_ids:
+        return None
+    user = mongo.db.users.find_one({'_id': user_id}, {'tag_profile': 1}) or {}
+    result = recommend_for_profile(user.get('tag_profile'), liked_ids)
+    if not result:
+        result = recommend_articles(liked_ids)
+    return result
+
+def save_recommendations(user_id, result):
+    '''
+    Stores a user's ranked article ids in the recommendations collection.
+    Deletes the stored entry if there are no recommendations for the user.
+    '''
+    if not result:
+        mongo.db.recommendations.delete_one({'_id': user_id})
+        return
+    mongo.db.recommendations.replace_one(
+        {'_id': user_id},
+        {
+            'article_ids': [article['_id'] for article in result['articles']],
+            'preferred_tags': result['top_tags'],
+            'computed_at': datetime.now(timezone.utc),
+            'stale': False
+        },
+        upsert=True
+    )
+
+def load_recommendations(user_id):
+    '''
+    Reads a user's stored recommendations together with their articles in one aggregation.
+    Returns None if nothing is stored, otherwise the entry with an articles field in ranked order.
+    '''
+    pipeline = [
+        {'$match': {'_id': user_id}},
+        {'$lookup': {
+            'from': 'articles',
+            'localField': 'article_ids',
+            'foreignField': '_id',
+            'pipeline': [{'$unset': HIDDEN_ARTICLE_FIELDS}],
+            'as': 'articles'
+        }}
+    ]
+    entry = next(mongo.db.recommendations.aggregate(pipeline), None)
+    if not entry:
+        return None
+    #$lookup doesn't keep the order of article_ids
+    rank = {article_id: index for index, article_id in enumerate(entry['article_ids'])}
+    entry['articles'].sort(key=lambda article: rank[article['_id']])
+    return entry
+
+def recommendations_expired(entry, now=None):
+    '''
+    Returns True if a stored entry is older than RECOMMENDATIONS_MAX_AGE_MINUTES
+    and should be recomputed on demand instead of served.
+    '''
+    max_age = timedelta(minutes=current_app.config.get('RECOMMENDATIONS_MAX_AGE_MINUTES', 60))
+    now = now or datetime.now(timezone.utc)
+    computed_at = entry['computed_at']
+    if computed_at.tzinfo is None: #pymongo returns naive UTC datetimes by default
+        computed_at = computed_at.replace(tzinfo=timezone.utc)
+    return now - computed_at > max_age
+
+def mark_recommendations_stale(user_id=None):
+    '''
+    Flags stored recommendations as stale so they are refreshed in the background.
+    Marks every user's entry when user_id is None (new articles were added),
+    entries are then recomputed when their user next reads them.
+    '''
+    query = {'stale': {'$ne': True}} if user_id is None else {'_id': user_id}
+    mongo.db.recommendations.update_many(query, {'$set': {'stale': True}})
@@ -1,8 +1,10 @@
-from bs4 import BeautifulSoup
-import requests, json
+import json
 from flask import jsonify
 
 def scrape_article(url):
+    #imported here so only processes that scrape pay for them
+    import requests
+    from bs4 import BeautifulSoup
     try:
         headers = {'User-Agent': 'Mozilla/5.0'}
         response = requests.get(url, headers=headers, timeout=10)
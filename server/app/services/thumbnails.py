@@ -0,0 +1,266 @@
+import hashlib
+import io
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app, has_app_context, has_request_context, request
+from app.metrics import THUMBNAIL_CACHE, THUMBNAIL_EVICTIONS
+
+logger = logging.getLogger(__name__)
+
+#url extension: (Pillow format, mimetype, save options)
+FORMATS = {
+    'webp': ('WEBP', 'image/webp', {'method': 4}),
+    'jpg': ('JPEG', 'image/jpeg', {'optimize': True, 'progressive': True}),
+}
+DEFAULT_WIDTHS = (320, 640, 1024)
+MAX_SOURCE_BYTES = 15 * 1024 * 1024
+MAX_SOURCE_PIXELS = 50_000_000 #larger images are refused instead of decoded (decompression bombs)
+FAILURE_TTL = 600 #seconds before an image that failed to download is tried again
+MAX_FAILURES = 10000
+LOCK_STRIPES = 64
+#eviction deletes files until the cache is this fraction of THUMBNAIL_CACHE_BYTES, so it doesn't run on every write
+EVICT_TO = 0.9
+
+def has_image(img):
+    return isinstance(img, str) and img.startswith(('http://', 'https://'))
+
+def image_digest(img):
+    return hashlib.sha1(img.encode('utf-8')).hexdigest()[:20]
+
+def thumbnail_urls(article_id, img):
+    '''
+    {format: {width: url}} of the thumbnails of an article's image, or None if it has no image.
+    The digest of the image url is part of the url so a new image never hits a stale cache.
+    '''
+    if article_id is None or not has_image(img):
+        return None
+    config = current_app.config if has_app_context() else {}
+    base = config.get('PUBLIC_API_URL') or (request.host_url if has_request_context() else '')
+    prefix = f"{base.rstrip('/')}/api/thumbnails/{article_id}/{image_digest(img)}"
+    widths = config.get('THUMBNAIL_WIDTHS', DEFAULT_WIDTHS)
+    return {fmt: {str(width): f"{prefix}/{width}.{fmt}" for width in widths} for fmt in FORMATS}
+
+class ThumbnailCache:
+    '''
+    Disk cache of resized article images in THUMBNAIL_DIR, shared by every worker using the directory.
+    -an image is downloaded once and resized to every width in THUMBNAIL_WIDTHS as WebP and JPEG,
+     files are named by the digest of the image url
+    -files are touched when served, when the cache grows past THUMBNAIL_CACHE_BYTES the least
+     recently used ones are deleted
+    -images that fail to download or decode aren't tried again for FAILURE_TTL seconds
+    '''
+    def __init__(self, app=None):
+        self.directory = None
+        self.widths = DEFAULT_WIDTHS
+        self.max_bytes = 0
+        self.quality = 80
+        self.prefetch_enabled = True
+        self.size = 0 #bytes in the cache as of the last scan plus what this process wrote since
+        self.measured = False #the files already in the directory are counted in size
+        self.lock = threading.Lock()
+        self.evict_lock = threading.Lock()
+        self.fetch_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self.failures = {}
+        self.executor = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.directory = app.config['THUMBNAIL_DIR']
+        self.widths = tuple(app.config.get('THUMBNAIL_WIDTHS', DEFAULT_WIDTHS))
+        self.max_bytes = app.config.get('THUMBNAIL_CACHE_BYTES', 512 * 1024 * 1024)
+        self.quality = app.config.get('THUMBNAIL_QUALITY', 80)
+        self.prefetch_enabled = app.config.get('THUMBNAIL_PREFETCH', True)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, digest, width, fmt):
+        return os.path.join(self.directory, digest[:2], f"{digest}-{width}.{fmt}")
+
+    def entries(self):
+        '''
+        (path, size, last access) of every cached file
+        '''
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def touch(self, path):
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def lookup(self, digest, width, fmt):
+        '''
+        Path of a cached thumbnail, or None if it isn't cached
+        '''
+        path = self.path(digest, width, fmt)
+        if self.touch(path):
+            THUMBNAIL_CACHE.labels('hit').inc()
+            return path
+        return None
+
+    def get(self, img, width, fmt):
+        '''
+        Path of a thumbnail of the image, made first if it isn't cached.
+        None if the image can't be downloaded or decoded.
+        '''
+        digest = image_digest(img)
+        path = self.lookup(digest, width, fmt)
+        if path is not None:
+            return path
+        path = self.path(digest, width, fmt)
+        if not self.ensure(img, path):
+            return None
+        THUMBNAIL_CACHE.labels('miss').inc()
+        return path
+
+    def ensure(self, img, path=None):
+        '''
+        Makes the thumbnails of the image unless they exist (path, or the first thumbnail)
+        '''
+        digest = image_digest(img)
+        path = path or self.path(digest, self.widths[0], 'webp')
+        with self.fetch_locks[int(digest[:4], 16) % LOCK_STRIPES]:
+            #another thread may have made them while this one waited
+            if self.touch(path):
+                return True
+            failed_at = self.failures.get(digest)
+            if failed_at is not None and time.monotonic() - failed_at < FAILURE_TTL:
+                return False
+            try:
+                written = self.write_thumbnails(self.download(img), digest)
+            except Exception as e: #network errors, error statuses, oversized or non-image files
+                logger.info("Could not make thumbnails of %s: %s", img, e)
+                THUMBNAIL_CACHE.labels('failed').inc()
+                if len(self.failures) >= MAX_FAILURES:
+                    self.failures.clear()
+                self.failures[digest] = time.monotonic()
+                return False
+            self.failures.pop(digest, None)
+        with self.lock:
+            self.size += written
+            over = self.size > self.max_bytes
+            measure = not self.measured
+            self.measured = True
+        if measure:
+            #the size of the files other workers (or earlier runs) wrote is only needed once this one writes
+            threading.Thread(target=self.measure, name='thumbnail-size', daemon=True).start()
+        if over:
+            self.evict()
+        return True
+
+    def measure(self):
+        '''
+        Adds the size of the files already in the cache, counting files written during the scan
+        twice is harmless, eviction recounts every file
+        '''
+        size = sum(entry_size for _, entry_size, _ in self.entries())
+        with self.lock:
+            self.size += size
+            over = self.size > self.max_bytes
+        if over:
+            self.evict()
+
+    def download(self, img):
+        import requests
+        with requests.get(img, headers={'User-Agent': 'Mozilla/5.0'}, timeout=10, stream=True) as response:
+            response.raise_for_status()
+            data = bytearray()
+            for chunk in response.iter_content(64 * 1024):
+                data += chunk
+                if len(data) > MAX_SOURCE_BYTES:
+                    raise ValueError(f"image larger than {MAX_SOURCE_BYTES} bytes")
+        return bytes(data)
+
+    def write_thumbnails(self, data, digest):
+        '''
+        Resizes the image to every width (never enlarging it) in every format, returns the bytes written
+        '''
+        from PIL import Image, ImageOps
+        #Pillow's own limit only warns below twice MAX_IMAGE_PIXELS, the size is checked below instead
+        Image.MAX_IMAGE_PIXELS = None
+        with Image.open(io.BytesIO(data)) as source:
+            #open only reads the header, nothing is decoded before this check
+            if source.width * source.height > MAX_SOURCE_PIXELS:
+                raise ValueError(f"image larger than {MAX_SOURCE_PIXELS} pixels ({source.width}x{source.height})")
+            #JPEGs are decoded at the smallest scale still larger than the biggest thumbnail
+            source.draft('RGB', (max(self.widths), max(self.widths)))
+            image = ImageOps.exif_transpose(source)
+            if image.mode in ('RGBA', 'LA', 'P'):
+                image = image.convert('RGBA')
+                background = Image.new('RGB', image.size, 'white')
+                background.paste(image, mask=image.getchannel('A'))
+                image = background
+            else:
+                image = image.convert('RGB')
+        os.makedirs(os.path.dirname(self.path(digest, 0, 'jpg')), exist_ok=True)
+        written = 0
+        for width in sorted(self.widths, reverse=True):
+            if image.width > width:
+                image = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+            for fmt, (pil_format, _, options) in FORMATS.items():
+                buffer = io.BytesIO()
+                image.save(buffer, pil_format, quality=self.quality, **options)
+                written += self.write_file(self.path(digest, width, fmt), buffer.getvalue())
+        return written
+
+    def write_file(self, path, data):
+        #written next to the final path and renamed so other workers never serve a partial file
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        return len(data)
+
+    def evict(self):
+        '''
+        Deletes the least recently used files until the cache is under EVICT_TO of its size limit
+        '''
+        if not self.evict_lock.acquire(blocking=False):
+            return #another thread is evicting
+        try:
+            entries = sorted(self.entries(), key=lambda entry: entry[2])
+            size = sum(entry_size for _, entry_size, _ in entries)
+            removed = 0
+            for path, entry_size, _ in entries:
+                if size <= self.max_bytes * EVICT_TO:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                size -= entry_size
+                removed += 1
+            with self.lock:
+                self.size = size
+            THUMBNAIL_EVICTIONS.inc(removed)
+            logger.info("Evicted %d thumbnails, %d bytes cached", removed, size)
+        finally:
+            self.evict_lock.release()
+
+    def prefetch(self, images):
+        '''
+        Makes the thumbnails of newly ingested images in the background
+        '''
+        images = {img for img in images if has_image(img)}
+        if not images or self.directory is None or not self.prefetch_enabled:
+            return
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='thumbnails')
+        for img in images:
+            self.executor.submit(self.ensure, img)
+
+thumbnail_cache = ThumbnailCache()
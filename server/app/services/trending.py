@@ -0,0 +1,127 @@
+import atexit
+import logging
+import threading
+import time
+from pymongo import UpdateOne
+from app.database import feed_collection, ingest_collection
+from app.schemas import HIDDEN_ARTICLE_FIELDS
+
+logger = logging.getLogger(__name__)
+
+#scores below this are dropped from the trending collection
+MIN_SCORE = 0.01
+
+def decayed_score_update(delta, half_life_ms):
+    '''
+    Update pipeline that decays an article's stored score by the time elapsed since
+    it was last updated, then adds delta. Scores never go below 0.
+    '''
+    elapsed = {'$subtract': ['$$NOW', {'$ifNull': ['$updated_at', '$$NOW']}]}
+    decayed = {'$multiply': [
+        {'$ifNull': ['$score', 0]},
+        {'$pow': [0.5, {'$divide': [elapsed, half_life_ms]}]}
+    ]}
+    return [{'$set': {
+        'score': {'$max': [0, {'$add': [decayed, delta]}]},
+        'updated_at': '$$NOW'
+    }}]
+
+
+class TrendingCounter:
+    '''
+    Keeps a time-decayed like score per article in the trending collection.
+    -record adds likes (+1) and unlikes (-1) to in-memory per-bucket counters
+    -A background thread flushes the counters every TRENDING_FLUSH_SECONDS as one bulk write
+    -Every TRENDING_DECAY_SECONDS all stored scores are decayed and tiny ones are dropped,
+     so the collection only holds articles that were liked recently
+    Serving the top N is a single indexed read no matter how many likes exist.
+    '''
+    def __init__(self, app=None):
+        self.app = None
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.thread = None
+        self.last_decay = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.half_life_ms = app.config.get('TRENDING_HALF_LIFE_HOURS', 6) * 60 * 60 * 1000
+        self.bucket_seconds = app.config.get('TRENDING_BUCKET_SECONDS', 60)
+        self.flush_seconds = app.config.get('TRENDING_FLUSH_SECONDS', 30)
+        self.decay_seconds = app.config.get('TRENDING_DECAY_SECONDS', 300)
+
+    def start(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name='trending-flush', daemon=True)
+                self.thread.start()
+                atexit.register(self.flush_in_context)
+
+    def record(self, article_id, delta):
+        '''
+        Counts a like (delta = 1) or unlike (delta = -1) in the current time bucket
+        '''
+        bucket = int(time.time() // self.bucket_seconds) * self.bucket_seconds
+        with self.lock:
+            key = (article_id, bucket)
+            self.buckets[key] = self.buckets.get(key, 0) + delta
+        self.start()
+
+    def run(self):
+        while True:
+            time.sleep(self.flush_seconds)
+            try:
+                self.flush_in_context()
+            except Exception:
+                logger.exception("Flushing trending counters failed")
+
+    def flush_in_context(self):
+        with self.app.app_context():
+            self.flush()
+
+    def flush(self):
+        '''
+        Writes the pending bucket counters to the trending collection.
+        Older buckets are decayed to the flush time before they are added.
+        '''
+        with self.lock:
+            buckets, self.buckets = self.buckets, {}
+        now = time.time()
+        deltas = {}
+        for (article_id, bucket), count in buckets.items():
+            if count == 0:
+                continue
+            age_ms = max(now - (bucket + self.bucket_seconds / 2), 0) * 1000
+            deltas[article_id] = deltas.get(article_id, 0) + count * 0.5 ** (age_ms / self.half_life_ms)
+        if deltas:
+            ingest_collection('trending').bulk_write([
+                UpdateOne({'_id': article_id}, decayed_score_update(delta, self.half_life_ms), upsert=True)
+                for article_id, delta in deltas.items()
+            ], ordered=False)
+        if now - self.last_decay > self.decay_seconds:
+            self.last_decay = now
+            ingest_collection('trending').update_many({}, decayed_score_update(0, self.half_life_ms))
+            ingest_collection('trending').delete_many({'score': {'$lt': MIN_SCORE}})
+
+    def top(self, limit=10):
+        '''
+        Returns the top articles by trending score with their score as trending_score
+        '''
+        pipeline = [
+            {'$sort': {'score': -1}},
+            {'$limit': limit},
+            {'$lookup': {
+                'from': 'articles',
+                'localField': '_id',
+                'foreignField': '_id',
+                'pipeline': [{'$unset': HIDDEN_ARTICLE_FIELDS}],
+                'as': 'article'
+            }},
+            {'$unwind': '$article'},
+            {'$replaceRoot': {'newRoot': {'$mergeObjects': ['$article', {'trending_score': '$score'}]}}}
+        ]
+        return list(feed_collection('trending').aggregate(pipeline))
+
+trending_counter = TrendingCounter()
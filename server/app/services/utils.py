@@ -1,11 +1,20 @@
 import json
+import logging
 import re
 from app.services.scraper import scrape_article
 from app.services.gemini import ai_client
-from app.database import mongo
+from app.database import mongo, feed_collection, ingest_collection
+from app.metrics import DUPLICATE_ARTICLES, count_scrape_failure, stage_timer
+from app.schemas import HIDDEN_ARTICLE_PROJECTION
+from app.services.vectors import set_summary_vector
+from app.services.duplicates import DuplicateFinder
+from app.services.archive import restore_urls
+from pymongo import UpdateOne
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from flask import jsonify
 
+logger = logging.getLogger(__name__)
+
 def get_user(username):
     return mongo.db.users.find_one({"username": username})
 
@@ -69,14 +78,84 @@ def sanitize_input(input_string):
     sanitized = sanitized.strip()
     return sanitized
 
+def normalize_tags(tags):
+    """
+    Normalizes a list of tags for exact matching:
+    - Lowercases and trims each tag
+    - Drops empty and duplicate tags
+    
+    Returns: list - Normalized tags in their original order
+    """
+    normalized = []
+    for tag in tags or []:
+        if not isinstance(tag, str):
+            continue
+        tag = tag.lower().strip()
+        if tag and tag not in normalized:
+            normalized.append(tag)
+    return normalized
+
+def set_normalized_tags(article):
+    """
+    Sets the indexed normalized_tags field of an article from its summarization tags
+    """
+    tags = article.get('summarization', {}).get('tags', [])
+    article['normalized_tags'] = normalize_tags(tags)
+    return article
+
+def article_upsert(article):
+    """
+    Upsert by url for a validated article, with its indexed fields (normalized_tags, summary_vector) set.
+    Near-duplicates get no summary_vector so they don't show up as similar articles.
+    """
+    set_normalized_tags(article)
+    if not article.get("duplicate_of"):
+        set_summary_vector(article)
+    return UpdateOne({"url": article["url"]}, {"$set": article}, upsert=True)
+
+def upsert_articles(articles):
+    """
+    Upserts validated articles in one unordered bulk write, so one failure doesn't stop the rest.
+    Instead of reading the articles back, new ids come from the write result and only
+    the _id and like_count of updated articles are fetched.
+
+    Returns: (BulkWriteResult, list - {_id, url, like_count} of every stored article)
+    """
+    operations = [article_upsert(article) for article in articles]
+    if not operations:
+        return None, []
+    restore_urls({article["url"] for article in articles})
+    with stage_timer('bulk_write'):
+        result = ingest_collection('articles').bulk_write(operations, ordered=False)
+    stored = {}
+    for index, article_id in result.upserted_ids.items():
+        stored[articles[index]["url"]] = {"_id": article_id, "url": articles[index]["url"], "like_count": 0}
+    updated_urls = list({article["url"] for article in articles if article["url"] not in stored})
+    if updated_urls:
+        for article in mongo.db.articles.find({"url": {"$in": updated_urls}}, {"url": 1, "like_count": 1}):
+            stored.setdefault(article["url"], {"_id": article["_id"], "url": article["url"], "like_count": article.get("like_count", 0)})
+    return result, list(stored.values())
+
+def get_articles_by_ids(article_ids):
+    """
+    Fetches articles by ObjectId, keeping the order of article_ids
+    
+    Returns: list - Articles that were found, without internal fields
+    """
+    articles = feed_collection('articles').find({"_id": {"$in": list(article_ids)}}, HIDDEN_ARTICLE_PROJECTION)
+    by_id = {article["_id"]: article for article in articles}
+    return [by_id[article_id] for article_id in article_ids if article_id in by_id]
+
 def scrape_summarize(response):
     '''
     Function that scrapes article content and summarizes it
     -Gets the url from each article, calls scrape_article with it
     -Scrape article returns a jsonify object that has: success, url, content
     -The content field holds a string that is the full content of the article
-    -Sends content to summarize_article which uses gemini to summarize the content
-    -A jsonify object is returned with fields: success, summarization : {summary, keypoints}
+    -Articles whose text is a near-duplicate of a stored or earlier article (same story on
+     another site) skip the LLM, they reuse its summary and link to it with duplicate_of
+    -The remaining articles are summarized in parallel by ai_client.summarize_many,
+     which returns {summary, key_points, tags} for each (no tags if summarizing failed)
     -Set a new field summarization to the generated summary
     -Return the original data with a newly added summarization field
     Parameters:
@@ -85,24 +164,61 @@ def scrape_summarize(response):
     data = json.loads(response.data)
     articles = data['processed_articles']
     failed = 0
+    duplicates = DuplicateFinder()
     URL_to_remove = []
+    to_summarize = [] #(article, content) of articles that need the LLM
+    batch_duplicates = [] #(article, content, canonical) of copies of an article earlier in this batch
     for article in articles:
         article_url = article['url']
-        result = scrape_article(article_url) #returns a jsonify object that contains {"content" : <scraped data>}
+        with stage_timer('scrape'):
+            result = scrape_article(article_url) #returns a jsonify object that contains {"content" : <scraped data>}
         if type(result) == dict: #if scraping returns a json object that means it failed since success returns jsonify object
             failed += 1
-            print(article_url, "failed to scrape")
+            count_scrape_failure(article_url, 'scrape')
+            logger.info("Failed to scrape %s", article_url)
             URL_to_remove.append(article_url)
             continue
         result_json = json.loads(result.data) # converting jsonify object to a dict
         content = result_json['content'] #extacting article content
-        response = ai_client.summarize_article(content) #jsonify object returned from summarize_article
-        summary_data = json.loads(response.data) #converting jsonify object to dict
-        article['summarization'] = summary_data['summarization'] #setting a new field for each article
+        signature = duplicates.fingerprint(article, content)
+        canonical = duplicates.find(article, signature) if signature is not None else None
+        if canonical is not None and any(canonical is seen for _, _, seen in duplicates.seen):
+            batch_duplicates.append((article, content, canonical)) #summary copied once the canonical is summarized
+        elif canonical is not None and canonical.get('summarization'):
+            article['duplicate_of'] = canonical['url']
+            article['summarization'] = canonical['summarization']
+            logger.info("%s is a near-duplicate of %s, skipping summarization", article_url, canonical['url'])
+        else:
+            to_summarize.append((article, content))
+            if signature is not None:
+                duplicates.add(article, signature)
+
+    summarizations = ai_client.summarize_many([content for _, content in to_summarize])
+    for (article, _), summarization in zip(to_summarize, summarizations):
+        article['summarization'] = summarization #setting a new field for each article
+
+    #copies of a story that failed to summarize are summarized themselves instead
+    retry = []
+    for article, content, canonical in batch_duplicates:
+        if canonical['summarization']['tags']:
+            article['duplicate_of'] = canonical['url']
+            article['summarization'] = canonical['summarization']
+            logger.info("%s is a near-duplicate of %s, skipping summarization", article['url'], canonical['url'])
+        else:
+            retry.append((article, content))
+    summarizations = ai_client.summarize_many([content for _, content in retry])
+    for (article, _), summarization in zip(retry, summarizations):
+        article['summarization'] = summarization
+
+    for article, _ in to_summarize + retry:
         if (len(article['summarization']['tags'])) == 0: #if gemini failed to summarize, then tags size is 0
             failed += 1
-            print(article_url, "failed to scrape")
-            URL_to_remove.append(article_url)
+            count_scrape_failure(article['url'], 'summarize')
+            logger.info("Failed to summarize %s", article['url'])
+            URL_to_remove.append(article['url'])
+    num_duplicates = sum(1 for article in articles if 'duplicate_of' in article)
+    DUPLICATE_ARTICLES.inc(num_duplicates)
     data['num_failed'] = failed
+    data['num_duplicates'] = num_duplicates
     data['processed_articles'] = [article for article in data['processed_articles'] if article['url'] not in URL_to_remove] #removing articles that failed to scrape from the list of processed articles
-    return data  
\ No newline at end of file
+    return data
@@ -0,0 +1,402 @@
+import fcntl
+import json
+import logging
+import os
+import re
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from bson import Binary, ObjectId
+from app.database import mongo
+
+logger = logging.getLogger(__name__)
+
+#number of hashed features in a summary vector, each vector is stored as DIM float32 values
+DIM = 256
+#vectors changed this long before the last sync started are read again, covers clock skew between servers
+SYNC_OVERLAP = timedelta(seconds=60)
+#rows copied at a time when a snapshot is rewritten
+COPY_CHUNK = 65536
+#articles that left the articles collection (deleted, archived), read by each sync to drop their vectors
+REMOVALS_COLLECTION = 'vector_removals'
+#a snapshot last synced longer ago than this is rebuilt, removals are kept twice as long
+MAX_SYNC_GAP = timedelta(days=1)
+REMOVALS_TTL = 2 * MAX_SYNC_GAP
+
+STOPWORDS = {
+    'the', 'and', 'for', 'that', 'with', 'this', 'from', 'are', 'was', 'were', 'has', 'have',
+    'had', 'its', 'his', 'her', 'their', 'they', 'them', 'will', 'would', 'could', 'should',
+    'been', 'being', 'into', 'about', 'after', 'before', 'over', 'also', 'than', 'then', 'but',
+    'not', 'which', 'who', 'what', 'when', 'where', 'while', 'said', 'says', 'more', 'most',
+    'some', 'such', 'can', 'all', 'any', 'one', 'two', 'new', 'out', 'our', 'you', 'your',
+}
+
+def tokenize(text):
+    '''
+    Lowercases text and splits it into words, dropping short words and stopwords
+    '''
+    return [word for word in re.findall(r"[a-z0-9]+", text.lower()) if len(word) > 2 and word not in STOPWORDS]
+
+def embed_text(text):
+    '''
+    Turns text into a unit length float32 vector using the hashing trick.
+    Each word is hashed to one of DIM buckets with a +/-1 sign, term counts are
+    dampened with 1 + log(tf) so repeated words don't dominate.
+    Returns None if the text has no usable words.
+    '''
+    counts = {}
+    for word in tokenize(text):
+        counts[word] = counts.get(word, 0) + 1
+    if not counts:
+        return None
+    vector = np.zeros(DIM, dtype=np.float32)
+    for word, count in counts.items():
+        h = zlib.crc32(word.encode('utf-8'))
+        sign = 1.0 if (h >> 16) & 1 else -1.0
+        vector[h % DIM] += sign * (1.0 + np.log(count))
+    norm = np.linalg.norm(vector)
+    if norm == 0:
+        return None
+    return vector / norm
+
+def embed_summarization(summarization):
+    '''
+    Embeds an article's summarization (summary + key points)
+    '''
+    if not summarization:
+        return None
+    text = ' '.join([summarization.get('summary') or ''] + list(summarization.get('key_points') or []))
+    return embed_text(text)
+
+def pack_vector(vector):
+    return Binary(vector.astype(np.float32).tobytes())
+
+def unpack_vector(data):
+    if data is None:
+        return None
+    vector = np.frombuffer(bytes(data), dtype=np.float32)
+    return vector if vector.shape == (DIM,) else None
+
+def set_summary_vector(article):
+    '''
+    Sets the packed summary_vector field of an article from its summarization,
+    and vector_updated_at so the vector indexes of every worker pick it up
+    '''
+    vector = embed_summarization(article.get('summarization'))
+    if vector is not None:
+        article['summary_vector'] = pack_vector(vector)
+        article['vector_updated_at'] = datetime.now(timezone.utc)
+    return article
+
+def record_removals(article_ids, db=None):
+    '''
+    Records that articles left the articles collection (deleted or archived) so every
+    vector index drops them on its next sync. article_ids None means all of them were deleted.
+    db is the app's database unless given (scripts).
+    '''
+    now = datetime.now(timezone.utc)
+    removals = (mongo.db if db is None else db)[REMOVALS_COLLECTION]
+    if article_ids is None:
+        removals.insert_one({'article_id': None, 'removed_at': now, 'expires_at': now + REMOVALS_TTL})
+    elif article_ids:
+        removals.insert_many([{'article_id': article_id, 'removed_at': now, 'expires_at': now + REMOVALS_TTL}
+                              for article_id in article_ids], ordered=False)
+
+def id_key(article_id):
+    #snapshot ids are numpy 'S12' values, which drop trailing zero bytes when read
+    return article_id.binary.rstrip(b'\0')
+
+def key_id(key):
+    return ObjectId(bytes(key).ljust(12, b'\0'))
+
+def find_row(ids, article_id):
+    '''
+    Row of an article in a snapshot (ids sorted), or None
+    '''
+    key = id_key(article_id)
+    row = int(np.searchsorted(ids, key))
+    return row if row < len(ids) and ids[row] == key else None
+
+
+class VectorIndex:
+    '''
+    Nearest neighbour index over article summary vectors, shared by the workers of a host.
+    -One worker at a time (whoever holds the file lock in VECTOR_INDEX_DIR) syncs the index with
+     the articles collection and writes it as a snapshot: a float32 matrix and the sorted ids of its rows
+    -Every worker memory-maps the latest snapshot, so the vectors are in memory once per host
+    -A background thread started with the worker syncs every sync_interval seconds: vectors
+     written since the last sync (vector_updated_at) are added or replaced, articles removed
+     since the last sync (vector_removals) are dropped
+    -update/remove apply this worker's own changes right away until a snapshot includes them
+    A query is one matrix-vector product over the snapshot plus the few locally changed vectors.
+    '''
+    def __init__(self, sync_interval=60):
+        self.app = None
+        self.directory = None
+        self.lock = threading.RLock()
+        self.thread = None
+        self.sync_interval = sync_interval
+        self.matrix = np.zeros((0, DIM), dtype=np.float32)
+        self.ids = np.zeros(0, dtype='S12')
+        self.active = np.zeros(0, dtype=bool)
+        self.generation = None
+        self.clear()
+
+    def init_app(self, app):
+        self.app = app
+        self.sync_interval = app.config.get('VECTOR_INDEX_SYNC_SECONDS', self.sync_interval)
+        self.directory = app.config.get('VECTOR_INDEX_DIR')
+
+    def start(self):
+        '''
+        Starts the sync thread, called when a worker boots (see gunicorn.conf.py) and on first use.
+        Queries made before the first snapshot is loaded find nothing instead of waiting for it.
+        '''
+        if self.app is None or self.directory is None:
+            return
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                os.makedirs(self.directory, exist_ok=True)
+                self.thread = threading.Thread(target=self.run, name='vector-index', daemon=True)
+                self.thread.start()
+
+    @property
+    def ready(self):
+        return self.generation is not None
+
+    def clear(self):
+        '''
+        Forgets every vector (e.g. all articles were deleted) until the next sync
+        '''
+        with self.lock:
+            #(vector or None if removed, time of the change) of articles changed by this worker
+            self.local = {}
+            self.active = np.zeros_like(self.active)
+
+    def __len__(self):
+        with self.lock:
+            return int(self.active.sum()) + sum(1 for vector, _ in self.local.values() if vector is not None)
+
+    def run(self):
+        while True:
+            try:
+                with self.app.app_context():
+                    self.sync()
+            except Exception:
+                logger.exception("Syncing the vector index failed")
+            #until the first snapshot exists another worker may be building it
+            time.sleep(self.sync_interval if self.ready else 1)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def read_manifest(self):
+        try:
+            with open(self.path('manifest.json')) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def stale(self, manifest):
+        return manifest is None or time.time() - manifest['synced_at'] >= self.sync_interval
+
+    def sync(self):
+        '''
+        Writes a new snapshot if the last one is older than sync_interval and no other worker
+        is writing one, then loads the latest snapshot if this worker doesn't have it yet
+        '''
+        manifest = self.read_manifest()
+        if self.stale(manifest):
+            with open(self.path('build.lock'), 'w') as lock_file:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    pass #another worker is writing one
+                else:
+                    manifest = self.read_manifest()
+                    if self.stale(manifest):
+                        manifest = self.write_snapshot(manifest)
+        if manifest is not None and manifest['generation'] != self.generation:
+            self.load(manifest)
+
+    def open_snapshot(self, manifest):
+        count = manifest['count']
+        if not count:
+            return np.zeros((0, DIM), dtype=np.float32), np.zeros(0, dtype='S12')
+        generation = manifest['generation']
+        matrix = np.memmap(self.path(f'vectors-{generation}.f32'), dtype=np.float32, mode='r', shape=(count, DIM))
+        ids = np.memmap(self.path(f'ids-{generation}.bin'), dtype='S12', mode='r', shape=(count,))
+        return matrix, ids
+
+    def write_snapshot(self, manifest):
+        '''
+        Syncs the previous snapshot (or nothing) with the articles collection into a new one.
+        Only the vectors written and the articles removed since the previous sync are read.
+        '''
+        started = datetime.now(timezone.utc)
+        start_time = time.perf_counter()
+        articles = mongo.db.articles
+        removed = []
+        if manifest is None:
+            old_matrix, old_ids = np.zeros((0, DIM), dtype=np.float32), np.zeros(0, dtype='S12')
+            query = {'summary_vector': {'$exists': True}}
+        else:
+            since = datetime.fromtimestamp(manifest['synced_at'], timezone.utc) - SYNC_OVERLAP
+            if started - since > MAX_SYNC_GAP:
+                return self.write_snapshot(None) #removals this old may have expired
+            try:
+                old_matrix, old_ids = self.open_snapshot(manifest)
+            except FileNotFoundError: #snapshot files were removed, e.g. by a tmp cleaner
+                return self.write_snapshot(None)
+            removed = [removal['article_id'] for removal in
+                       mongo.db[REMOVALS_COLLECTION].find({'removed_at': {'$gte': since}}, {'_id': 0, 'article_id': 1})]
+            if None in removed: #every article was deleted
+                return self.write_snapshot(None)
+            #articles restored (or re-inserted) after their removal are read again below
+            restored = {article['_id'] for article in articles.find({'_id': {'$in': removed}}, {'_id': 1})}
+            removed = [id_key(article_id) for article_id in removed if article_id not in restored]
+            query = {'vector_updated_at': {'$gte': since}}
+
+        changed = {}
+        for article in articles.find(query, {'summary_vector': 1}).batch_size(5000):
+            changed[id_key(article['_id'])] = unpack_vector(article.get('summary_vector'))
+        #removed articles are dropped, changed ones are replaced
+        keep = ~np.isin(old_ids, np.array(removed + list(changed), dtype='S12'))
+        if manifest is not None and keep.all() and not changed:
+            manifest['synced_at'] = started.timestamp()
+            self.write_manifest(manifest)
+            return manifest
+
+        added = [(key, vector) for key, vector in changed.items() if vector is not None]
+        keep_rows = np.flatnonzero(keep)
+        ids = np.concatenate([old_ids[keep_rows], np.array([key for key, _ in added], dtype='S12')])
+        order = np.argsort(ids, kind='stable')
+        new_vectors = np.array([vector for _, vector in added], dtype=np.float32).reshape(-1, DIM)
+
+        generation = f"{time.time_ns()}"
+        with open(self.path(f'vectors-{generation}.f32'), 'wb') as f:
+            for start in range(0, len(order), COPY_CHUNK):
+                part = order[start:start + COPY_CHUNK]
+                old = part < len(keep_rows)
+                rows = np.empty((len(part), DIM), dtype=np.float32)
+                rows[old] = old_matrix[keep_rows[part[old]]]
+                rows[~old] = new_vectors[part[~old] - len(keep_rows)]
+                f.write(rows.tobytes())
+        ids[order].tofile(self.path(f'ids-{generation}.bin'))
+        manifest = {'generation': generation, 'count': len(order), 'synced_at': started.timestamp()}
+        self.write_manifest(manifest)
+        self.remove_old_snapshots(generation)
+        logger.info("Vector index synced: %d vectors, %d changed, %d dropped in %.2f seconds",
+                    len(order), len(changed), int((~keep).sum()), time.perf_counter() - start_time)
+        return manifest
+
+    def write_manifest(self, manifest):
+        #renamed into place so workers never read a partial manifest
+        temp_path = self.path(f'manifest.json.{os.getpid()}.tmp')
+        with open(temp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(temp_path, self.path('manifest.json'))
+
+    def remove_old_snapshots(self, generation):
+        #workers still using an old snapshot keep their mapping after the files are deleted
+        for name in os.listdir(self.directory):
+            if name.startswith(('vectors-', 'ids-')) and name.split('-', 1)[1].split('.')[0] != generation:
+                try:
+                    os.remove(self.path(name))
+                except FileNotFoundError:
+                    pass
+
+    def load(self, manifest):
+        matrix, ids = self.open_snapshot(manifest)
+        with self.lock:
+            #local changes made before the sync started are in the snapshot
+            self.local = {article_id: change for article_id, change in self.local.items() if change[1] >= manifest['synced_at']}
+            active = np.ones(len(ids), dtype=bool)
+            for article_id in self.local:
+                row = find_row(ids, article_id)
+                if row is not None:
+                    active[row] = False
+            self.matrix, self.ids, self.active = matrix, ids, active
+            self.generation = manifest['generation']
+
+    def change(self, article_id, vector):
+        with self.lock:
+            self.local[article_id] = (vector, time.time())
+            row = find_row(self.ids, article_id)
+            if row is not None:
+                self.active[row] = False
+
+    def update(self, article_id, vector):
+        '''
+        Adds or replaces an article's vector in this worker's index, skipped in processes that
+        never search it (e.g. ingest workers), the next sync picks the change up anyway
+        '''
+        if vector is not None and self.thread is not None:
+            self.change(article_id, vector)
+
+    def remove(self, article_id):
+        if self.thread is not None:
+            self.change(article_id, None)
+
+    def get(self, article_id):
+        self.start()
+        with self.lock:
+            if article_id in self.local:
+                vector = self.local[article_id][0]
+                return None if vector is None else vector.copy()
+            row = find_row(self.ids, article_id)
+            return None if row is None or not self.active[row] else np.array(self.matrix[row])
+
+    def search(self, vector, k=10, exclude=()):
+        '''
+        Returns up to k (article_id, similarity) pairs ordered by cosine similarity
+        '''
+        self.start()
+        if vector is None:
+            return []
+        k = max(int(k), 1)
+        vector = vector.astype(np.float32)
+        exclude = set(exclude)
+        with self.lock:
+            #snapshots are replaced, never modified, so they can be searched outside the lock
+            matrix, ids, active = self.matrix, self.ids, self.active.copy()
+            local = [(article_id, local_vector) for article_id, (local_vector, _) in self.local.items()
+                     if local_vector is not None and article_id not in exclude]
+        matches = []
+        if len(ids):
+            scores = np.asarray(matrix @ vector)
+            scores[~active] = -np.inf
+            for article_id in exclude:
+                row = find_row(ids, article_id)
+                if row is not None:
+                    scores[row] = -np.inf
+            count = min(k, len(scores))
+            top = np.argpartition(-scores, count - 1)[:count]
+            matches = [(key_id(ids[row]), float(scores[row])) for row in top if scores[row] > -np.inf]
+        matches.extend((article_id, float(local_vector @ vector)) for article_id, local_vector in local)
+        matches.sort(key=lambda match: -match[1])
+        return matches[:k]
+
+    def index_articles(self, stored_articles, validated_articles):
+        '''
+        Updates the index after a bulk upsert. Stored articles hold the _id and url
+        of each upserted article, validated articles hold their summary_vector.
+        '''
+        vectors = {article['url']: article.get('summary_vector') for article in validated_articles}
+        for article in stored_articles:
+            self.update(article['_id'], unpack_vector(vectors.get(article['url'])))
+
+    def profile_vector(self, article_ids):
+        '''
+        Mean of the vectors of the given articles (e.g. a user's likes), normalized to unit length
+        '''
+        vectors = [vector for vector in (self.get(article_id) for article_id in article_ids) if vector is not None]
+        if not vectors:
+            return None
+        vector = np.mean(vectors, axis=0)
+        norm = np.linalg.norm(vector)
+        return None if norm == 0 else vector / norm
+
+vector_index = VectorIndex()
@@ -0,0 +1,32 @@
+# archive_articles.py
+import argparse
+from datetime import datetime, timezone
+from app import create_app
+from app.database import mongo
+from app.services.archive import ArticleArchiver
+
+JOB_ID = "archive_articles"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move old articles nobody likes anymore to the articles_archive collection")
+    parser.add_argument("--older-than-days", type=int, help="archive articles published before this many days ago (default ARCHIVE_AFTER_DAYS)")
+    parser.add_argument("--like-grace-days", type=int, help="keep articles liked in the last this many days (default ARCHIVE_LIKE_GRACE_DAYS)")
+    parser.add_argument("--batch-size", type=int, help="articles moved per bulk write (default ARCHIVE_BATCH_SIZE)")
+    parser.add_argument("--pause-ratio", type=float, default=0.0, help="sleep this many times as long as each batch took")
+    parser.add_argument("--dry-run", action="store_true", help="only count the articles that would be archived")
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        config = app.config
+        archiver = ArticleArchiver(
+            mongo.db,
+            max_age_days=args.older_than_days if args.older_than_days is not None else config['ARCHIVE_AFTER_DAYS'],
+            like_grace_days=args.like_grace_days if args.like_grace_days is not None else config['ARCHIVE_LIKE_GRACE_DAYS'],
+            batch_size=args.batch_size or config['ARCHIVE_BATCH_SIZE'],
+            pause_ratio=args.pause_ratio
+        )
+        started_at = datetime.now(timezone.utc)
+        scanned, archived = archiver.run(dry_run=args.dry_run, now=started_at)
+        if not args.dry_run:
+            mongo.db.job_state.replace_one({"_id": JOB_ID}, {"last_run": started_at, "scanned": scanned, "archived": archived}, upsert=True)
@@ -0,0 +1,55 @@
+# benchmarks/bench_login.py
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.bcrypt import PasswordHasher, HashingBusy, _hash_password
+
+PASSWORD = "Benchmark1!"
+
+def run_level(hasher, password_hash, concurrency, requests):
+    """Run requests password checks from concurrency threads, returns (checks/s, rejected)"""
+    rejected = 0
+    def check(_):
+        try:
+            hasher.check(password_hash, PASSWORD)
+            return 0
+        except HashingBusy:
+            return 1
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as threads:
+        rejected = sum(threads.map(check, range(requests)))
+    elapsed = time.perf_counter() - start
+    return (requests - rejected) / elapsed, rejected
+
+def main():
+    parser = argparse.ArgumentParser(description="Login password check throughput against concurrency")
+    parser.add_argument("--rounds", type=int, default=12, help="bcrypt work factor")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="hashing processes, 0 = request thread")
+    parser.add_argument("--max-pending", type=int, default=0, help="queue limit, 0 = 4 x workers")
+    parser.add_argument("--requests", type=int, default=64, help="checks per concurrency level")
+    parser.add_argument("--levels", default="1,2,4,8,16,32", help="comma separated concurrency levels")
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config.update(
+        BCRYPT_LOG_ROUNDS=args.rounds,
+        BCRYPT_POOL_WORKERS=args.workers,
+        BCRYPT_MAX_PENDING=args.max_pending or None,
+    )
+    hasher = PasswordHasher(app)
+    password_hash = _hash_password(PASSWORD, args.rounds)
+    hasher.run(_hash_password, PASSWORD, 4) #start the pool before timing
+
+    print(f"rounds={args.rounds} workers={args.workers}")
+    print(f"{'concurrency':>12} {'checks/s':>10} {'rejected':>9}")
+    for level in [int(level) for level in args.levels.split(",")]:
+        throughput, rejected = run_level(hasher, password_hash, level, args.requests)
+        print(f"{level:>12} {throughput:>10.1f} {rejected:>9}")
+
+if __name__ == "__main__":
+    main()
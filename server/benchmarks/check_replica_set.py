@@ -0,0 +1,54 @@
+# benchmarks/check_replica_set.py
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app import create_app
+from app.database import mongo, pool_stats, feed_collection, ingest_collection, user_collection
+
+COLLECTION = "replica_set_check"
+
+def checkouts():
+    return {address: stats["checkouts"] for address, stats in pool_stats.snapshot().items()}
+
+def main():
+    """
+    Checks the client settings against a replica set (see deploy/mongo-replica-set.yml):
+    -majority and ingestion writes are acknowledged
+    -feed reads are served by a secondary when MONGO_FEED_READ_PREFERENCE allows it
+    -prints the connection pool statistics
+    """
+    app = create_app()
+    with app.app_context():
+        hello = mongo.db.command("hello")
+        if "setName" not in hello:
+            print("MONGO_URI does not point to a replica set")
+            return 1
+        primary = hello["primary"]
+        print(f"replica set {hello['setName']}: primary {primary}, members {', '.join(hello['hosts'])}")
+
+        start = time.perf_counter()
+        user_collection(COLLECTION).insert_one({"check": "majority"})
+        print(f"majority write acknowledged in {(time.perf_counter() - start) * 1000:.1f} ms")
+        start = time.perf_counter()
+        ingest_collection(COLLECTION).insert_many([{"check": "ingest", "n": n} for n in range(100)], ordered=False)
+        print(f"ingestion write of 100 documents acknowledged in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+        before = checkouts()
+        for _ in range(20):
+            list(feed_collection(COLLECTION).find({"check": "ingest"}).limit(10))
+        after = checkouts()
+        used = {address: after[address] - before.get(address, 0) for address in after if after[address] != before.get(address, 0)}
+        print(f"feed reads ({feed_collection(COLLECTION).read_preference.mongos_mode}) per server: {used}")
+        if app.config["MONGO_FEED_READ_PREFERENCE"] != "primary" and set(used) == {primary}:
+            print("warning: every feed read went to the primary")
+
+        mongo.db.drop_collection(COLLECTION)
+        print("pool stats:")
+        for address, stats in pool_stats.snapshot().items():
+            print(f"  {address}: {stats}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,40 @@
+# benchmarks/compare.py
+import argparse
+import json
+
+def rows(results):
+    """Yield (name, value, higher is better) for every comparable number in a results file"""
+    for name, result in results.get("micro", {}).items():
+        yield f"micro {name} ops/s", result["ops_per_sec"], True
+    for name, result in results.get("ranking", {}).items():
+        yield f"ranking {name} ops/s", result["ops_per_sec"], True
+    for name, result in results.get("http", {}).items():
+        yield f"http {name} req/s", result["rps"], True
+        yield f"http {name} p95 ms", result["p95"], False
+        yield f"http {name} p99 ms", result["p99"], False
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark results files written by suite.py")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=5, help="percent change reported as faster/slower")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+    candidate_rows = {name: value for name, value, _ in rows(candidate)}
+
+    print(f"{baseline.get('commit')} -> {candidate.get('commit')}")
+    print(f"{'metric':>44} {'baseline':>12} {'candidate':>12} {'change':>9}")
+    for name, value, higher_is_better in rows(baseline):
+        if name not in candidate_rows or not value:
+            continue
+        change = (candidate_rows[name] - value) / value * 100
+        better = change > 0 if higher_is_better else change < 0
+        verdict = "" if abs(change) < args.threshold else ("faster" if better else "slower")
+        print(f"{name:>44} {value:>12.1f} {candidate_rows[name]:>12.1f} {change:>+8.1f}% {verdict}")
+
+if __name__ == "__main__":
+    main()
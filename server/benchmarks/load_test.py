@@ -0,0 +1,83 @@
+# benchmarks/load_test.py
+import argparse
+import threading
+import time
+import urllib.error
+import urllib.request
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * p / 100), len(values) - 1)]
+
+def run_load(url, concurrency, duration, token=None):
+    """
+    Send GET requests to url from concurrency threads for duration seconds.
+    Returns a dict with req/s, error count and latency percentiles in milliseconds.
+    """
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    return run_requests(lambda: urllib.request.Request(url, headers=headers), concurrency, duration)
+
+def run_requests(make_request, concurrency, duration):
+    """
+    Send the requests returned by make_request() from concurrency threads for duration seconds.
+    Responses with an error status (4xx/5xx) count as errors.
+    """
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker():
+        local_latencies = []
+        local_errors = 0
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(make_request(), timeout=30) as response:
+                    response.read()
+                local_latencies.append((time.perf_counter() - start) * 1000)
+            except (urllib.error.URLError, OSError):
+                local_errors += 1
+        with lock:
+            latencies.extend(local_latencies)
+            errors[0] += local_errors
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": len(latencies),
+        "rps": len(latencies) / elapsed,
+        "errors": errors[0],
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+    }
+
+def print_header():
+    print(f"{'concurrency':>12} {'req/s':>9} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+
+def print_row(concurrency, result):
+    print(f"{concurrency:>12} {result['rps']:>9.1f} {result['errors']:>7} {result['p50']:>8.1f} {result['p95']:>8.1f} {result['p99']:>8.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure req/s and latency of one endpoint against concurrency")
+    parser.add_argument("--url", default="http://localhost:5001/api/test", help="endpoint to load")
+    parser.add_argument("--levels", default="1,4,16,64", help="comma separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per concurrency level")
+    parser.add_argument("--token", help="JWT access token for authenticated endpoints")
+    args = parser.parse_args()
+
+    print(args.url)
+    print_header()
+    for level in [int(level) for level in args.levels.split(",")]:
+        print_row(level, run_load(args.url, level, args.duration, args.token))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# benchmarks/serve_matrix.py
+import argparse
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from load_test import run_load
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def wait_until_up(url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+def parse_setting(setting):
+    """workers x threads with an optional worker class, e.g. 4x8 or 2x100:gevent"""
+    size, _, worker_class = setting.partition(":")
+    workers, threads = size.split("x")
+    return int(workers), int(threads), worker_class or "gthread"
+
+def main():
+    parser = argparse.ArgumentParser(description="Start gunicorn with each worker setting and load test it")
+    parser.add_argument("--settings", default="1x1,1x8,2x4,4x8", help="comma separated WORKERSxTHREADS[:worker_class]")
+    parser.add_argument("--path", default="/api/test", help="endpoint to load")
+    parser.add_argument("--concurrency", type=int, default=32, help="client threads")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per setting")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--token", help="JWT access token for authenticated endpoints")
+    args = parser.parse_args()
+
+    url = f"http://127.0.0.1:{args.port}{args.path}"
+    print(f"{url} with {args.concurrency} client threads")
+    print(f"{'setting':>16} {'req/s':>9} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for setting in args.settings.split(","):
+        workers, threads, worker_class = parse_setting(setting)
+        env = dict(
+            os.environ,
+            DEBUG="false",
+            BIND=f"127.0.0.1:{args.port}",
+            WEB_WORKERS=str(workers),
+            WEB_THREADS=str(threads),
+            WORKER_CLASS=worker_class,
+            WEB_ACCESS_LOG="/dev/null",
+            WEB_LOG_LEVEL="warning",
+        )
+        if worker_class == "gevent":
+            env["WORKER_CONNECTIONS"] = str(threads)
+        server = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:create_app()"],
+            cwd=SERVER_DIR,
+            env=env,
+        )
+        try:
+            if not wait_until_up(f"http://127.0.0.1:{args.port}/api/test"):
+                print(f"{setting:>16} failed to start")
+                continue
+            run_load(url, args.concurrency, 1, args.token) #warm up
+            result = run_load(url, args.concurrency, args.duration, args.token)
+            print(f"{setting:>16} {result['rps']:>9.1f} {result['errors']:>7} {result['p50']:>8.1f} {result['p95']:>8.1f} {result['p99']:>8.1f}")
+        finally:
+            server.terminate()
+            server.wait()
+
+if __name__ == "__main__":
+    main()
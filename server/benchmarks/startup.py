@@ -0,0 +1,62 @@
+# benchmarks/startup.py
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+#runs in a fresh interpreter so nothing is imported yet, like a new gunicorn worker
+MEASURE = """
+import json, sys, time
+start = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+create_app(sys.argv[1])
+created = time.perf_counter()
+print(json.dumps({"import": imported - start, "create_app": created - imported,
+                  "genai_loaded": "google.genai" in sys.modules, "bs4_loaded": "bs4" in sys.modules}))
+"""
+
+def measure(role, runs):
+    samples = []
+    for _ in range(runs):
+        output = subprocess.check_output([sys.executable, "-c", MEASURE, role], cwd=SERVER_DIR, text=True, stderr=subprocess.DEVNULL)
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    return {
+        "import_ms": statistics.median(sample["import"] for sample in samples) * 1000,
+        "create_app_ms": statistics.median(sample["create_app"] for sample in samples) * 1000,
+        "genai_loaded": samples[-1]["genai_loaded"],
+        "bs4_loaded": samples[-1]["bs4_loaded"],
+    }
+
+def slowest_imports(role, limit):
+    """Modules with the largest cumulative import time, from python -X importtime"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"from app import create_app; create_app({role!r})"],
+                            cwd=SERVER_DIR, text=True, capture_output=True)
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        imports.append((int(cumulative), name.strip()))
+    return sorted(imports, reverse=True)[:limit]
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker startup time (import app + create_app) for each app role")
+    parser.add_argument("--roles", default="api,ingest,all", help="comma separated roles")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per role, the median is reported")
+    parser.add_argument("--top", type=int, default=0, help="also list the N slowest imports of each role")
+    args = parser.parse_args()
+
+    print(f"{'role':>8} {'import ms':>10} {'create_app ms':>14} {'genai':>6} {'bs4':>6}")
+    for role in args.roles.split(","):
+        result = measure(role, args.runs)
+        print(f"{role:>8} {result['import_ms']:>10.1f} {result['create_app_ms']:>14.1f} {str(result['genai_loaded']):>6} {str(result['bs4_loaded']):>6}")
+        for cumulative, name in slowest_imports(role, args.top):
+            print(f"{'':>8} {cumulative / 1000:>10.1f} {name}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+# benchmarks/suite.py
+import argparse
+import json
+import os
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import timeit
+import urllib.request
+from datetime import datetime, timedelta, timezone
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVER_DIR = os.path.dirname(BENCHMARK_DIR)
+sys.path.insert(0, SERVER_DIR)
+sys.path.insert(0, BENCHMARK_DIR)
+from load_test import run_requests
+from app.services.gemini import TAG_OPTIONS as TAGS
+
+PASSWORD = "Benchmark1!"
+WORDS = ("market election team launch study model players court growth climate vaccine chip "
+         "startup league policy energy research game city budget storm device data security").split()
+
+def newsapi_article(rng, n):
+    return {
+        "source": {"id": None, "name": "Bench"},
+        "author": f"Author {rng.randrange(500)}",
+        "title": " ".join(rng.choices(WORDS, k=8)).capitalize(),
+        "description": " ".join(rng.choices(WORDS, k=30)),
+        "url": f"https://news{n % 50}.example.com/{n}",
+        "urlToImage": f"https://img.example.com/{n}.jpg",
+        "publishedAt": (datetime(2025, 1, 1) + timedelta(minutes=n)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "content": " ".join(rng.choices(WORDS, k=60)),
+    }
+
+def stored_article(rng, n):
+    article = newsapi_article(rng, n)
+    return {
+        "title": article["title"],
+        "author": article["author"],
+        "published_date": article["publishedAt"],
+        "url": article["url"],
+        "img": article["urlToImage"],
+        "summarization": {
+            "summary": " ".join(rng.choices(WORDS, k=80)),
+            "key_points": [" ".join(rng.choices(WORDS, k=12)) for _ in range(4)],
+            "tags": rng.sample(TAGS, rng.randint(1, 4)),
+        },
+    }
+
+def seed_database(articles, users, likes_per_user, seed):
+    """
+    Replace the database contents with generated articles, users (all with PASSWORD) and likes,
+    see generate_data.py. Returns the article and user ids.
+    """
+    import multiprocessing
+    from generate_data import ARTICLE_KIND, USER_KIND, generate_data, generated_id
+    generate_data(
+        articles=articles, users=users, likes_per_user=likes_per_user, zipf=1.1, seed=seed,
+        workers=multiprocessing.cpu_count(), batch_size=2000, days=365,
+        until=datetime(2025, 6, 1, tzinfo=timezone.utc), admins=0, password=PASSWORD, vectors=True, drop=True
+    )
+    return [generated_id(ARTICLE_KIND, n) for n in range(articles)], [generated_id(USER_KIND, n) for n in range(users)]
+
+def bench(func, min_time=0.2, repeat=5):
+    """
+    Time func with timeit, returns ops/s and microseconds per op (median of repeat runs)
+    """
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_time / 0.2))
+    runs = [elapsed / number for elapsed in timer.repeat(repeat=repeat, number=number)]
+    per_op = statistics.median(runs)
+    return {"ops_per_sec": round(1 / per_op, 1), "us_per_op": round(per_op * 1e6, 2), "runs": number * repeat}
+
+def micro_benchmarks():
+    from app.services.news_api import process_articles
+    from app.schemas import article_schema
+    from app.services.utils import validate_password, sanitize_input, normalize_tags
+    from app.services.recommendations import tag_profile_inc, top_profile_tags
+    from app.services.vectors import VectorIndex, embed_summarization, id_key, DIM
+    from bson import ObjectId
+    import numpy as np
+
+    rng = random.Random(1)
+    raw = [newsapi_article(rng, n) for n in range(100)]
+    loaded = [stored_article(rng, n) for n in range(100)]
+    dumped = article_schema.load(loaded, many=True)
+    profile = {tag.lower(): rng.random() * 10 for tag in TAGS}
+    html = "<p>" + " ".join(rng.choices(WORDS, k=50)) + "</p><script>alert(1)</script>  "
+
+    index = VectorIndex()
+    vectors = np.random.default_rng(1).standard_normal((20000, DIM)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    #the arrays a loaded snapshot holds (ObjectIds are created in ascending order), no sync thread
+    index.matrix = vectors
+    index.ids = np.array([id_key(ObjectId()) for _ in range(len(vectors))], dtype="S12")
+    index.active = np.ones(len(vectors), dtype=bool)
+    index.generation = "benchmark"
+    query = vectors[0]
+
+    results = {}
+    cases = {
+        "process_articles_100": lambda: process_articles(raw),
+        "article_schema_load_100": lambda: article_schema.load(loaded, many=True),
+        "article_schema_dump_100": lambda: article_schema.dump(dumped, many=True),
+        "validate_password": lambda: validate_password(PASSWORD),
+        "sanitize_input": lambda: sanitize_input(html),
+        "normalize_tags": lambda: normalize_tags(loaded[0]["summarization"]["tags"]),
+        "tag_profile_inc": lambda: tag_profile_inc(loaded[0]["summarization"]["tags"], 1.0),
+        "top_profile_tags": lambda: top_profile_tags(profile),
+        "embed_summarization": lambda: embed_summarization(loaded[0]["summarization"]),
+        "vector_search_20k": lambda: index.search(query, k=10),
+    }
+    for name, case in cases.items():
+        results[name] = bench(case)
+        print(f"{name:>26} {results[name]['ops_per_sec']:>12.1f} ops/s {results[name]['us_per_op']:>10.2f} us/op")
+    return results
+
+def ranking_benchmarks(app, user_ids, seed, sample_users=20):
+    """
+    Recommendation aggregations on the seeded corpus, for users sampled from user_ids:
+    score_stages alone on a pool of tag matched articles, and the full ranking_stages
+    pipeline from a stored tag profile and from the liked articles
+    """
+    import itertools
+    from app.database import mongo, feed_db
+    from app.services.likes import get_liked_article_ids
+    from app.services.recommendations import (TIER_MATCHED, candidate_tags, recommend_articles, recommend_for_profile,
+                                              score_stages, top_profile_tags)
+
+    rng = random.Random(seed)
+    results = {}
+    with app.app_context():
+        users = []
+        for user_id in rng.sample(user_ids, min(sample_users, len(user_ids))):
+            liked_ids = get_liked_article_ids(user_id)
+            profile = (mongo.db.users.find_one({"_id": user_id}, {"tag_profile": 1}) or {}).get("tag_profile")
+            if liked_ids and top_profile_tags(profile):
+                users.append((profile, liked_ids, top_profile_tags(profile)))
+        if not users:
+            print("no seeded users with likes, skipping ranking benchmarks")
+            return results
+        cycles = {name: itertools.cycle(users) for name in ("score", "profile", "liked")}
+
+        def score_pool():
+            _, _, top_tags = next(cycles["score"])
+            pipeline = [{"$match": {"normalized_tags": {"$in": candidate_tags(top_tags)}}}, {"$limit": 50}] + score_stages(top_tags, TIER_MATCHED)
+            return list(feed_db().articles.aggregate(pipeline))
+
+        def rank_profile():
+            profile, liked_ids, _ = next(cycles["profile"])
+            return recommend_for_profile(profile, liked_ids)
+
+        def rank_liked():
+            _, liked_ids, _ = next(cycles["liked"])
+            return recommend_articles(liked_ids)
+
+        cases = {
+            "score_stages_pool_50": score_pool,
+            "ranking_stages_profile": rank_profile,
+            "ranking_stages_liked": rank_liked,
+        }
+        for name, case in cases.items():
+            results[name] = bench(case)
+            print(f"{name:>26} {results[name]['ops_per_sec']:>12.1f} ops/s {results[name]['us_per_op']:>10.2f} us/op")
+    return results
+
+def http_scenarios(base_url, article_ids, user_ids, concurrency, duration, seed):
+    rng = random.Random(seed)
+    lock = threading.Lock()
+    article_ids = [str(article_id) for article_id in article_ids]
+    user_ids = [str(user_id) for user_id in user_ids]
+
+    def choice(values):
+        with lock:
+            return rng.choice(values)
+
+    def post(path, body):
+        return urllib.request.Request(base_url + path, data=json.dumps(body).encode(), headers={"Content-Type": "application/json"}, method="POST")
+
+    scenarios = {
+        "feed_browse": lambda: urllib.request.Request(f"{base_url}/api/get_articles?tags={urllib.request.quote(choice(TAGS))}"),
+        "trending": lambda: urllib.request.Request(f"{base_url}/api/trending"),
+        "personalized_feed": lambda: urllib.request.Request(f"{base_url}/api/personalized_articles/{choice(user_ids)}"),
+        "similar_articles": lambda: urllib.request.Request(f"{base_url}/api/similar_articles/{choice(article_ids)}"),
+        "like_toggle": lambda: post("/api/like_article", {"user_id": choice(user_ids), "article_id": choice(article_ids)}),
+        "login_burst": lambda: post("/login", {"username": f"user{choice(range(len(user_ids)))}", "password": PASSWORD}),
+    }
+    results = {}
+    print(f"{'scenario':>26} {'req/s':>9} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, make_request in scenarios.items():
+        run_requests(make_request, concurrency, min(1, duration)) #warm up
+        result = run_requests(make_request, concurrency, duration)
+        results[name] = {key: round(value, 2) if isinstance(value, float) else value for key, value in result.items()}
+        print(f"{name:>26} {result['rps']:>9.1f} {result['errors']:>7} {result['p50']:>8.1f} {result['p95']:>8.1f} {result['p99']:>8.1f}")
+    return results
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_mongod():
+    """Start a throwaway mongod in a temporary directory, returns (process, uri, dbpath)"""
+    if not shutil.which("mongod"):
+        sys.exit("mongod not found, install MongoDB or pass --mongo-uri")
+    dbpath = tempfile.mkdtemp(prefix="briefly-bench-")
+    port = free_port()
+    process = subprocess.Popen(["mongod", "--dbpath", dbpath, "--port", str(port), "--bind_ip", "127.0.0.1", "--quiet"],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return process, f"mongodb://127.0.0.1:{port}/briefly_bench", dbpath
+
+def serve(app):
+    """Serve app with a threaded werkzeug server on a free port, returns the base url"""
+    from werkzeug.serving import make_server
+    port = free_port()
+    server = make_server("127.0.0.1", port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{port}"
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=SERVER_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks and HTTP load scenarios, results are written as JSON")
+    parser.add_argument("--mongo-uri", help="database to seed and test against (it is emptied), default starts a temporary mongod")
+    parser.add_argument("--url", help="load test an already running server instead of starting the app in-process (seed it with the same sizes)")
+    parser.add_argument("--articles", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--likes-per-user", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10, help="seconds per HTTP scenario")
+    parser.add_argument("--micro-only", action="store_true", help="skip seeding and the HTTP scenarios")
+    parser.add_argument("--output", help="results file, default benchmarks/results/<time>-<commit>.json")
+    args = parser.parse_args()
+
+    mongod = None
+    if not args.micro_only:
+        if args.mongo_uri:
+            os.environ["MONGO_URI"] = args.mongo_uri
+        else:
+            mongod, os.environ["MONGO_URI"], dbpath = start_mongod()
+    os.environ.setdefault("MONGO_URI", "mongodb://127.0.0.1:27017/briefly_bench")
+    #rate limits would reject most of the load, logging to stdout would be measured too
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("DEBUG", "false")
+
+    from app import create_app
+    app = create_app()
+    results = {
+        "commit": git_commit(),
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "mongo_uri")},
+    }
+    try:
+        print("micro-benchmarks")
+        results["micro"] = micro_benchmarks()
+        if not args.micro_only:
+            print(f"seeding {args.articles} articles, {args.users} users, {args.likes_per_user} likes per user")
+            article_ids, user_ids = seed_database(args.articles, args.users, args.likes_per_user, args.seed)
+            print("recommendation ranking on the seeded corpus")
+            results["ranking"] = ranking_benchmarks(app, user_ids, args.seed)
+            base_url = args.url or serve(app)
+            print(f"HTTP scenarios against {base_url}, {args.concurrency} clients")
+            results["http"] = http_scenarios(base_url, article_ids, user_ids, args.concurrency, args.duration, args.seed)
+    finally:
+        if mongod is not None:
+            mongod.terminate()
+            mongod.wait()
+            shutil.rmtree(dbpath, ignore_errors=True)
+
+    output = args.output or os.path.join(BENCHMARK_DIR, "results", f"{datetime.now():%Y%m%d-%H%M%S}-{results['commit'] or 'unknown'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"results written to {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+# build_co_likes.py
+import argparse
+import time
+from datetime import datetime, timezone
+import numpy as np
+from scipy import sparse
+from pymongo import ReplaceOne
+from app import create_app
+from app.database import mongo, ensure_indexes
+
+JOB_ID = "co_likes"
+
+def load_like_matrix(batch_size=10000):
+    """
+    Build a sparse users x articles matrix from the likes collection.
+    Returns the matrix and the list of article ObjectIds for each column.
+    """
+    user_rows = {}
+    columns = {}
+    article_ids = []
+    rows = []
+    cols = []
+    cursor = mongo.db.likes.find({"liked": True}, {"_id": 0, "user_id": 1, "article_id": 1}).batch_size(batch_size)
+    for like in cursor:
+        row = user_rows.setdefault(like["user_id"], len(user_rows))
+        column = columns.get(like["article_id"])
+        if column is None:
+            column = columns[like["article_id"]] = len(article_ids)
+            article_ids.append(like["article_id"])
+        rows.append(row)
+        cols.append(column)
+    data = np.ones(len(rows), dtype=np.float32)
+    matrix = sparse.csr_matrix(
+        (data, (np.array(rows, dtype=np.int32), np.array(cols, dtype=np.int32))),
+        shape=(len(user_rows), len(article_ids))
+    )
+    return matrix, article_ids
+
+def top_k_neighbors(matrix, k, block_size, min_co_likes, articles=None):
+    """
+    Yield (column, [(neighbor column, cosine similarity)]) for each article column.
+    Similarities are computed block by block as normalized X^T X so only
+    block_size rows of the article x article matrix are in memory at a time.
+    Only the columns in articles are computed when it is given.
+    """
+    counts = np.asarray(matrix.sum(axis=0)).ravel()
+    norms = np.sqrt(np.maximum(counts, 1)).astype(np.float32)
+    liked_by = matrix.T.tocsr() #articles x users
+    normalized = sparse.diags(1 / norms) @ liked_by
+    normalized_t = normalized.T.tocsc()
+    columns = np.arange(matrix.shape[1]) if articles is None else np.asarray(sorted(articles))
+
+    for start in range(0, len(columns), block_size):
+        block = columns[start:start + block_size]
+        similarity = (normalized[block] @ normalized_t).tocsr()
+        for i, column in enumerate(block):
+            begin, end = similarity.indptr[i], similarity.indptr[i + 1]
+            neighbors = similarity.indices[begin:end]
+            scores = similarity.data[begin:end]
+            keep = neighbors != column
+            if min_co_likes > 1:
+                #cosine similarity is co_likes / (norm_a * norm_b), so the count can be recovered from it
+                co_likes = np.rint(scores * norms[column] * norms[neighbors])
+                keep &= co_likes >= min_co_likes
+            neighbors, scores = neighbors[keep], scores[keep]
+            if len(scores) > k:
+                top = np.argpartition(-scores, k - 1)[:k]
+                neighbors, scores = neighbors[top], scores[top]
+            order = np.argsort(-scores)
+            yield column, list(zip(neighbors[order].tolist(), scores[order].tolist()))
+
+def changed_articles(since):
+    """Ids of articles that were liked or unliked since the last run"""
+    return {like["article_id"] for like in mongo.db.likes.find({"updated_at": {"$gt": since}}, {"_id": 0, "article_id": 1})}
+
+def affected_articles(matrix, changed_ids, columns):
+    """
+    Columns whose neighbor lists can change when the changed articles gained or lost likes:
+    -the changed articles themselves
+    -every article now co-liked with one of them, its similarity to it changed
+    -every article whose stored neighbors include one of them, it may have lost co-likes with it
+    Similarities between two unchanged articles don't change, so no other list can.
+    """
+    changed = np.array(sorted(columns[article_id] for article_id in changed_ids if article_id in columns), dtype=np.int64)
+    affected = set(changed.tolist())
+    if len(changed):
+        users = np.unique(matrix.T.tocsr()[changed].indices)
+        affected.update(np.unique(matrix[users].indices).tolist())
+    for entry in mongo.db.article_neighbors.find({"neighbors.article_id": {"$in": list(changed_ids)}}, {"_id": 1}):
+        if entry["_id"] in columns:
+            affected.add(columns[entry["_id"]])
+    return affected
+
+def build_co_likes(k=20, block_size=2000, min_co_likes=1, full=False, write_batch=1000):
+    """
+    Compute the top k co-liked neighbors of each article and store them in article_neighbors.
+    Incremental runs only recompute the articles whose neighbors can have changed since the last
+    run (see affected_articles), so their result is the same as a full run.
+    """
+    app = create_app()
+
+    with app.app_context():
+        ensure_indexes()
+        started_at = datetime.now(timezone.utc)
+        start_time = time.time()
+
+        matrix, article_ids = load_like_matrix()
+        print(f"Loaded {matrix.shape[0]} users x {matrix.shape[1]} articles ({matrix.nnz} likes) in {time.time() - start_time:.1f} seconds")
+
+        state = mongo.db.job_state.find_one({"_id": JOB_ID})
+        articles = None
+        if not full and state:
+            columns = {article_id: column for column, article_id in enumerate(article_ids)}
+            changed_ids = changed_articles(state["last_run"])
+            #articles that lost their last like have no neighbors anymore
+            unliked = [article_id for article_id in changed_ids if article_id not in columns]
+            if unliked:
+                mongo.db.article_neighbors.delete_many({"_id": {"$in": unliked}})
+            articles = affected_articles(matrix, changed_ids, columns)
+            print(f"Incremental run: {len(changed_ids)} articles changed since {state['last_run']}, recomputing {len(articles)}")
+        else:
+            mongo.db.article_neighbors.delete_many({})
+
+        written = 0
+        operations = []
+        for column, neighbors in top_k_neighbors(matrix, k, block_size, min_co_likes, articles):
+            if not neighbors and articles is None:
+                continue
+            operations.append(ReplaceOne(
+                {"_id": article_ids[column]},
+                {
+                    "neighbors": [{"article_id": article_ids[n], "score": round(score, 4)} for n, score in neighbors],
+                    "updated_at": started_at
+                },
+                upsert=True
+            ))
+            if len(operations) == write_batch:
+                written += len(operations)
+                mongo.db.article_neighbors.bulk_write(operations, ordered=False)
+                operations = []
+        if operations:
+            written += len(operations)
+            mongo.db.article_neighbors.bulk_write(operations, ordered=False)
+
+        mongo.db.job_state.replace_one({"_id": JOB_ID}, {"last_run": started_at}, upsert=True)
+        print(f"Wrote neighbors for {written} articles in {time.time() - start_time:.1f} seconds")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build item-item co-like neighbors for recommendations")
+    parser.add_argument("--k", type=int, default=20, help="neighbors to keep per article")
+    parser.add_argument("--block-size", type=int, default=2000, help="articles per similarity block")
+    parser.add_argument("--min-co-likes", type=int, default=1, help="minimum users who liked both articles")
+    parser.add_argument("--full", action="store_true", help="recompute every article instead of only changed ones")
+    args = parser.parse_args()
+    build_co_likes(k=args.k, block_size=args.block_size, min_co_likes=args.min_co_likes, full=args.full)
@@ -0,0 +1,268 @@
+# generate_data.py
+import argparse
+import math
+import multiprocessing
+import random
+import struct
+import time
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+import numpy as np
+from bson import ObjectId
+from pymongo import InsertOne, MongoClient, uri_parser
+from app.services.gemini import TAG_OPTIONS
+from app.services.recommendations import MAX_WEIGHT_EXPONENT
+
+#generated ids are ObjectIds with the index in the last bytes so likes can refer to
+#articles and users without reading them back, and runs with the same seed match
+ARTICLE_KIND = 1
+USER_KIND = 2
+ID_EPOCH = int(datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp())
+
+TAG_WORDS = {
+    "World News": "summit embassy border ceasefire refugees treaty sanctions diplomats united nations conflict",
+    "Politics": "election senate parliament campaign vote policy minister governor bill coalition",
+    "Business": "company merger earnings ceo startup revenue layoffs acquisition retail supply",
+    "Finance": "stocks bonds inflation interest rates market investors bank crypto dividend",
+    "Health": "hospital vaccine patients disease study doctors treatment mental outbreak nutrition",
+    "Science": "researchers space telescope climate species physics experiment discovery ocean fossil",
+    "Entertainment": "film movie actor album concert streaming series celebrity festival premiere",
+    "Sports": "team season coach championship league match players score tournament transfer",
+    "Technology": "smartphone software chip apple google device update launch cloud battery",
+    "AI": "model chatbot training openai neural agents automation regulation gpu benchmark",
+    "Cybersecurity": "hackers breach ransomware vulnerability malware phishing patch encryption attack password",
+    "Gaming": "console game nintendo playstation xbox studio release esports players steam",
+    "Travel": "airline flights tourism hotel destination passport airport cruise visa trip",
+    "Food": "restaurant recipe chef menu prices farmers coffee dining wine grocery",
+    "Lifestyle": "fashion wellness home design trends family fitness dating style habits",
+}
+TAG_WORDS = {tag: words.split() for tag, words in TAG_WORDS.items()}
+COMMON_WORDS = ("new report year people week government officials announced expected could first "
+                "after says according percent million major plans early global local latest").split()
+FIRST_NAMES = "Alex Sam Jordan Taylor Morgan Casey Riley Jamie Avery Quinn Drew Robin Cameron Reese Parker".split()
+LAST_NAMES = "Smith Chen Garcia Patel Kim Nguyen Brown Silva Müller Rossi Cohen Okafor Tanaka Novak Dubois".split()
+DOMAINS = ["theverge.com", "bbc.co.uk", "reuters.com", "apnews.com", "techcrunch.com", "espn.com", "wired.com",
+           "bloomberg.com", "theguardian.com", "nytimes.com", "cnn.com", "engadget.com", "arstechnica.com", "npr.org"]
+#share of articles with 1, 2, 3 and 4 tags
+TAG_COUNT_WEIGHTS = [0.3, 0.4, 0.2, 0.1]
+
+def generated_id(kind, n):
+    return ObjectId(struct.pack(">IB", ID_EPOCH + n // 1000, kind) + n.to_bytes(7, "big"))
+
+def article_rng(seed, n):
+    return random.Random(f"{seed}:article:{n}")
+
+def article_tags(rng):
+    return rng.sample(TAG_OPTIONS, rng.choices([1, 2, 3, 4], weights=TAG_COUNT_WEIGHTS)[0])
+
+@lru_cache(maxsize=200000)
+def cached_article_tags(seed, n):
+    #tags are the first values drawn from an article's rng so likes can regenerate them cheaply
+    return [tag.lower() for tag in article_tags(article_rng(seed, n))]
+
+def sentence(rng, tags, words):
+    vocabulary = [word for tag in tags for word in TAG_WORDS[tag]]
+    return " ".join(rng.choice(vocabulary) if rng.random() < 0.6 else rng.choice(COMMON_WORDS) for _ in range(words))
+
+def generate_article(seed, n, until, days, with_vectors=True):
+    """
+    Article n in the ArticleSchema shape, the same for the same seed and n
+    """
+    from app.services.vectors import set_summary_vector
+    rng = article_rng(seed, n)
+    tags = article_tags(rng)
+    domain = rng.choice(DOMAINS)
+    published = until - timedelta(seconds=rng.random() * days * 86400)
+    title = sentence(rng, tags, rng.randint(6, 12)).capitalize()
+    article = {
+        "_id": generated_id(ARTICLE_KIND, n),
+        "title": title,
+        "author": None if rng.random() < 0.05 else f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+        "published_date": published.replace(microsecond=0),
+        "url": f"https://www.{domain}/{published:%Y/%m}/{'-'.join(title.lower().split()[:6])}-{n}",
+        "img": None if rng.random() < 0.1 else f"https://cdn.{domain}/images/{n}.jpg",
+        "summarization": {
+            "summary": sentence(rng, tags, rng.randint(60, 110)).capitalize() + ".",
+            "key_points": [sentence(rng, tags, rng.randint(8, 16)).capitalize() + "." for _ in range(rng.randint(3, 5))],
+            "tags": tags,
+        },
+        "normalized_tags": [tag.lower() for tag in tags],
+        "like_count": 0,
+    }
+    if with_vectors:
+        set_summary_vector(article)
+    return article
+
+def generate_user(n, password_hash, admins):
+    return {
+        "_id": generated_id(USER_KIND, n),
+        "username": f"user{n}",
+        "email": f"user{n}@example.com",
+        "password": password_hash,
+        "role": "admin" if n < admins else "user",
+    }
+
+class Popularity:
+    """
+    Zipf distribution over articles: the article at rank r is liked in proportion to 1 / r^s.
+    Ranks are shuffled with the seed so popular articles are spread over the whole corpus.
+    """
+    def __init__(self, seed, articles, exponent):
+        weights = 1 / np.arange(1, articles + 1, dtype=np.float64) ** exponent
+        self.cdf = np.cumsum(weights)
+        self.cdf /= self.cdf[-1]
+        self.articles = np.random.default_rng([seed, 0]).permutation(articles)
+
+    def sample(self, rng, count):
+        ranks = np.minimum(np.searchsorted(self.cdf, rng.random(count)), len(self.cdf) - 1)
+        return np.unique(self.articles[ranks])
+
+def user_likes(seed, n, popularity, mean_likes, until, days, half_life_days):
+    """
+    Likes and tag profile of user n. The number of likes per user is lognormal,
+    so most users like a few articles and a few users like many.
+    """
+    rng = np.random.default_rng([seed, USER_KIND, n])
+    sigma = 1.0
+    count = int(rng.lognormal(math.log(max(mean_likes, 1e-9)) - sigma ** 2 / 2, sigma)) if mean_likes > 0 else 0
+    user_id = generated_id(USER_KIND, n)
+    likes, profile = [], {}
+    for article in popularity.sample(rng, count).tolist():
+        created = until - timedelta(seconds=float(rng.random()) * days * 86400)
+        #same weighting as tag_profile_weight, with the user's tag_profile_epoch set to until
+        exponent = (created - until).total_seconds() / 86400 / half_life_days if half_life_days > 0 else 0
+        weight = 2 ** max(exponent, -MAX_WEIGHT_EXPONENT)
+        likes.append({
+            "user_id": user_id,
+            "article_id": generated_id(ARTICLE_KIND, article),
+            "liked": True,
+            "created_at": created,
+            "updated_at": created,
+            "profile_weight": weight,
+        })
+        for tag in cached_article_tags(seed, article):
+            profile[tag] = profile.get(tag, 0) + weight
+    return likes, profile
+
+_worker = {}
+
+def init_worker(uri, options):
+    _worker["db"] = MongoClient(uri, w=1)[uri_parser.parse_uri(uri)["database"]]
+    _worker["options"] = options
+    if options["kind"] == "likes":
+        _worker["popularity"] = Popularity(options["seed"], options["articles"], options["zipf"])
+
+def write_batch(batch):
+    """Generate and insert documents start..end of one kind, returns how many were inserted"""
+    start, end = batch
+    db, options = _worker["db"], _worker["options"]
+    until, days = options["until"], options["days"]
+    if options["kind"] == "articles":
+        docs = [generate_article(options["seed"], n, until, days, options["vectors"]) for n in range(start, end)]
+        db.articles.insert_many(docs, ordered=False)
+        return len(docs)
+    if options["kind"] == "users":
+        docs = [generate_user(n, options["password_hash"], options["admins"]) for n in range(start, end)]
+        db.users.insert_many(docs, ordered=False)
+        return len(docs)
+    likes, profiles = [], []
+    for n in range(start, end):
+        user_like_docs, profile = user_likes(options["seed"], n, _worker["popularity"], options["likes_per_user"], until, days, options["half_life_days"])
+        likes.extend(InsertOne(like) for like in user_like_docs)
+        if profile:
+            profiles.append(InsertOne({"_id": generated_id(USER_KIND, n), "tag_profile": profile, "tag_profile_epoch": until}))
+    if likes:
+        db.likes.bulk_write(likes, ordered=False)
+    if profiles:
+        db.generated_profiles.bulk_write(profiles, ordered=False)
+    return len(likes)
+
+def run_batches(kind, total, options, uri, workers, batch_size):
+    batches = [(start, min(start + batch_size, total)) for start in range(0, total, batch_size)]
+    if not batches:
+        return 0
+    start_time = time.time()
+    written = 0
+    context = multiprocessing.get_context("spawn") #MongoClient isn't fork safe
+    with context.Pool(workers, initializer=init_worker, initargs=(uri, dict(options, kind=kind))) as pool:
+        for count in pool.imap_unordered(write_batch, batches):
+            written += count
+            print(f"\r{kind}: {written} written ({written / max(time.time() - start_time, 1e-9):.0f}/s)", end="", flush=True)
+    print()
+    return written
+
+def generate_data(articles, users, likes_per_user, zipf, seed, workers, batch_size, days, until, admins, password, vectors, drop):
+    """
+    Fill the database with articles, users and likes. Runs with the same arguments produce the same data.
+    """
+    from app import create_app
+    from app.database import mongo, ensure_indexes
+    from app.schemas import article_schema
+    from app.bcrypt import _hash_password
+    from app.services.vectors import record_removals
+
+    app = create_app()
+    with app.app_context():
+        uri = app.config["MONGO_URI"]
+        if drop:
+            for name in ("articles", "articles_archive", "users", "likes", "recommendations", "trending", "article_neighbors", "job_state", "generated_profiles"):
+                mongo.db.drop_collection(name)
+            #vector indexes built from the old articles are rebuilt on their next sync
+            record_removals(None)
+        elif mongo.db.articles.estimated_document_count() or mongo.db.users.estimated_document_count():
+            print("The database already has articles or users, run with --drop to replace them")
+            return
+        ensure_indexes()
+
+        #make sure generated articles still pass the schema the app validates against
+        sample = generate_article(seed, 0, until, days, with_vectors=False)
+        article_schema.load({key: value.isoformat() if key == "published_date" else value
+                             for key, value in sample.items() if key not in ("_id", "normalized_tags", "like_count")})
+
+        options = {
+            "seed": seed, "until": until, "days": days, "vectors": vectors, "articles": articles, "zipf": zipf,
+            "likes_per_user": likes_per_user, "admins": admins,
+            "password_hash": _hash_password(password, app.config["BCRYPT_LOG_ROUNDS"]),
+            "half_life_days": app.config.get("TAG_PROFILE_HALF_LIFE_DAYS") or 0,
+        }
+        start_time = time.time()
+        run_batches("articles", articles, options, uri, workers, batch_size)
+        run_batches("users", users, options, uri, workers, batch_size)
+        if articles:
+            run_batches("likes", users, options, uri, workers, max(1, batch_size // max(int(likes_per_user), 1)))
+
+            print("Setting tag profiles and like counts")
+            mongo.db.generated_profiles.aggregate([
+                {"$merge": {"into": "users", "on": "_id", "whenMatched": "merge", "whenNotMatched": "discard"}}
+            ])
+            mongo.db.drop_collection("generated_profiles")
+            mongo.db.likes.aggregate([
+                {"$match": {"liked": True}},
+                {"$group": {"_id": "$article_id", "like_count": {"$sum": 1}}},
+                {"$merge": {"into": "articles", "on": "_id", "whenMatched": "merge", "whenNotMatched": "discard"}}
+            ])
+        print(f"Generated {articles} articles, {users} users and their likes in {time.time() - start_time:.1f} seconds")
+        print(f"Every user's password is {password!r}, the first {admins} users are admins")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a deterministic synthetic corpus of articles, users and likes for scale testing")
+    parser.add_argument("--articles", type=int, default=100000)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--likes-per-user", type=float, default=30, help="mean likes per user, the distribution is heavy tailed")
+    parser.add_argument("--zipf", type=float, default=1.1, help="exponent of article popularity, higher concentrates likes on fewer articles")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count(), help="parallel insert processes")
+    parser.add_argument("--batch-size", type=int, default=2000, help="documents per bulk insert")
+    parser.add_argument("--days", type=int, default=365, help="articles and likes are spread over this many days")
+    parser.add_argument("--until", default="2025-06-01", help="date of the newest article (YYYY-MM-DD)")
+    parser.add_argument("--admins", type=int, default=1)
+    parser.add_argument("--password", default="Password1!", help="password of every generated user")
+    parser.add_argument("--no-vectors", action="store_true", help="skip summary vectors (faster, similar articles won't work)")
+    parser.add_argument("--drop", action="store_true", help="drop the existing collections first")
+    args = parser.parse_args()
+    generate_data(
+        articles=args.articles, users=args.users, likes_per_user=args.likes_per_user, zipf=args.zipf, seed=args.seed,
+        workers=args.workers, batch_size=args.batch_size, days=args.days,
+        until=datetime.strptime(args.until, "%Y-%m-%d").replace(tzinfo=timezone.utc),
+        admins=args.admins, password=args.password, vectors=not args.no_vectors, drop=args.drop
+    )
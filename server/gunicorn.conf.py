@@ -0,0 +1,56 @@
+# gunicorn.conf.py
+# Production server settings, used with: gunicorn -c gunicorn.conf.py "app:create_app()"
+# Every setting can be overridden with an environment variable so the same file
+# runs both the read (api) pool and the ingestion pool, see docker-compose.prod.yml
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+bind = os.getenv("BIND", "0.0.0.0:5001")
+
+# Worker processes, each with its own MongoDB connection pool and in-memory indexes
+workers = int(os.getenv("WEB_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+
+# gthread: a thread pool per worker, good for the mix of short reads and waits on MongoDB
+# gevent: greenlets for mostly I/O bound pools like ingestion (requires pip install gevent)
+worker_class = os.getenv("WORKER_CLASS", "gthread")
+threads = int(os.getenv("WEB_THREADS", 4))
+worker_connections = int(os.getenv("WORKER_CONNECTIONS", 100)) #gevent only
+
+# Requests running longer than timeout get their worker restarted.
+# Ingestion (NewsAPI + scraping + LLM) needs a much longer timeout than reads.
+timeout = int(os.getenv("WEB_TIMEOUT", 30))
+# On HUP or shutdown workers get this long to finish in-flight requests
+graceful_timeout = int(os.getenv("WEB_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.getenv("WEB_KEEPALIVE", 5))
+
+# Recycle workers after this many requests to contain memory growth, jitter avoids restarting all at once
+max_requests = int(os.getenv("WEB_MAX_REQUESTS", 2000))
+max_requests_jitter = int(os.getenv("WEB_MAX_REQUESTS_JITTER", 200))
+
+# Not preloading keeps the MongoDB client and background threads out of the master process
+preload_app = False
+
+# Workers write their metrics to this directory so /metrics reports every worker,
+# it must be set before the app imports prometheus_client
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "briefly-metrics-" + bind.rsplit(":", 1)[-1]))
+
+def on_starting(server):
+    #metrics from a previous run would otherwise be added to the new ones
+    shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+    os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"])
+
+def post_worker_init(worker):
+    #load the similarity index in the background before the first request needs it
+    from app.services.vectors import vector_index
+    if vector_index.app is not None and vector_index.app.config["APP_ROLE"] in ("api", "all"):
+        vector_index.start()
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+accesslog = os.getenv("WEB_ACCESS_LOG", "-")
+errorlog = "-"
+loglevel = os.getenv("WEB_LOG_LEVEL", "info")
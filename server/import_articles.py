@@ -0,0 +1,259 @@
+# import_articles.py
+import argparse
+import codecs
+import gzip
+import json
+import os
+import queue
+import re
+import threading
+import time
+from marshmallow import ValidationError
+from pymongo.errors import BulkWriteError
+from app import create_app
+from app.database import ensure_indexes, ingest_collection
+from app.schemas import article_schema
+from app.services.news_api import process_articles
+from app.services.archive import restore_urls
+from app.services.utils import article_upsert
+
+READ_SIZE = 1 << 20
+ARTICLES_ARRAY = re.compile(r'"articles"\s*:\s*\[')
+#adaptive batches aim for bulk writes of about this long, within MIN/MAX_BATCH_SIZE
+TARGET_BATCH_SECONDS = 0.5
+MIN_BATCH_SIZE = 100
+MAX_BATCH_SIZE = 10000
+
+def open_archive(path):
+    return gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+
+def iter_ndjson(f, offset=0):
+    """
+    Yields (record, offset after the record) for every line of an NDJSON file,
+    the offset can be passed back in to resume after that record
+    """
+    f.seek(offset)
+    for line in f:
+        offset += len(line)
+        if line.strip():
+            yield json.loads(line), offset
+
+def iter_json_articles(f):
+    """
+    Yields (record, None) for every item of the "articles" array of a NewsAPI response
+    (like dummy.json), or of a top level array, reading READ_SIZE bytes at a time
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")() #chunks can end inside a multi-byte character
+    buffer = ""
+    eof = False
+
+    def read_more():
+        nonlocal buffer, eof
+        chunk = f.read(READ_SIZE)
+        eof = not chunk
+        buffer += utf8.decode(chunk, final=eof)
+
+    #find the start of the array
+    while True:
+        match = ARTICLES_ARRAY.search(buffer)
+        stripped = buffer.lstrip()
+        if match or stripped.startswith("["):
+            position = match.end() if match else len(buffer) - len(stripped) + 1
+            break
+        if eof:
+            raise ValueError("no articles array found")
+        read_more()
+
+    while True:
+        #skip separators, refilling the buffer as it runs out
+        while position < len(buffer) and buffer[position] in " \t\r\n,":
+            position += 1
+        if position == len(buffer):
+            if eof:
+                raise ValueError("articles array isn't closed")
+            buffer, position = "", 0
+            read_more()
+            continue
+        if buffer[position] == "]":
+            return
+        try:
+            record, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            read_more() #the record continues in the next chunk
+            continue
+        yield record, None
+        buffer, position = buffer[end:], 0
+
+def prepare_article(record):
+    """
+    Validates one record the way the ingestion routes do. NewsAPI records
+    (publishedAt, urlToImage) are processed into the article fields first.
+    """
+    if "publishedAt" in record or "urlToImage" in record:
+        record = process_articles([record])[0]
+    return article_schema.load(record)
+
+class CheckpointFile:
+    """
+    Progress of an import, saved after every written batch: how many records of
+    the file were handled and, for NDJSON, the byte offset to continue from
+    """
+    def __init__(self, path, source):
+        self.path = path
+        self.source = source
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path) as f:
+            checkpoint = json.load(f)
+        if checkpoint.get("source") != os.path.abspath(self.source):
+            raise SystemExit(f"{self.path} belongs to {checkpoint.get('source')}, not {self.source}")
+        return checkpoint
+
+    def save(self, records, offset):
+        temporary = self.path + ".tmp"
+        with open(temporary, "w") as f:
+            json.dump({"source": os.path.abspath(self.source), "records": records, "offset": offset, "saved_at": time.time()}, f)
+        os.replace(temporary, self.path) #never leaves a half written checkpoint
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+class BatchWriter:
+    """
+    Writes batches of upserts on a background thread so parsing and validation
+    overlap with the database round trip. Each batch carries the checkpoint
+    position reached after it, saved once the batch is written.
+    """
+    def __init__(self, collection, checkpoint):
+        self.collection = collection
+        self.checkpoint = checkpoint
+        self.queue = queue.Queue(maxsize=2)
+        self.error = None
+        self.stats = {"written": 0, "upserted": 0, "modified": 0, "write_errors": 0}
+        self.last_seconds_per_doc = None
+        self.thread = threading.Thread(target=self.run, name="import-writer", daemon=True)
+        self.thread.start()
+
+    def put(self, operations, urls, records, offset):
+        if self.error is not None:
+            raise self.error
+        self.queue.put((operations, urls, records, offset))
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def run(self):
+        while True:
+            batch = self.queue.get()
+            if batch is None:
+                return
+            operations, urls, records, offset = batch
+            try:
+                start = time.perf_counter()
+                #upserts match by url, archived copies are moved back first so they are updated instead of duplicated
+                restore_urls(set(urls), self.collection.database)
+                try:
+                    result = self.collection.bulk_write(operations, ordered=False).bulk_api_result
+                except BulkWriteError as e:
+                    #unordered, so every other operation was still applied
+                    result = e.details
+                    self.stats["write_errors"] += len(result.get("writeErrors", []))
+                self.last_seconds_per_doc = (time.perf_counter() - start) / len(operations)
+                self.stats["written"] += len(operations)
+                self.stats["upserted"] += result.get("nUpserted", 0)
+                self.stats["modified"] += result.get("nModified", 0)
+                if self.checkpoint is not None:
+                    self.checkpoint.save(records, offset)
+            except Exception as e:
+                self.error = e
+                #keep draining so the reader doesn't block on a full queue
+                while self.queue.get() is not None:
+                    pass
+                return
+
+def next_batch_size(batch_size, seconds_per_doc):
+    """Scales the batch size so a bulk write takes about TARGET_BATCH_SECONDS"""
+    if not seconds_per_doc:
+        return batch_size
+    target = TARGET_BATCH_SECONDS / seconds_per_doc
+    #move halfway to the target so one slow write doesn't shrink batches too far
+    return int(min(MAX_BATCH_SIZE, max(MIN_BATCH_SIZE, (batch_size + target) / 2)))
+
+def import_articles(path, file_format, batch_size, auto_batch, resume, checkpoint_path, max_errors_shown):
+    app = create_app()
+    with app.app_context():
+        ensure_indexes()
+        collection = ingest_collection("articles")
+
+        checkpoint = CheckpointFile(checkpoint_path or path + ".checkpoint", path)
+        state = checkpoint.load() if resume else None
+        if state is None:
+            checkpoint.remove()
+        skip, offset = (state["records"], state["offset"] or 0) if state else (0, 0)
+        if state:
+            print(f"Resuming after record {skip}")
+
+        file_format = file_format or ("ndjson" if re.search(r"\.(ndjson|jsonl)(\.gz)?$", path) else "json")
+        writer = BatchWriter(collection, checkpoint)
+        records = invalid = 0
+        position = offset
+        operations, urls = [], []
+        start_time = last_report = time.time()
+        with open_archive(path) as f:
+            if file_format == "ndjson":
+                stream = iter_ndjson(f, offset)
+                records = skip
+            else:
+                stream = iter_json_articles(f)
+            for record, position in stream:
+                records += 1
+                if records <= skip: #json dumps can't seek, records before the checkpoint are skipped
+                    continue
+                try:
+                    article = prepare_article(record)
+                except (ValidationError, KeyError, TypeError, AttributeError) as e:
+                    invalid += 1
+                    if invalid <= max_errors_shown:
+                        print(f"record {records} skipped: {e}")
+                    continue
+                operations.append(article_upsert(article))
+                urls.append(article["url"])
+                if len(operations) >= batch_size:
+                    writer.put(operations, urls, records, position)
+                    operations, urls = [], []
+                    if auto_batch:
+                        batch_size = next_batch_size(batch_size, writer.last_seconds_per_doc)
+                if time.time() - last_report >= 5:
+                    last_report = time.time()
+                    elapsed = last_report - start_time
+                    print(f"{records} records read, {writer.stats['written']} written, {invalid} invalid, "
+                          f"{(records - skip) / elapsed:.0f} records/s, batch size {batch_size}", flush=True)
+            if operations:
+                writer.put(operations, urls, records, position)
+        writer.close()
+        checkpoint.remove()
+
+        elapsed = max(time.time() - start_time, 1e-9)
+        stats = writer.stats
+        print(f"Read {records - skip} records in {elapsed:.1f} seconds ({(records - skip) / elapsed:.0f} records/s)")
+        print(f"{stats['upserted']} inserted, {stats['modified']} updated, {invalid} invalid, {stats['write_errors']} write errors")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream a NewsAPI response dump (like dummy.json) or an NDJSON archive of articles into the articles collection")
+    parser.add_argument("path", help=".json, .ndjson or .jsonl file, optionally gzipped (.gz)")
+    parser.add_argument("--format", choices=("json", "ndjson"), help="default from the file extension")
+    parser.add_argument("--batch-size", type=int, help="upserts per bulk write, default adapts to write latency starting at 1000")
+    parser.add_argument("--resume", action="store_true", help="continue from the checkpoint of an interrupted import")
+    parser.add_argument("--checkpoint", help="checkpoint file, default <path>.checkpoint")
+    parser.add_argument("--show-errors", type=int, default=10, help="invalid records to print")
+    args = parser.parse_args()
+    import_articles(args.path, args.format, args.batch_size or 1000, args.batch_size is None, args.resume, args.checkpoint, args.show_errors)
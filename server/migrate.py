@@ -0,0 +1,35 @@
+# migrate.py
+import argparse
+from app import create_app
+from app.database import mongo
+from app.migrations import MIGRATIONS, MigrationRunner
+
+def show_status(runner):
+    records = runner.records()
+    print(f"{'version':>7}  {'name':<22} {'state':<8} {'scanned':>9} {'written':>9}  finished")
+    for migration in runner.migrations:
+        record = records.get(migration.version, {})
+        finished = record.get("finished_at")
+        print(f"{migration.version:>7}  {migration.name:<22} {record.get('state', 'pending'):<8} "
+              f"{record.get('scanned', 0):>9} {record.get('written', 0):>9}  {f'{finished:%Y-%m-%d %H:%M}' if finished else '-'}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply the pending data migrations in app/migrations, in version order")
+    parser.add_argument("command", nargs="?", choices=("run", "status"), default="run")
+    parser.add_argument("--to", type=int, help="stop after this version")
+    parser.add_argument("--dry-run", action="store_true", help="only estimate how many documents each pending migration would scan and write")
+    parser.add_argument("--batch-size", type=int, default=500, help="documents read and written per bulk write")
+    parser.add_argument("--pause-ratio", type=float, default=0.0, help="sleep this many times as long as each batch took (1 = use the database half the time)")
+    parser.add_argument("--max-docs-per-second", type=float, default=0, help="upper bound on documents scanned per second, 0 = unlimited")
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        runner = MigrationRunner(mongo.db, MIGRATIONS, batch_size=args.batch_size, pause_ratio=args.pause_ratio,
+                                 max_docs_per_second=args.max_docs_per_second)
+        if args.command == "status":
+            show_status(runner)
+        else:
+            if not runner.pending(args.to):
+                print("No pending migrations.")
+            runner.run(to=args.to, dry_run=args.dry_run)
@@ -0,0 +1,47 @@
+# rebuild_tag_profiles.py
+from app import create_app
+from app.database import mongo
+from app.services.recommendations import profile_tags
+from app.services.likes import get_liked_article_ids
+from datetime import datetime, timezone
+from pymongo import UpdateOne
+
+BATCH_SIZE = 200
+
+def build_profile(liked_ids, weight):
+    """Count the normalized tags of a user's liked articles"""
+    profile = {}
+    for article in mongo.db.articles.find({"_id": {"$in": liked_ids}}, {"normalized_tags": 1}):
+        for tag in profile_tags(article.get("normalized_tags", [])):
+            profile[tag] = profile.get(tag, 0) + weight
+    return profile
+
+def rebuild_tag_profiles():
+    """
+    Rebuild the tag_profile of every user from their liked articles.
+    When decay is enabled existing likes are all weighted as if they were made now:
+    every like counts 1 and the user's tag_profile_epoch is reset to now.
+    """
+    app = create_app()
+    
+    with app.app_context():
+        now = datetime.now(timezone.utc)
+        cursor = mongo.db.users.find({}, {"_id": 1}).batch_size(BATCH_SIZE)
+        
+        rebuilt = 0
+        operations = []
+        for user in cursor:
+            profile = build_profile(get_liked_article_ids(user["_id"]), 1)
+            operations.append(UpdateOne({"_id": user["_id"]}, {"$set": {"tag_profile": profile, "tag_profile_epoch": now}}))
+            if len(operations) == BATCH_SIZE:
+                rebuilt += mongo.db.users.bulk_write(operations, ordered=False).matched_count
+                operations = []
+        if operations:
+            rebuilt += mongo.db.users.bulk_write(operations, ordered=False).matched_count
+        #unliking subtracts the weight stored on the like
+        mongo.db.likes.update_many({"liked": True}, {"$set": {"profile_weight": 1}})
+        
+        print(f"Rebuilt tag profiles for {rebuilt} users.")
+
+if __name__ == "__main__":
+    rebuild_tag_profiles()
@@ -0,0 +1,9 @@
+import os
+import sys
+
+#the app reads its config from the environment when it's imported
+os.environ.setdefault('MONGO_URI', 'mongodb://127.0.0.1:1/briefly_test?serverSelectionTimeoutMS=50')
+os.environ.setdefault('LOG_LEVEL', 'ERROR')
+os.environ.setdefault('RATE_LIMIT_ENABLED', 'false')
+os.environ.setdefault('METRICS_ENABLED', 'false')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,62 @@
+import mongomock
+import pytest
+from bson import ObjectId
+from app import create_app
+from app.database import mongo
+from app.services.recommendation_worker import recommendation_worker
+from app.services.trending import trending_counter
+
+def find_and_modify(db):
+    '''
+    The likes toggle runs the findAndModify command, which mongomock doesn't have.
+    Runs the same toggle on the mongomock collection and answers like the server.
+    '''
+    def command(name, collection, query, update, fields, upsert, new, **kwargs):
+        assert name == 'findAndModify' and upsert and new
+        likes = db[collection]
+        like = likes.find_one(query)
+        liked = not (like or {}).get('liked', False)
+        changes = {'liked': liked}
+        if liked:
+            changes['created_at'] = 'now'
+            changes['profile_weight'] = update[1]['$set']['profile_weight']['$cond'][1]
+        likes.update_one(query, {'$set': changes}, upsert=True)
+        value = likes.find_one(query, {field: 1 for field in fields})
+        return {'value': value, 'lastErrorObject': {'n': 1, 'updatedExisting': like is not None}, 'ok': 1}
+    return command
+
+@pytest.fixture
+def client(monkeypatch):
+    app = create_app('api')
+    db = mongomock.MongoClient().briefly_test
+    monkeypatch.setattr(mongo, 'db', db)
+    monkeypatch.setattr(db, 'command', find_and_modify(db))
+    monkeypatch.setattr(trending_counter, 'record', lambda article_id, delta: None)
+    monkeypatch.setattr(recommendation_worker, 'refresh_user', lambda user_id: None)
+    return app.test_client(), db
+
+def test_like_and_unlike(client):
+    client, db = client
+    user_id = db.users.insert_one({'tag_profile': {}}).inserted_id
+    article_id = db.articles.insert_one({'like_count': 0, 'normalized_tags': ['ai', 'chips']}).inserted_id
+    body = {'user_id': str(user_id), 'article_id': str(article_id)}
+
+    response = client.post('/api/like_article', json=body)
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()['liked'] is True
+    assert response.get_json()['like_count'] == 1
+    assert response.get_json()['user_modified_count'] == 1
+    assert db.users.find_one({'_id': user_id})['tag_profile'] == {'ai': 1, 'chips': 1}
+    assert db.likes.find_one({'user_id': user_id, 'article_id': article_id})['liked'] is True
+
+    response = client.post('/api/like_article', json=body)
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()['liked'] is False
+    assert response.get_json()['like_count'] == 0
+    assert db.articles.find_one({'_id': article_id})['like_count'] == 0
+    assert db.users.find_one({'_id': user_id})['tag_profile'] == {'ai': 0, 'chips': 0}
+
+def test_like_missing_article_id(client):
+    client, _ = client
+    response = client.post('/api/like_article', json={'user_id': str(ObjectId())})
+    assert response.status_code == 400